@@ -0,0 +1,166 @@
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from http_client import LatencyHistogram
+from prefetch import audio_cache
+
+# upper bounds in seconds of the match to first sample latency buckets
+AUDIO_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2)
+
+
+class AudioEngine:
+    """
+    One long-lived audio worker for the voice overs. The mixer is initialized once, decoded
+    sounds are kept in an LRU cache, and playback goes through a queue: a new match supersedes
+    whatever is still queued or playing, so overlapping matches never talk over each other.
+
+    The worker waits on an event for the length of the sound instead of polling the mixer,
+    and the time from the match to the first sample being started is recorded.
+    """
+
+    def __init__(self, audio_cache=audio_cache, max_sounds=32, mixer=None):
+        """
+        :param audio_cache: AudioCache the MP3 bytes are read from
+        :param max_sounds: Number of decoded sounds kept, the least recently played one is dropped first
+        :param mixer: Object with init() and Sound(file) like pygame.mixer, defaults to pygame.mixer
+        """
+        self.audio_cache = audio_cache
+        self.max_sounds = max_sounds
+        self.mixer = mixer
+        self.sounds = OrderedDict()
+        self.sounds_lock = threading.Lock()
+        self.mixer_ready = threading.Event()
+        self.queue = queue.Queue()
+        # bumped by every play() and stop(), queued items of an older generation are dropped
+        self.generation = 0
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        # set when the mixer couldn't be initialized, nothing is queued after that
+        self.init_error = None
+        self.latency = LatencyHistogram(AUDIO_LATENCY_BUCKETS)
+        self.played = 0
+        self.superseded = 0
+        self.errors = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="audio-engine", daemon=True)
+                self.thread.start()
+
+    def _init_mixer(self):
+        if self.mixer is None:
+            import pygame
+            self.mixer = pygame.mixer
+        self.mixer.init()
+        self.mixer_ready.set()
+
+    def load(self, path):
+        """
+        :return: The decoded sound of the MP3 at path, decoded on a miss
+        """
+        path = os.path.abspath(path)
+        with self.sounds_lock:
+            sound = self.sounds.get(path)
+            if sound is not None:
+                self.sounds.move_to_end(path)
+                return sound
+        sound = self.mixer.Sound(io.BytesIO(self.audio_cache.get(path)))
+        with self.sounds_lock:
+            self.sounds[path] = sound
+            self.sounds.move_to_end(path)
+            while len(self.sounds) > self.max_sounds:
+                self.sounds.popitem(last=False)
+        return sound
+
+    def preload(self, path):
+        """
+        Decode the sound at path ahead of playing it, does nothing before the mixer is up.
+        """
+        if not self.mixer_ready.is_set():
+            return
+        try:
+            self.load(path)
+        except Exception as e:
+            logging.warning(f"Could not preload audio {path}: {e}")
+
+    def play(self, paths, match_time=None):
+        """
+        Play the sounds at paths one after the other, replacing anything queued or playing.
+
+        :param paths: Paths of the MP3s to play
+        :param match_time: time.perf_counter() of the match, defaults to now
+        """
+        if self.init_error is not None:
+            logging.warning(f"Audio mixer unavailable ({self.init_error}), not playing {len(paths)} sounds")
+            return
+        if match_time is None:
+            match_time = time.perf_counter()
+        self.start()
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            self.cancelled.set()
+        for index, path in enumerate(paths):
+            # only the first sound of a match is timed
+            self.queue.put((generation, path, match_time if index == 0 else None))
+
+    def stop(self):
+        """
+        Stop playback and drop the queued sounds.
+        """
+        with self.lock:
+            self.generation += 1
+            self.cancelled.set()
+
+    def _run(self):
+        try:
+            self._init_mixer()
+        except Exception as e:
+            self.init_error = e
+            logging.error(f"Could not initialize the audio mixer: {e}")
+            return
+        while True:
+            generation, path, match_time = self.queue.get()
+            with self.lock:
+                if generation != self.generation:
+                    self.superseded += 1
+                    continue
+                self.cancelled.clear()
+            # nothing may escape, this thread plays every sound of the process
+            try:
+                self._play(path, match_time)
+            except Exception as e:
+                self.errors += 1
+                logging.warning(f"Could not play audio {path}: {e}")
+
+    def _play(self, path, match_time):
+        sound = self.load(path)
+        channel = sound.play()
+        if channel is None:
+            raise RuntimeError("no free mixer channel")
+        if match_time is not None:
+            self.latency.record(time.perf_counter() - match_time)
+        self.played += 1
+        # returns early when a newer match or stop() cancels this one
+        if self.cancelled.wait(sound.get_length()):
+            channel.stop()
+
+    def stats(self):
+        return {
+            "played": self.played,
+            "superseded": self.superseded,
+            "errors": self.errors,
+            "mixer_error": None if self.init_error is None else str(self.init_error),
+            "sounds": len(self.sounds),
+            "latency": self.latency.stats(),
+        }
+
+
+# Create a shared audio engine instance
+audio_engine = AudioEngine()
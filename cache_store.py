@@ -0,0 +1,256 @@
+import os
+import pickle
+import queue
+import struct
+import threading
+import zlib
+import atexit
+from contextlib import contextmanager
+from pathlib import Path
+try:
+    import fcntl
+except ImportError:
+    # Windows, logs aren't locked there and must have a single writer
+    fcntl = None
+
+# every record is framed as <payload length><crc32 of payload><pickled payload>
+RECORD_HEADER = struct.Struct('<II')
+
+
+class AppendOnlyStore:
+    """
+    Crash-safe append-only record log used to persist the FrameProcessor caches.
+
+    Appends only serialize the new record and hand it to a background writer thread,
+    which batches the writes and fsyncs them off the frame-processing thread. A record
+    torn by a crash mid-write fails the length/crc check and is truncated away on load.
+    Compaction rewrites the live records to a temporary file that atomically replaces
+    the log, also on the writer thread.
+
+    Several stores, in one or more processes, may write the same log: loads, write batches
+    and compactions hold an exclusive lock on a .lock file next to it, and a log replaced by
+    another store's compaction is reopened. Once another store has appended to the log,
+    compaction is skipped, it would drop the records this store doesn't know about.
+    """
+
+    def __init__(self, path, legacy_pickle_path=None):
+        """
+        :param path: Path of the log file
+        :param legacy_pickle_path: Optional path of an old whole-list pickle cache to import when the log doesn't exist yet
+        """
+        self.path = Path(path)
+        self.legacy_pickle_path = Path(legacy_pickle_path) if legacy_pickle_path else None
+        self.record_count = 0
+
+        self._queue = queue.Queue()
+        self._file = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._lock_file = None
+        # size of the log after this store's last load or write, None before the first one
+        self._size = None
+        self._shared = False
+
+    def load(self):
+        """
+        Read every intact record from disk, truncating a torn tail left by a crash.
+
+        :return: list of records
+        """
+        with self._locked():
+            return self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            records = self._load_legacy_pickle()
+            if records:
+                self._write_log(self.path, records)
+            self.record_count = len(records)
+            self._size = self.path.stat().st_size if records else 0
+            return records
+
+        records = []
+        good_offset = 0
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        while good_offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, good_offset)
+            start = good_offset + RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            try:
+                records.append(pickle.loads(payload))
+            except Exception:
+                break
+            good_offset = start + length
+
+        if good_offset != len(data):
+            print(f"{self.path}: dropping {len(data) - good_offset} bytes of torn records")
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+
+        self.record_count = len(records)
+        self._size = good_offset
+        return records
+
+    def _load_legacy_pickle(self):
+        if self.legacy_pickle_path is None or not self.legacy_pickle_path.exists():
+            return []
+        try:
+            with open(self.legacy_pickle_path, 'rb') as f:
+                records = list(pickle.load(f))
+        except Exception as e:
+            print(f"Could not import legacy cache {self.legacy_pickle_path}: {e}")
+            return []
+        print(f"Imported {len(records)} records from {self.legacy_pickle_path}")
+        return records
+
+    @staticmethod
+    def _encode(record):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def _write_log(self, path, records):
+        """Write records to a temporary file, fsync it and atomically move it over path."""
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            for record in records:
+                f.write(self._encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the exclusive lock shared by every store writing this log."""
+        if fcntl is None:
+            yield
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.path.with_name(self.path.name + '.lock'), 'ab')
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _check_other_writers(self):
+        """
+        With the lock held, reopen a log replaced by another store and note whether another store wrote to it.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if self._file is not None and (stat is None or stat.st_ino != os.fstat(self._file.fileno()).st_ino):
+            self._close_file()
+        size = stat.st_size if stat is not None else 0
+        if self._size is not None and size != self._size:
+            self._shared = True
+        self._size = size
+
+    def _compact(self, records):
+        if self._shared:
+            print(f"{self.path}: other writers append to this log, not compacting it")
+            return
+        self._close_file()
+        self._write_log(self.path, records)
+
+    def _start_writer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def append(self, record):
+        """
+        Queue a record to be appended to the log. Returns without touching the disk.
+
+        :param record: Any picklable object
+        :return: Size of the encoded record in bytes
+        """
+        if self._closed:
+            raise ValueError(f"{self.path} store is closed")
+        self._start_writer()
+        self.record_count += 1
+        encoded = self._encode(record)
+        self._queue.put(('append', encoded))
+        return len(encoded)
+
+    def compact(self, records):
+        """
+        Replace the log with the given live records in the background.
+
+        :param records: list of records that should survive compaction
+        """
+        if self._closed:
+            raise ValueError(f"{self.path} store is closed")
+        self._start_writer()
+        self.record_count = len(records)
+        self._queue.put(('compact', list(records)))
+
+    def flush(self):
+        """Block until every queued record is written and fsynced."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(('close', None))
+            self._thread.join()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _writer_loop(self):
+        while True:
+            commands = [self._queue.get()]
+            # drain everything already queued so a burst costs a single fsync
+            while True:
+                try:
+                    commands.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            try:
+                with self._locked():
+                    self._check_other_writers()
+                    for command, payload in commands:
+                        if command == 'append':
+                            if self._file is None:
+                                self._file = open(self.path, 'ab')
+                            self._file.write(payload)
+                        elif command == 'compact':
+                            self._sync()
+                            self._compact(payload)
+                        elif command == 'close':
+                            stop = True
+                    self._sync()
+                    self._size = self.path.stat().st_size if self.path.exists() else 0
+                if stop:
+                    self._close_file()
+            except Exception as e:
+                print(f"Error writing cache log {self.path}: {e}")
+            finally:
+                for _ in commands:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _sync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
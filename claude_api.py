@@ -1,5 +1,5 @@
 from dotenv import load_dotenv
-import requests
+from http_client import http_client, async_http_client
 import base64
 import os
 import json
@@ -28,9 +28,12 @@ class Claude_API:
         return base64_string
 
     def call_api(self, payload):
-        response = requests.post(self.base_url, headers=self.headers, json=payload)
-        response.raise_for_status()
-        return response.json()['content'][0]['text']
+        response_json = http_client.post_json(self.base_url, payload, headers=self.headers)
+        return response_json['content'][0]['text']
+
+    async def async_call_api(self, payload):
+        response_json = await async_http_client.post_json(self.base_url, payload, headers=self.headers)
+        return response_json['content'][0]['text']
 
     def call_translation_api(self, content, target_lang):
         ocr_text = content if isinstance(content, str) else f"{content.get('name', '')} : {content.get('dialogue', '')}"
@@ -0,0 +1,226 @@
+from collections import Counter
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# a dialogue line must be more similar than this (0-1) to count as a match
+MATCH_THRESHOLDS = {'en' : 0.33, 'jp' : 0.1}
+# a match in the window around the last matched line is accepted without a global search from this similarity (0-1)
+CONFIDENT_THRESHOLDS = {'en' : 0.8, 'jp' : 0.6}
+
+
+def ngrams(text, n=2):
+    """
+    Set of character n-grams of text, short texts produce a single n-gram of the whole text.
+    """
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class DialogueMatcher:
+    """
+    Matches OCR text against the dialogue script.
+
+    The script is prepared once: the dialogue strings are kept as a choice list for
+    rapidfuzz.process.cdist, which scores every text segment against every line in C.
+    When the script is too long to score in full on every frame, a character n-gram
+    inverted index shortlists the lines sharing the most n-grams with the text, then a
+    per-character inverted index gives an upper bound of fuzz.ratio for every line
+    (the LCS can't be longer than the characters both strings have in common), and
+    only the lines whose bound could still beat the shortlist are scored as well.
+
+    Scores are fuzz.ratio rounded to an integer like thefuzz does, and ties go to the
+    earliest line, so the top match is the same as a linear scan with thefuzz.
+    """
+
+    def __init__(self, dialogues, lang='en', ngram_size=2, shortlist_size=64, full_scan_size=500, window_behind=2, window_ahead=8):
+        """
+        :param dialogues: dict of line number -> entry with a 'dialogue' key, as returned by FrameProcessor.load_dialogues
+        :param lang: Language of the script, selects the match threshold
+        :param ngram_size: Size of the character n-grams in the inverted index
+        :param shortlist_size: Number of candidate lines scored when shortlisting
+        :param full_scan_size: Scripts up to this many lines are always scored in full
+        :param window_behind: Lines before the cursor scored first when matching with a cursor
+        :param window_ahead: Lines after the cursor scored first when matching with a cursor
+        """
+        self.lang = lang
+        self.threshold = MATCH_THRESHOLDS.get(lang, MATCH_THRESHOLDS['en'])
+        self.confident_threshold = CONFIDENT_THRESHOLDS.get(lang, CONFIDENT_THRESHOLDS['en'])
+        self.window_behind = window_behind
+        self.window_ahead = window_ahead
+        self.window_matches = 0
+        self.global_searches = 0
+        self.ngram_size = ngram_size
+        self.shortlist_size = shortlist_size
+        self.full_scan_size = full_scan_size
+
+        self.numbers = list(dialogues.keys())
+        self.positions = {number : position for position, number in enumerate(self.numbers)}
+        self.choices = [entry['dialogue'] for entry in dialogues.values()]
+
+        self.lengths = np.array([len(dialogue) for dialogue in self.choices], dtype=np.float32)
+
+        index = {}
+        char_index = {}
+        for position, dialogue in enumerate(self.choices):
+            for gram in ngrams(dialogue, ngram_size):
+                index.setdefault(gram, []).append(position)
+            for char, count in Counter(dialogue).items():
+                char_index.setdefault(char, ([], []))
+                char_index[char][0].append(position)
+                char_index[char][1].append(count)
+        self.index = {gram : np.array(positions, dtype=np.int64) for gram, positions in index.items()}
+        self.char_index = {char : (np.array(positions, dtype=np.int64), np.array(counts, dtype=np.int32))
+                           for char, (positions, counts) in char_index.items()}
+
+    def __len__(self):
+        return len(self.choices)
+
+    def shortlist(self, text):
+        """
+        Positions of the lines sharing the most n-grams with text, in script order.
+        """
+        counts = np.zeros(len(self.choices), dtype=np.int32)
+        for gram in ngrams(text, self.ngram_size):
+            positions = self.index.get(gram)
+            if positions is not None:
+                counts[positions] += 1
+
+        candidates = np.flatnonzero(counts)
+        if len(candidates) > self.shortlist_size:
+            # most shared n-grams first, earlier lines first among equal counts
+            top = np.lexsort((candidates, -counts[candidates]))[:self.shortlist_size]
+            candidates = np.sort(candidates[top])
+        return candidates
+
+    def upper_bounds(self, text):
+        """
+        Upper bound of fuzz.ratio (0-100) between text and every line, from the characters they have in common.
+        """
+        common = np.zeros(len(self.choices), dtype=np.int32)
+        for char, count in Counter(text).items():
+            entry = self.char_index.get(char)
+            if entry is not None:
+                positions, counts = entry
+                common[positions] += np.minimum(counts, count)
+        return 200.0 * common / np.maximum(len(text) + self.lengths, 1)
+
+    def score(self, texts, positions=None):
+        """
+        Similarity (0-100) of every text against the script lines at positions (all lines when None).
+
+        :return: (len(texts), len(positions)) float array
+        """
+        choices = self.choices if positions is None else [self.choices[i] for i in positions]
+        if not choices:
+            return np.zeros((len(texts), 0), dtype=np.float32)
+        scores = process.cdist(texts, choices, scorer=fuzz.ratio, dtype=np.float32)
+        return np.rint(scores)
+
+    def candidate_scores(self, text, positions=None):
+        """
+        :return: tuple of (positions, scores 0-100) of the lines scored among positions (all lines when None)
+        """
+        if positions is None:
+            positions = np.arange(len(self.choices))
+        if len(positions) == 0:
+            return positions, np.zeros(0, dtype=np.float32)
+        return positions, self.score([text], positions)[0]
+
+    def search(self, text):
+        """
+        Score text against the script, every line sharing the top score is guaranteed to be among the scored lines.
+
+        :return: tuple of (positions, scores 0-100)
+        """
+        if len(self.choices) <= self.full_scan_size:
+            return self.candidate_scores(text)
+
+        shortlist = self.shortlist(text)
+        positions, scores = self.candidate_scores(text, shortlist)
+        best = scores.max() if len(scores) else 0.0
+
+        # scores are rounded, so any line whose bound is within 0.5 of the best could still tie or beat it
+        min_score = max(best, self.threshold * 100) - 0.5
+        candidates = np.flatnonzero(self.upper_bounds(text) >= min_score - 1e-4)
+        if len(np.setdiff1d(candidates, shortlist, assume_unique=True)):
+            return self.candidate_scores(text, np.union1d(candidates, shortlist))
+        return positions, scores
+
+    def window(self, cursor_position):
+        """
+        Positions around the cursor in order of preference: the current line, the lines ahead, then the lines behind.
+        """
+        ahead = range(cursor_position, min(cursor_position + self.window_ahead + 1, len(self.choices)))
+        behind = range(cursor_position - 1, max(cursor_position - self.window_behind, 0) - 1, -1)
+        return np.array(list(ahead) + list(behind), dtype=np.int64)
+
+    def transition_cost(self, cursor_position, positions):
+        """
+        Cost of moving from the cursor to positions, dialogue moves forward so jumping back costs more than any jump ahead.
+        """
+        distance = positions - cursor_position
+        return np.where(distance >= 0, distance, len(self.choices) - distance)
+
+    def find_closest(self, text, cursor=None):
+        """
+        Find the script line closest to text.
+
+        With a cursor (the last matched line number) the window around it is scored first and
+        accepted when it is confident enough and no line outside the window could score higher
+        (a scene jump). Otherwise the whole script is searched and lines
+        tied for the top score are resolved by the smallest transition_cost from the cursor,
+        which keeps repeated short lines matched in order.
+
+        :param text: OCR text of one dialogue segment
+        :param cursor: Optional line number of the last matched line
+        :return: line number of the closest dialogue above the language threshold, otherwise None
+        """
+        cursor_position = self.positions.get(cursor) if cursor is not None else None
+
+        window_match = None
+        if cursor_position is not None:
+            window = self.window(cursor_position)
+            positions, scores = self.candidate_scores(text, window)
+            best = int(np.argmax(scores))
+            window_best = scores[best]
+            if window_best / 100.0 >= self.confident_threshold:
+                window_match = self.numbers[int(positions[best])]
+                # scores are rounded, a line outside the window can only beat the window when its bound is within 0.5 of it
+                bounds = self.upper_bounds(text)
+                bounds[window] = 0
+                if bounds.max() < window_best + 0.5 - 1e-4:
+                    self.window_matches += 1
+                    return window_match
+
+        self.global_searches += 1
+        positions, scores = self.search(text)
+        if window_match is not None and scores.max() <= window_best:
+            # nothing in the script scores higher than the window, keep the line near the cursor
+            return window_match
+        if len(scores) == 0 or scores.max() / 100.0 <= self.threshold:
+            return None
+
+        tied = positions[scores == scores.max()]
+        if cursor_position is None:
+            position = tied.min()
+        else:
+            position = tied[np.argmin(self.transition_cost(cursor_position, tied))]
+        return self.numbers[int(position)]
+
+    def find_closest_entries(self, texts, cursor=None):
+        """
+        :param texts: list of text segments, in reading order
+        :param cursor: Optional line number of the last matched line, advanced as segments match
+        :return: list of matched line numbers, segments without a match are left out
+        """
+        closest_entry_numbers = []
+        for text in texts:
+            closest_entry_number = self.find_closest(text, cursor)
+            if closest_entry_number is not None:
+                closest_entry_numbers.append(closest_entry_number)
+                cursor = closest_entry_number
+        return closest_entry_numbers
+
+    def stats(self):
+        return {"window_matches": self.window_matches, "global_searches": self.global_searches}
@@ -0,0 +1,112 @@
+import numpy as np
+from PIL import Image
+
+
+class FrameGate:
+    """
+    Staged gate deciding which frames are worth running OCR on.
+
+    1. diff: the frame is downsampled to a small grayscale thumbnail and compared with the
+       thumbnail of the last frame that passed this stage, static frames stop here.
+    2. text: the text detector only looks at the region that changed. If the region has no
+       text but the last checked frame did, the text may have been cleared so the whole
+       frame is checked again.
+    3. ocr: frames that made it through both stages go on to FrameProcessor.run_image.
+
+    Every stage counts the frames it skipped, see stats().
+    """
+
+    def __init__(self, textDetector, thumbnail_width=64, pixel_threshold=12, min_changed=0.002, region_padding=2):
+        """
+        :param textDetector: TextDetector / TextDetectorFast used for the text stage
+        :param thumbnail_width: Width of the grayscale thumbnail used for the diff stage
+        :param pixel_threshold: Thumbnail pixels differing by more than this (0-255) count as changed
+        :param min_changed: Fraction of changed thumbnail pixels below which the frame counts as static
+        :param region_padding: Thumbnail pixels added around the changed region before text detection
+        """
+        self.textDetector = textDetector
+        self.thumbnail_width = thumbnail_width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.region_padding = region_padding
+
+        self.last_frame = None
+        self.last_thumbnail = None
+        self.last_has_text = False
+
+        self.frames = 0
+        self.skipped_static = 0
+        self.skipped_no_text = 0
+        self.full_frame_checks = 0
+        self.passed = 0
+
+    def thumbnail(self, img):
+        w, h = img.size
+        size = (self.thumbnail_width, max(1, round(h * self.thumbnail_width / w)))
+        return np.asarray(img.convert('L').resize(size, Image.BOX), dtype=np.int16)
+
+    def changed_region(self, img):
+        """
+        Compare img with the last frame that passed the diff stage.
+
+        :return: (left, top, right, bottom) box of the changed region in img coordinates, None if the frame is static
+        """
+        if img is self.last_frame:
+            return None
+        self.last_frame = img
+
+        thumbnail = self.thumbnail(img)
+        if self.last_thumbnail is None or self.last_thumbnail.shape != thumbnail.shape:
+            self.last_thumbnail = thumbnail
+            return (0, 0, *img.size)
+
+        changed = np.abs(thumbnail - self.last_thumbnail) > self.pixel_threshold
+        if changed.mean() < self.min_changed:
+            # keep the old thumbnail so slow changes still add up to a change
+            return None
+        self.last_thumbnail = thumbnail
+
+        ys, xs = np.nonzero(changed)
+        scale = img.size[0] / thumbnail.shape[1]
+        left = max(0, int((xs.min() - self.region_padding) * scale))
+        top = max(0, int((ys.min() - self.region_padding) * scale))
+        right = min(img.size[0], int((xs.max() + 1 + self.region_padding) * scale))
+        bottom = min(img.size[1], int((ys.max() + 1 + self.region_padding) * scale))
+        return (left, top, right, bottom)
+
+    def has_text(self, img, region=None):
+        crop = img if region is None or region == (0, 0, *img.size) else img.crop(region)
+        return self.textDetector.has_text(self.textDetector.preprocess_image(crop))
+
+    def check(self, img):
+        """
+        Run img through the diff and text stages.
+
+        :return: 'static' if nothing changed, 'no_text' if the frame has no text, otherwise 'ocr'
+        """
+        self.frames += 1
+        region = self.changed_region(img)
+        if region is None:
+            self.skipped_static += 1
+            return 'static'
+
+        has_text = self.has_text(img, region)
+        if not has_text and self.last_has_text and region != (0, 0, *img.size):
+            self.full_frame_checks += 1
+            has_text = self.has_text(img)
+        self.last_has_text = has_text
+
+        if not has_text:
+            self.skipped_no_text += 1
+            return 'no_text'
+        self.passed += 1
+        return 'ocr'
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped_static": self.skipped_static,
+            "skipped_no_text": self.skipped_no_text,
+            "full_frame_checks": self.full_frame_checks,
+            "passed": self.passed,
+        }
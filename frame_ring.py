@@ -0,0 +1,159 @@
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# int64 slots of the header: the latest sequence number, then (stamp, height, width, channels) per slot
+HEADER_FIELDS = 4
+
+
+def attach_shared_memory(name):
+    """
+    Open an existing shared memory block without tracking it in this process, the creating process owns and unlinks it.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class FrameRingBuffer:
+    """
+    Fixed number of preallocated uint8 frame slots written by one producer and read by any
+    number of consumers, in threads or, with shared=True, in other processes.
+
+    Every write gets the next sequence number and goes to slot seq % capacity. A slot's stamp
+    is cleared while it is written and set to the sequence number afterwards, so a reader
+    checks the stamp after using a frame to know it wasn't overwritten meanwhile (a seqlock).
+    Neither side takes a lock and readers look at the newest frame without copying it.
+    """
+
+    def __init__(self, capacity=3, max_shape=(720, 1280, 3), shared=False, name=None):
+        """
+        :param capacity: Number of frame slots, a reader has capacity - 1 writes of time to use a frame
+        :param max_shape: Largest (height, width[, channels]) frame the slots can hold
+        :param shared: Allocate the buffer in shared memory so other processes can attach to it by name
+        :param name: Attach to the shared buffer created under this name, capacity and max_shape must match
+        """
+        self.capacity = capacity
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        header_bytes = (1 + capacity * HEADER_FIELDS) * 8
+        size = header_bytes + capacity * self.slot_bytes
+
+        self.shm = None
+        if name is not None:
+            self.shm = attach_shared_memory(name)
+            buffer = self.shm.buf
+        elif shared:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            buffer = self.shm.buf
+        else:
+            buffer = bytearray(size)
+        self.owner = name is None
+
+        self.header = np.ndarray((1 + capacity * HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        self.slots = np.ndarray((capacity, self.slot_bytes), dtype=np.uint8, buffer=buffer, offset=header_bytes)
+        if self.owner:
+            self.header[:] = 0
+
+        self.writes = 0
+        self.torn_reads = 0
+
+    @property
+    def name(self):
+        return self.shm.name if self.shm is not None else None
+
+    def fits(self, shape):
+        return len(shape) == len(self.max_shape) and all(size <= max_size for size, max_size in zip(shape, self.max_shape))
+
+    def _slot_header(self, slot):
+        start = 1 + slot * HEADER_FIELDS
+        return self.header[start:start + HEADER_FIELDS]
+
+    def _view(self, slot):
+        _, height, width, channels = self._slot_header(slot)
+        shape = (height, width, channels) if channels else (height, width)
+        return self.slots[slot, :int(np.prod(shape))].reshape(shape)
+
+    def latest_seq(self):
+        """Sequence number of the newest frame, 0 if nothing was written yet."""
+        return int(self.header[0])
+
+    def write(self, frame_data):
+        """
+        Copy a frame into the next slot, only one thread or process may write.
+
+        :param frame_data: uint8 array with a shape that fits max_shape
+        :return: Sequence number of the frame
+        """
+        if not self.fits(frame_data.shape):
+            raise ValueError(f"Frame of shape {frame_data.shape} doesn't fit the ring buffer's {self.max_shape}")
+        seq = self.latest_seq() + 1
+        slot = seq % self.capacity
+        slot_header = self._slot_header(slot)
+        slot_header[0] = 0
+        height, width = frame_data.shape[:2]
+        slot_header[1:] = (height, width, frame_data.shape[2] if frame_data.ndim == 3 else 0)
+        self._view(slot)[...] = frame_data
+        slot_header[0] = seq
+        self.header[0] = seq
+        self.writes += 1
+        return seq
+
+    def valid(self, seq):
+        """True while the frame seq hasn't been overwritten."""
+        return int(self._slot_header(seq % self.capacity)[0]) == seq
+
+    def read_latest(self, after=0):
+        """
+        Newest frame without copying it, check valid(seq) once done with the view.
+
+        :param after: Sequence number of the last frame the caller read
+        :return: (seq, view), (None, None) if there is no frame newer than after
+        """
+        seq = self.latest_seq()
+        if seq <= after:
+            return None, None
+        return seq, self._view(seq % self.capacity)
+
+    def read(self, convert=np.copy, after=0, retries=3):
+        """
+        Newest frame passed through convert, retried when the writer overwrote it during convert.
+
+        :param convert: Callable taking the frame view and returning something that doesn't reference it
+        :param after: Sequence number of the last frame the caller read
+        :return: (seq, convert(frame)), (None, None) if there is no newer frame or every try was torn
+        """
+        for _ in range(retries):
+            seq, view = self.read_latest(after)
+            if seq is None:
+                return None, None
+            if self.valid(seq):
+                result = convert(view)
+                if self.valid(seq):
+                    return seq, result
+            self.torn_reads += 1
+        return None, None
+
+    def close(self):
+        if self.shm is not None:
+            # drop the views before closing, the mapping can't be closed while they export it
+            self.header = None
+            self.slots = None
+            try:
+                self.shm.close()
+            except BufferError:
+                # a reader still holds a view, the mapping goes away with the last one
+                pass
+            if self.owner:
+                self.shm.unlink()
+            self.shm = None
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "latest_seq": self.latest_seq() if self.header is not None else None,
+            "writes": self.writes,
+            "torn_reads": self.torn_reads,
+        }
@@ -0,0 +1,288 @@
+import asyncio
+import bisect
+import email.utils
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# statuses worth another try: rate limiting and transient server errors
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504, 529)
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 30, 60)
+
+
+class LatencyHistogram:
+    """
+    Request latencies of one endpoint in fixed buckets, cheap enough to record every call.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """
+        :return: Upper bound of the bucket holding the given fraction of the requests, the max for the overflow bucket
+        """
+        if self.count == 0:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+            "buckets": dict(zip([*map(str, self.buckets), "inf"], self.counts)),
+        }
+
+
+def parse_retry_after(headers):
+    """
+    Delay asked for by the server in the retry-after-ms or retry-after header (seconds or an HTTP date).
+
+    :return: Seconds to wait, None if the headers don't say
+    """
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """
+    Exponential backoff shared by the sync and async clients, a retry-after from the server takes precedence.
+    """
+
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=20.0, retry_statuses=RETRY_STATUSES):
+        """
+        :param max_retries: Retries after the first try, 0 disables retrying
+        :param backoff: Delay in seconds before the first retry, doubled for every next one
+        :param max_backoff: Upper limit of a delay in seconds, also for retry-after
+        :param retry_statuses: HTTP statuses that are retried
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses
+
+    def should_retry(self, attempt, status=None):
+        """
+        :param status: HTTP status of the response, None when the request failed without one
+        """
+        return attempt < self.max_retries and (status is None or status in self.retry_statuses)
+
+    def delay(self, attempt, headers=None):
+        retry_after = parse_retry_after(headers) if headers is not None else None
+        if retry_after is None:
+            retry_after = self.backoff * 2 ** attempt
+        return min(retry_after, self.max_backoff)
+
+
+class HTTPClient:
+    """
+    requests.Session based JSON client shared by the API wrappers, connections are kept alive
+    and reused between calls instead of a new TCP + TLS handshake per request.
+    Requests time out, retryable failures are retried with backoff and every call's latency is
+    recorded per endpoint.
+    """
+
+    def __init__(self, timeout=(5, 60), retry_policy=None, pool_maxsize=10):
+        """
+        :param timeout: requests timeout, (connect, read) in seconds
+        :param retry_policy: RetryPolicy, defaults to 3 retries
+        :param pool_maxsize: Connections kept alive per host
+        """
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.latencies = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, url):
+        with self.lock:
+            return self.latencies.setdefault(url, LatencyHistogram())
+
+    def post_json(self, url, payload, headers=None, timeout=None):
+        """
+        POST payload as JSON and return the decoded JSON response.
+
+        :raises requests.HTTPError: for an error status once the retries are used up
+        :raises requests.ConnectionError: for connection errors and connect timeouts once the retries are used up
+        :raises requests.ReadTimeout: right away, the API may already be working on the request
+        """
+        histogram = self.histogram(url)
+        attempt = 0
+        while True:
+            start_time = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=timeout or self.timeout)
+            except requests.ReadTimeout:
+                # retrying would pay for the same completion twice
+                histogram.record(time.perf_counter() - start_time)
+                histogram.errors += 1
+                raise
+            except requests.ConnectionError as e:
+                # ConnectTimeout is a ConnectionError too
+                histogram.record(time.perf_counter() - start_time)
+                if not self.retry_policy.should_retry(attempt):
+                    histogram.errors += 1
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                logging.warning(f"POST {url} failed ({e}), retrying in {delay:.2f}s")
+            else:
+                histogram.record(time.perf_counter() - start_time)
+                if response.ok:
+                    return response.json()
+                if not self.retry_policy.should_retry(attempt, response.status_code):
+                    histogram.errors += 1
+                    response.raise_for_status()
+                delay = self.retry_policy.delay(attempt, response.headers)
+                logging.warning(f"POST {url} returned {response.status_code}, retrying in {delay:.2f}s")
+            histogram.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def stats(self):
+        with self.lock:
+            return {url: histogram.stats() for url, histogram in self.latencies.items()}
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHTTPClient:
+    """
+    aiohttp version of HTTPClient for calling the APIs from the asyncio server without blocking its loop.
+    The session is created on first use, inside the running loop.
+    """
+
+    def __init__(self, timeout=(5, 60), retry_policy=None, pool_maxsize=10):
+        """
+        :param timeout: (connect, read) in seconds
+        :param retry_policy: RetryPolicy, defaults to 3 retries
+        :param pool_maxsize: Connections kept alive per host
+        """
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.pool_maxsize = pool_maxsize
+        self.session = None
+        self.latencies = {}
+
+    def histogram(self, url):
+        return self.latencies.setdefault(url, LatencyHistogram())
+
+    def get_session(self):
+        import aiohttp
+        if self.session is None or self.session.closed:
+            connect, read = self.timeout
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(connect=connect, sock_read=read),
+                                                 connector=aiohttp.TCPConnector(limit_per_host=self.pool_maxsize))
+        return self.session
+
+    @staticmethod
+    def is_retryable(error):
+        """
+        Like HTTPClient, only failures to connect are retried, a read timeout may already have reached the API.
+        """
+        import aiohttp
+        # aiohttp >= 3.10 tells connect timeouts apart, older versions don't and theirs aren't retried
+        connect_timeout_error = getattr(aiohttp, "ConnectionTimeoutError", ())
+        if isinstance(error, asyncio.TimeoutError):
+            return isinstance(error, connect_timeout_error)
+        return isinstance(error, aiohttp.ClientConnectionError)
+
+    async def post_json(self, url, payload, headers=None):
+        """
+        POST payload as JSON and return the decoded JSON response.
+
+        :raises aiohttp.ClientResponseError: for an error status once the retries are used up
+        :raises aiohttp.ClientConnectionError: for connection errors once the retries are used up
+        :raises asyncio.TimeoutError: for a read timeout right away, and for connect timeouts once the retries are used up
+        """
+        import aiohttp
+        session = self.get_session()
+        histogram = self.histogram(url)
+        attempt = 0
+        while True:
+            start_time = time.perf_counter()
+            try:
+                async with session.post(url, json=payload, headers=headers) as response:
+                    if response.ok:
+                        result = await response.json(content_type=None)
+                        histogram.record(time.perf_counter() - start_time)
+                        return result
+                    histogram.record(time.perf_counter() - start_time)
+                    if not self.retry_policy.should_retry(attempt, response.status):
+                        histogram.errors += 1
+                        response.raise_for_status()
+                    delay = self.retry_policy.delay(attempt, response.headers)
+                    logging.warning(f"POST {url} returned {response.status}, retrying in {delay:.2f}s")
+            except aiohttp.ClientResponseError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                histogram.record(time.perf_counter() - start_time)
+                if not self.is_retryable(e) or not self.retry_policy.should_retry(attempt):
+                    histogram.errors += 1
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                logging.warning(f"POST {url} failed ({e!r}), retrying in {delay:.2f}s")
+            histogram.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {url: histogram.stats() for url, histogram in self.latencies.items()}
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+# Shared clients, so every API wrapper instance reuses the same connection pools
+http_client = HTTPClient()
+async_http_client = AsyncHTTPClient()
@@ -132,6 +132,93 @@ def combine_images(images, orientation='vertical', padding=10):
 
     return combined_image
 
+def overlapping_pairs(boxes):
+    """
+    Find every pair of overlapping boxes with a sweep over the x axis, touching edges count as overlapping.
+
+    Args:
+    - boxes (np.ndarray): (N, 4) array of x1, y1, x2, y2.
+
+    Returns:
+    - tuple of np.ndarray: (i, j) indices of the overlapping pairs, each pair appears once.
+    """
+    order = np.argsort(boxes[:, 0], kind='stable')
+    sorted_boxes = boxes[order]
+    # boxes after position p in x1 order overlap it on the x axis up to the first box starting past its x2
+    ends = np.searchsorted(sorted_boxes[:, 0], sorted_boxes[:, 2], side='right')
+    starts = np.arange(1, len(boxes) + 1)
+    counts = np.maximum(ends - starts, 0)
+    first = np.repeat(np.arange(len(boxes)), counts)
+    second = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+
+    a, b = sorted_boxes[first], sorted_boxes[second]
+    overlap = (a[:, 1] <= b[:, 3]) & (b[:, 1] <= a[:, 3])
+    return order[first[overlap]], order[second[overlap]]
+
+def connected_components(num_nodes, first, second):
+    """
+    Label the connected components of a graph given as an edge list, every node gets the smallest index in its component.
+    """
+    labels = np.arange(num_nodes)
+    while True:
+        # pull the smaller label of every edge to both ends, then jump pointers to shortcut long chains
+        smallest = np.minimum(labels[first], labels[second])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, first, smallest)
+        np.minimum.at(new_labels, second, smallest)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+def merge_overlapping_rectangles(rectangles):
+    """
+    Merge overlapping rectangles until none of the merged rectangles overlap.
+
+    Overlapping boxes are grouped as connected components, the bounding box of every group
+    is taken and groups whose bounding boxes now overlap are merged again until stable.
+
+    Args:
+    - rectangles (list): List of rectangles, each a pair of points ((x1, y1), (x2, y2)).
+
+    Returns:
+    - tuple: (merged rectangles, labels) where labels[i] is the index of the merged rectangle
+      holding rectangles[i]. Merged rectangles are ordered by their first input rectangle and
+      rectangles that weren't merged are returned as is.
+    """
+    if len(rectangles) == 0:
+        return [], []
+    boxes = np.array([(r[0][0], r[0][1], r[1][0], r[1][1]) for r in rectangles], dtype=np.float64)
+
+    labels = np.arange(len(boxes))
+    group_boxes = boxes
+    while True:
+        first, second = overlapping_pairs(group_boxes)
+        if len(first) == 0:
+            break
+        labels = connected_components(len(group_boxes), first, second)[labels]
+        labels = np.unique(labels, return_inverse=True)[1]
+
+        # bounding box of every group, groups whose boxes now overlap get merged in the next round
+        order = np.argsort(labels, kind='stable')
+        group_starts = np.flatnonzero(np.r_[True, np.diff(labels[order]) != 0])
+        group_boxes = np.concatenate([np.minimum.reduceat(boxes[order, :2], group_starts),
+                                      np.maximum.reduceat(boxes[order, 2:], group_starts)], axis=1)
+
+    # groups are numbered in order of their first rectangle since np.unique sorts the labels
+    # and every group is labelled by its smallest member
+    merged = []
+    members = [[] for _ in range(len(group_boxes))]
+    for index, label in enumerate(labels.tolist()):
+        members[label].append(rectangles[index])
+    for group in members:
+        if len(group) == 1:
+            merged.append(group[0])
+        else:
+            merged.append([(min(r[0][0] for r in group), min(r[0][1] for r in group)),
+                           (max(r[1][0] for r in group), max(r[1][1] for r in group))])
+    return merged, labels.tolist()
+
 if __name__ == "__main__":
     # Example usage
     img_path1 = 'window_capture.jpg'
@@ -0,0 +1,278 @@
+import time
+import numpy as np
+import imagehash
+
+# number of set bits for every possible byte value, used to popcount packed hashes
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+EVICTION_POLICIES = ('lru', 'lfu')
+
+
+def pack_hash(img_hash):
+    """
+    Pack an imagehash.ImageHash into a flat uint8 array (8 bits per byte).
+
+    :param img_hash: imagehash.ImageHash object
+    :return: 1D numpy uint8 array
+    """
+    return np.packbits(np.asarray(img_hash.hash, dtype=bool).flatten())
+
+
+def hamming_distances(packed_hashes, packed_query):
+    """
+    Hamming distance between a query and every row of a packed hash array.
+
+    :param packed_hashes: (N, nbytes) uint8 array
+    :param packed_query: (nbytes,) uint8 array
+    :return: (N,) array of distances
+    """
+    return POPCOUNT_TABLE[np.bitwise_xor(packed_hashes, packed_query)].sum(axis=1, dtype=np.int32)
+
+
+def estimate_size(value):
+    """
+    Cheap estimate of the serialized size of a cache entry in bytes, walking strings, bytes,
+    containers and hashes without serializing anything.
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return 8 + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 8 + sum(estimate_size(item) for item in value)
+    if isinstance(value, imagehash.ImageHash):
+        return value.hash.size // 8
+    return 8
+
+
+class ImageHashCache:
+    """
+    Cache of OCR/translation results looked up by nearest perceptual image hash.
+
+    Hashes are stored packed in a NumPy bit array and indexed with multi-index hashing:
+    each hash is split into `num_chunks` chunks, and any hash closer than `threshold`
+    bits to the query shares at least one chunk with it exactly (pigeonhole principle),
+    so only entries in the matching chunk buckets have to be compared.
+
+    The cache can be bounded by number of entries and/or approximate bytes, evicting the
+    least recently used ('lru') or least frequently used ('lfu') entry, and entries older
+    than `ttl` seconds are never returned.
+    """
+
+    def __init__(self, entries=None, hash_size=16, threshold=7, num_chunks=8,
+                 max_entries=None, max_bytes=None, policy='lru', ttl=None):
+        """
+        :param entries: Optional list of cache entries (dicts holding an imagehash under 'hash')
+        :param hash_size: Size used for imagehash.average_hash
+        :param threshold: A lookup only hits if the distance is strictly less than this
+        :param num_chunks: Number of chunks used for the multi-index, must be >= threshold
+        :param max_entries: Maximum number of entries kept, None for unbounded
+        :param max_bytes: Maximum approximate size of the entries in bytes, None for unbounded
+        :param policy: Eviction policy, 'lru' or 'lfu'
+        :param ttl: Seconds after which an entry expires, None to never expire
+        """
+        nbytes = hash_size * hash_size // 8
+        if num_chunks < threshold or nbytes % num_chunks != 0:
+            raise ValueError(f"Invalid num_chunks {num_chunks} for threshold {threshold} and hash_size {hash_size}")
+        self.hash_size = hash_size
+        self.threshold = threshold
+        self.num_chunks = num_chunks
+        self.chunk_bytes = nbytes // num_chunks
+
+        # entries live in slots, removed slots are None and get reused
+        self._slots = []
+        self._free_slots = []
+        self._hashes = np.zeros((64, nbytes), dtype=np.uint8)
+        self._buckets = [{} for _ in range(num_chunks)]
+        self._created = np.zeros(64)
+        self._inserted = np.zeros(64, dtype=np.int64)
+        self._last_used = np.zeros(64)
+        self._use_count = np.zeros(64, dtype=np.int64)
+        self._sizes = np.zeros(64, dtype=np.int64)
+        self._live = np.zeros(64, dtype=bool)
+        self._clock = 0
+
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self.set_limits(max_entries, max_bytes, policy, ttl)
+
+        for entry in entries or []:
+            self.append(entry)
+
+    def set_limits(self, max_entries=None, max_bytes=None, policy='lru', ttl=None):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Invalid eviction policy {policy}, expected one of {EVICTION_POLICIES}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.ttl = ttl
+        self._evict()
+
+    def __len__(self):
+        return len(self._slots) - len(self._free_slots)
+
+    def __getitem__(self, index):
+        entry = self._slots[index]
+        if entry is None:
+            raise IndexError(f"cache entry {index} was evicted")
+        return entry
+
+    @property
+    def entries(self):
+        """Live entries, oldest first."""
+        live = np.flatnonzero(self._live)
+        order = live[np.argsort(self._inserted[live])]
+        return [self._slots[index] for index in order]
+
+    def compute_hash(self, img):
+        return imagehash.average_hash(img, self.hash_size)
+
+    def _chunks(self, packed):
+        for chunk_index in range(self.num_chunks):
+            start = chunk_index * self.chunk_bytes
+            yield chunk_index, packed[start:start + self.chunk_bytes].tobytes()
+
+    def _tick(self):
+        # monotonic counter, gives a strict recency order for lru and for ties
+        self._clock += 1
+        return self._clock
+
+    def _grow(self):
+        size = len(self._hashes)
+        self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        for name in ('_created', '_inserted', '_last_used', '_use_count', '_sizes', '_live'):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros(size, dtype=array.dtype)]))
+
+    def append(self, entry, size=None):
+        """
+        Add an entry to the cache, evicting other entries if the cache is over its limits.
+
+        :param entry: dict with at least a 'hash' key holding an imagehash.ImageHash
+        :param size: Size of the entry in bytes counted against max_bytes, eg. its record size in the store, estimated when None
+        :return: index of the new entry
+        """
+        entry.setdefault('created', time.time())
+
+        if self._free_slots:
+            index = self._free_slots.pop()
+            self._slots[index] = entry
+        else:
+            index = len(self._slots)
+            if index == len(self._hashes):
+                self._grow()
+            self._slots.append(entry)
+
+        packed = pack_hash(entry['hash'])
+        self._hashes[index] = packed
+        for chunk_index, key in self._chunks(packed):
+            self._buckets[chunk_index].setdefault(key, set()).add(index)
+
+        self._created[index] = entry['created']
+        self._inserted[index] = self._last_used[index] = self._tick()
+        self._use_count[index] = 0
+        self._sizes[index] = estimate_size(entry) if size is None else size
+        self._live[index] = True
+        self.total_bytes += int(self._sizes[index])
+
+        self._evict(keep=index)
+        return index
+
+    def remove(self, index):
+        if not self._live[index]:
+            return
+        for chunk_index, key in self._chunks(self._hashes[index]):
+            bucket = self._buckets[chunk_index][key]
+            bucket.discard(index)
+            if not bucket:
+                del self._buckets[chunk_index][key]
+        self.total_bytes -= int(self._sizes[index])
+        self._live[index] = False
+        self._slots[index] = None
+        self._free_slots.append(index)
+
+    def _over_limit(self):
+        if self.max_entries is not None and len(self) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
+
+    def _evict(self, keep=None):
+        if self.ttl is not None:
+            self.expire()
+
+        while self._over_limit():
+            live = self._live.copy()
+            if keep is not None and len(self) > 1:
+                live[keep] = False
+            candidates = np.flatnonzero(live)
+            if self.policy == 'lfu':
+                # least used first, least recently used among equals
+                victim = candidates[np.lexsort((self._last_used[candidates], self._use_count[candidates]))[0]]
+            else:
+                victim = candidates[np.argmin(self._last_used[candidates])]
+            self.remove(victim)
+            self.evictions += 1
+
+    def expire(self, now=None):
+        """Remove all entries older than ttl."""
+        if self.ttl is None:
+            return
+        now = time.time() if now is None else now
+        for index in np.flatnonzero(self._live & (self._created < now - self.ttl)):
+            self.remove(index)
+            self.expirations += 1
+
+    def find_closest(self, img_hash):
+        """
+        Find the closest cached entry to img_hash.
+
+        :param img_hash: imagehash.ImageHash of the query image
+        :return: index of the closest entry if its distance is below threshold, otherwise None
+        """
+        packed = pack_hash(img_hash)
+
+        candidates = set()
+        for chunk_index, key in self._chunks(packed):
+            candidates.update(self._buckets[chunk_index].get(key, ()))
+
+        closest_entry = None
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            if self.ttl is not None:
+                expired = candidates[self._created[candidates] < time.time() - self.ttl]
+                for index in expired:
+                    self.remove(index)
+                    self.expirations += 1
+                candidates = candidates[self._live[candidates]]
+
+        if len(candidates):
+            distances = hamming_distances(self._hashes[candidates], packed)
+            min_diff = distances.min()
+            if min_diff < self.threshold:
+                # on ties prefer the most recently added entry
+                closest = candidates[distances == min_diff]
+                closest_entry = int(closest[np.argmax(self._inserted[closest])])
+
+        if closest_entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._last_used[closest_entry] = self._tick()
+            self._use_count[closest_entry] += 1
+        return closest_entry
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
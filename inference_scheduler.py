@@ -0,0 +1,179 @@
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+import cv2
+import numpy as np
+
+
+class InferenceScheduler:
+    """
+    Batches inference requests from every user session.
+
+    Each session thread submits one item and waits on a Future. A single worker thread
+    collects the pending items for up to max_wait seconds (or until max_batch items are
+    waiting), runs them through batch_fn as one batch and routes each result back.
+    """
+
+    def __init__(self, batch_fn, max_batch=16, max_wait=0.005, name="inference", timeout=60):
+        """
+        :param batch_fn: Callable taking a list of items and returning a list of results in the same order
+        :param max_batch: Maximum number of items per batch
+        :param max_wait: Seconds to wait for more items once the first one arrives
+        :param name: Name used for the worker thread and in logs
+        :param timeout: Seconds a caller waits for its result before giving up
+        """
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.timeout = timeout
+
+        self.batches = 0
+        self.items = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"{name}-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """
+        Queue an item for the next batch.
+
+        :return: concurrent.futures.Future resolved with the item's result
+        """
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """
+        Run a single item through the next batch and wait for its result.
+
+        :raises concurrent.futures.TimeoutError: if the result doesn't arrive within timeout seconds
+        """
+        return self.submit(item).result(timeout=self.timeout)
+
+    def _collect(self):
+        requests = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(requests) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                requests.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            items = [item for item, _ in requests]
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(items):
+                    raise ValueError(f"{self.name} returned {len(results)} results for a batch of {len(items)}")
+            except Exception as e:
+                logging.error(f"{self.name} batch of {len(items)} failed: {e}")
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            for (_, future), result in zip(requests, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "pending": self._queue.qsize(),
+        }
+
+
+def group_by_shape(images):
+    """
+    Group array indices by image shape, since only same sized images can be stacked into one batch.
+
+    :return: dict of shape -> list of indices
+    """
+    groups = {}
+    for index, image in enumerate(images):
+        groups.setdefault(np.shape(image), []).append(index)
+    return groups
+
+
+def easyocr_detect_batch(reader):
+    """
+    Batch function for easyocr text detection, the output per image is in the format of reader.detect for a single image.
+
+    :param reader: easyocr.Reader (or a SharedModel wrapping one)
+    """
+    def detect(images):
+        results = [None] * len(images)
+        for shape, indices in group_by_shape(images).items():
+            if len(indices) == 1:
+                results[indices[0]] = reader.detect(images[indices[0]])
+                continue
+            horizontal_list_agg, free_list_agg = reader.detect(np.stack([images[i] for i in indices]), reformat=False)
+            for index, horizontal_list, free_list in zip(indices, horizontal_list_agg, free_list_agg):
+                results[index] = ([horizontal_list], [free_list])
+        return results
+    return detect
+
+
+def rgb_to_grey(image):
+    """
+    Grayscale of an RGB array for easyocr recognition. easyocr takes a colour array as BGR when it
+    builds the grayscale, so it is computed here with the right channel weights.
+    """
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+
+def easyocr_readtext(reader, image, detail=1):
+    """
+    reader.readtext(image, detail=detail) for an RGB array: detection runs on the RGB image,
+    recognition on its correct grayscale.
+
+    :param reader: easyocr.Reader (or a SharedModel wrapping one)
+    :param image: The image as an RGB NumPy array
+    """
+    horizontal_list, free_list = reader.detect(image)
+    return reader.recognize(rgb_to_grey(image), horizontal_list[0], free_list[0], detail=detail)
+
+
+def easyocr_readtext_batch(reader):
+    """
+    Batch function for easyocr detection + recognition of RGB arrays, the output per image is the same as easyocr_readtext.
+
+    :param reader: easyocr.Reader (or a SharedModel wrapping one)
+    """
+    def readtext(images):
+        results = [None] * len(images)
+        for shape, indices in group_by_shape(images).items():
+            if len(indices) == 1:
+                results[indices[0]] = easyocr_readtext(reader, images[indices[0]])
+                continue
+            horizontal_list_agg, free_list_agg = reader.detect(np.stack([images[i] for i in indices]), reformat=False)
+            for index, horizontal_list, free_list in zip(indices, horizontal_list_agg, free_list_agg):
+                results[index] = reader.recognize(rgb_to_grey(images[index]), horizontal_list, free_list, detail=1)
+        return results
+    return readtext
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_shared_scheduler(key, factory):
+    """
+    Return the process-wide scheduler for key, creating it with factory() the first time.
+    """
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = factory()
+        return _schedulers[key]
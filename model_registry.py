@@ -0,0 +1,103 @@
+import threading
+import time
+import logging
+
+
+def estimate_model_memory(model):
+    """
+    Approximate memory in bytes held by the torch parameters and buffers of a model.
+
+    :param model: Any object, its attributes that are torch modules (eg. easyocr's detector and recognizer) are counted
+    :return: Number of bytes, 0 if nothing could be measured
+    """
+    modules = [model] if hasattr(model, 'parameters') else [v for v in vars(model).values() if hasattr(v, 'parameters')]
+    total = 0
+    for module in modules:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class SharedModel:
+    """
+    A model shared by every user session. Method calls are serialized with a lock, since
+    inference on a single easyocr Reader from several threads at once isn't safe.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name in ('model', 'lock'):
+            raise AttributeError(name)
+        attr = getattr(self.model, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded models keyed by (engine, languages), so each model
+    is loaded once and shared by every UserVideo instead of once per connection.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._info = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, engine, languages, loader):
+        """
+        Return the shared model for (engine, languages), loading it with loader() the first time.
+
+        :param engine: Name of the model engine eg. 'easyocr'
+        :param languages: Iterable of language codes the model was loaded for
+        :param loader: Callable returning the model
+        :return: SharedModel wrapping the model
+        """
+        key = (engine, tuple(languages))
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # loading one model doesn't block lookups or loads of other models
+        with key_lock:
+            model = self._models.get(key)
+            if model is None:
+                start_time = time.time()
+                model = SharedModel(loader())
+                load_seconds = time.time() - start_time
+                with self._lock:
+                    self._models[key] = model
+                    self._info[key] = {
+                        "engine": engine,
+                        "languages": list(languages),
+                        "load_seconds": load_seconds,
+                        "memory_bytes": estimate_model_memory(model.model),
+                    }
+                logging.info(f"Loaded model {key} in {load_seconds:.2f} seconds, {self._info[key]['memory_bytes'] / 2**20:.1f} MB")
+        return model
+
+    def get_easyocr_reader(self, languages):
+        import easyocr
+        return self.get('easyocr', languages, lambda: easyocr.Reader(list(languages)))
+
+    def loaded_models(self):
+        """
+        :return: list of dicts describing every loaded model and its approximate memory
+        """
+        with self._lock:
+            return [dict(info) for info in self._info.values()]
+
+
+# Create a shared registry instance
+model_registry = ModelRegistry()
@@ -1,30 +1,44 @@
 import io
 import time
 import logging
+import numpy as np
+import requests
 from PIL import Image, ImageDraw
-import easyocr
 from openai_api import OpenAI_API
-from image_diff import crop_image_by_bboxes, combine_images
+from image_diff import crop_image_by_bboxes, combine_images, merge_overlapping_rectangles
 from ocr_enum import OCREngine
 import re
 from utils import clean_vision_model_output
+from model_registry import model_registry
+from inference_scheduler import InferenceScheduler, get_shared_scheduler, easyocr_detect_batch, easyocr_readtext, easyocr_readtext_batch
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
 class OCRProcessor:
-    def __init__(self, language='en', method=OCREngine.EASYOCR):
+    def __init__(self, language='en', method=OCREngine.EASYOCR, batch_inference=False):
         """
         Initialize the OCRProcessor with the specified language and method.
 
         :param language: The language for OCR ('en' for English, 'jp' for Japanese)
         :param method: The OCR method to use (easyocr, openai)
+        :param batch_inference: Batch easyocr calls with the other OCRProcessors in this process through shared InferenceSchedulers
         """
         self.lang = language
-        self.reader = easyocr.Reader(['en']) if language == 'en' else easyocr.Reader(['en', 'ja'])
+        languages = ['en'] if language == 'en' else ['en', 'ja']
+        # the reader is loaded once per process and shared by every OCRProcessor
+        self.reader = model_registry.get_easyocr_reader(languages)
         self.openai_api = OpenAI_API()
         self.method = method
 
+        self.detect_scheduler = None
+        self.readtext_scheduler = None
+        if batch_inference:
+            self.detect_scheduler = get_shared_scheduler(('easyocr_detect', tuple(languages)),
+                                                         lambda: InferenceScheduler(easyocr_detect_batch(self.reader), name="easyocr_detect"))
+            self.readtext_scheduler = get_shared_scheduler(('easyocr_readtext', tuple(languages)),
+                                                           lambda: InferenceScheduler(easyocr_readtext_batch(self.reader), name="easyocr_readtext"))
+
     def process_image(self, image):
         """
         Convert a PIL Image to bytes.
@@ -37,18 +51,32 @@ class OCRProcessor:
         image_bytes = byte_buffer.getvalue()
         return image_bytes
 
-    def draw_highlight(self, image_bytes, result, outline_color="red", text_color="yellow", outline_width=2):
+    def image_to_array(self, image):
+        """
+        Convert a PIL Image to an RGB NumPy array that easyocr can read directly, without encoding it.
+
+        :param image: The input PIL Image
+        :return: The image as a (height, width, 3) uint8 array
+        """
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return np.asarray(image)
+
+    def draw_highlight(self, image, result, outline_color="red", text_color="yellow", outline_width=2):
         """
-        Draw bounding boxes and text on the image based on OCR results.
+        Draw bounding boxes and text on a copy of the image based on OCR results.
 
-        :param image_bytes: The image in bytes
+        :param image: The input PIL Image, or the image in bytes
         :param result: OCR result containing bounding boxes and text
         :param outline_color: Color of the bounding box outline
         :param text_color: Color of the text
         :param outline_width: Width of the bounding box outline
         :return: The annotated image as a PIL Image
         """
-        drawable_image = Image.open(io.BytesIO(image_bytes))
+        if isinstance(image, bytes):
+            drawable_image = Image.open(io.BytesIO(image))
+        else:
+            drawable_image = image.convert('RGB') if image.mode != 'RGB' else image.copy()
         draw = ImageDraw.Draw(drawable_image)
         for bbox, text, prob in result:
             try:
@@ -69,27 +97,39 @@ class OCRProcessor:
         """
         return [(bbox, text, prob) for bbox, text, prob in result if not any(keyword in text.lower() for keyword in exclude_keywords)]
 
-    def ocr_easyocr(self, image_bytes, detail=1):
+    def ocr_easyocr(self, image, detail=1):
         """
         Perform OCR using easyocr.
 
-        :param image_bytes: The image in bytes
+        :param image: The image as an RGB NumPy array, or in bytes
         :param detail: Level of detail for OCR results
         :return: OCR result containing bounding boxes and text
         """
-        return self.reader.readtext(image_bytes, detail=detail)
+        if isinstance(image, np.ndarray):
+            if self.readtext_scheduler is not None and detail == 1:
+                return self.readtext_scheduler(image)
+            # readtext would build the recognition grayscale as if the array were BGR
+            return easyocr_readtext(self.reader, image, detail=detail)
+        return self.reader.readtext(image, detail=detail)
     
-    def det_easyocr(self, image_bytes):
+    def det_easyocr(self, image):
         """
         Perform text detection using easyocr.
 
-        :param image_bytes: The image in byes
+        :param image: The image as an RGB NumPy array, or in bytes
         :return:OCR result containing bounding boxes
         """
-        return self.reformat(self.reader.detect(image_bytes))
+        if self.detect_scheduler is not None and isinstance(image, np.ndarray):
+            return self.reformat(self.detect_scheduler(image))
+        return self.reformat(self.reader.detect(image))
     
     def ocr_openai(self, image_bytes):
-        response = self.openai_api.call_vision_api(image_bytes)
+        try:
+            response = self.openai_api.call_vision_api(image_bytes)
+        except requests.RequestException as e:
+            # no choices in the response, the frame is read as having no text
+            logging.error(f"Vision API call failed: {e}")
+            return {}
         return response
 
 
@@ -100,15 +140,15 @@ class OCRProcessor:
         :param image: The input PIL Image
         :return: Tuple containing the concatenated detected text, annotated image, and OCR result
         """
-        image_bytes = self.process_image(image)
+        image_array = self.image_to_array(image)
         if self.method == OCREngine.EASYOCR:
-            result = self.ocr_easyocr(image_bytes, detail=1)
+            result = self.ocr_easyocr(image_array, detail=1)
             filtered_result = self.filter_ocr_result(result)
-            drawable_image = self.draw_highlight(image_bytes, filtered_result)
+            drawable_image = self.draw_highlight(image, filtered_result)
             filtered_text = ' '.join([text for _, text, _ in filtered_result])
             return filtered_text, drawable_image, filtered_result, None
         elif self.method == OCREngine.OPENAI:
-            detection_result = self.det_easyocr(image_bytes)
+            detection_result = self.det_easyocr(image_array)
             if detection_result != []:
                 bboxes = [i[0] for i in detection_result]
                 # 4 points to 2 points
@@ -116,8 +156,9 @@ class OCRProcessor:
                 bbox_cropped_images = crop_image_by_bboxes(image, bboxes)
                 dialogue_box_img = combine_images(bbox_cropped_images, 'horizontal')
                 # dialogue_box_img = image_crop_dialogue_box(image, detection_result)
+                # the vision API needs an encoded image
                 dialogue_box_image_bytes = self.process_image(dialogue_box_img)
-                drawable_image = self.draw_highlight(image_bytes, detection_result)
+                drawable_image = self.draw_highlight(image, detection_result)
                 response = self.ocr_openai(dialogue_box_image_bytes)
                 if response.get('choices', None) is None:
                     reg_result = ''
@@ -135,9 +176,8 @@ class OCRProcessor:
         :param image: The input PIL Image
         :return: Tuple containing the annotated image, and Detection result
         """
-        image_bytes = self.process_image(image)
-        result = self.det_easyocr(image_bytes)
-        drawable_image = self.draw_highlight(image_bytes, result)
+        result = self.det_easyocr(self.image_to_array(image))
+        drawable_image = self.draw_highlight(image, result)
         return drawable_image, result
 
     def combine_overlapping_rectangles(self, rectangles):
@@ -150,35 +190,7 @@ class OCRProcessor:
         Returns:
             list of tuples: A list of combined rectangles.
         """
-        combined_rectangles = list(rectangles)  # Make a copy of the input list
-
-        while True:
-            overlap_found = False
-            new_rectangles = []
-
-            i = 0
-            while i < len(combined_rectangles):
-                rect1 = combined_rectangles[i]
-                combined = False
-                for j in range(i + 1, len(combined_rectangles)):
-                    rect2 = combined_rectangles[j]
-                    if self.check_overlap(rect1, rect2):
-                        combined_rect = self.combine_rectangles(rect1, rect2)
-                        new_rectangles.append(combined_rect)
-                        combined_rectangles.pop(j)
-                        overlap_found = True
-                        combined = True
-                        break
-
-                if not combined:
-                    new_rectangles.append(rect1)
-                i += 1
-
-            combined_rectangles = new_rectangles
-
-            if not overlap_found:
-                break
-
+        combined_rectangles, _ = merge_overlapping_rectangles(rectangles)
         return combined_rectangles
 
     def check_overlap(self, rect1, rect2):
@@ -238,16 +250,15 @@ class OCRProcessor:
             text_regions.append((points, text))
         
         # Combine overlapping rectangles into a single rectangle
-        combined_regions = self.combine_overlapping_rectangles([region[0] for region in text_regions])
+        combined_regions, labels = merge_overlapping_rectangles([region[0] for region in text_regions])
         
-        # Update the combined regions with the recognized text
+        # Update the combined regions with the recognized text, a region only overlaps the combined region it was merged into
+        texts = [[] for _ in combined_regions]
+        for region, label in zip(text_regions, labels):
+            texts[label].append(region[1])
         final_regions = []
-        for combined_region in combined_regions:
-            text = ""
-            for region in text_regions:
-                if self.check_overlap(region[0], combined_region):
-                    text += region[1] + " "
-            text = text.strip()
+        for combined_region, region_texts in zip(combined_regions, texts):
+            text = " ".join(region_texts).strip()
             final_regions.append((combined_region, text))
         
         return final_regions
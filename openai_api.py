@@ -2,7 +2,8 @@ from dotenv import load_dotenv
 
 import os
 import base64
-import requests
+import json
+from http_client import http_client, async_http_client
 
 load_dotenv()
 OpenAI_API_KEY = os.environ.get("OPENAI_ACCESS_TOKEN")
@@ -16,15 +17,28 @@ class OpenAI_API:
         self.openai_url = "https://api.openai.com/v1/chat/completions"
         self.lang_list = {'en' : 'English', 'jp' : 'Japanese'}
 
-    def call_api(self, payload):
-        headers = {
+    def headers(self):
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {OpenAI_API_KEY}"
         }
 
-        response = requests.post(self.openai_url, headers=headers, json=payload)
-        print(response.json())
-        return response.json()
+    def call_api(self, payload):
+        """
+        :raises requests.RequestException: when the request still fails after the retries
+        """
+        # pooled connection with timeouts, rate limits and server errors are retried with backoff
+        response_json = http_client.post_json(self.openai_url, payload, headers=self.headers())
+        print(response_json)
+        return response_json
+
+    async def async_call_api(self, payload):
+        """
+        call_api for the asyncio server, doesn't block the event loop.
+
+        :raises aiohttp.ClientError, asyncio.TimeoutError: when the request still fails after the retries
+        """
+        return await async_http_client.post_json(self.openai_url, payload, headers=self.headers())
 
     def call_translation_api(self, content, target_lang):
 
@@ -42,6 +56,38 @@ class OpenAI_API:
         
         return response_json
     
+    def call_batch_translation_api(self, contents, target_lang):
+        """
+        Translate several lines in one request.
+
+        :param contents: list of strings
+        :return: list of translations in the same order
+        :raises ValueError: if the response doesn't hold one translation per line
+        """
+        target_lang = self.lang_list.get(target_lang, target_lang)
+        lines = json.dumps(list(contents), ensure_ascii=False)
+        payload = {
+            "model": self.translation_model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are trained to translate lines of video game dialogue. You are a helpful and great assistant designed to output JSON in this format {\"translations\": [...]}, one translation per input line in the same order."
+                },
+                {
+                    "role": "user",
+                    "content": f"Translate each of these lines into {target_lang}.\n{lines}"
+                }
+            ],
+            "response_format": {"type": "json_object"},
+            "max_tokens": min(4096, 100 * len(contents) + 100)
+            }
+
+        response_json = self.call_api(payload)
+        translations = json.loads(response_json['choices'][0]['message']['content']).get('translations')
+        if not isinstance(translations, list) or len(translations) != len(contents):
+            raise ValueError(f"Expected {len(contents)} translations, got {translations!r}")
+        return [str(translation) for translation in translations]
+
     def call_translation_vision_api(self, image, target_lang):
 
         # content = content if type(content) is str else f"{content.get('name', '')} : {content.get('dialogue', '')}"
@@ -71,10 +117,7 @@ class OpenAI_API:
         "max_tokens": 300
         }
 
-        response_json = self.call_api(payload)
-        if response_json.get('choices', None) is None:
-            response_json = self.call_api(payload)
-        return response_json
+        return self.call_api(payload)
     
     def set_translation_payload(self, content, target_lang):
         self.translation_message = [
@@ -0,0 +1,234 @@
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from PIL import Image, ImageFont
+from image_diff import merge_overlapping_rectangles
+
+
+def annotations_key(annotations):
+    """
+    Hashable key of a list of (bbox, text) annotations, bboxes are lists of points.
+    """
+    return tuple((tuple(tuple(point) for point in bbox), text) for bbox, text in annotations)
+
+
+def padded_box_groups(boxes, pad, width, height):
+    """
+    Clip boxes to the frame and group the ones whose padded areas overlap, so every group is blurred once.
+
+    :param boxes: list of (x1, y1, x2, y2) boxes, both corners inclusive
+    :return: list of ((left, top, right, bottom) padded crop, list of clipped boxes inside it), right and bottom exclusive
+    """
+    clipped = []
+    for x1, y1, x2, y2 in boxes:
+        x1, y1, x2, y2 = max(0, int(x1)), max(0, int(y1)), min(width - 1, int(x2)), min(height - 1, int(y2))
+        if x1 <= x2 and y1 <= y2:
+            clipped.append((x1, y1, x2, y2))
+    if not clipped:
+        return []
+
+    padded = [[(max(0, x1 - pad), max(0, y1 - pad)), (min(width, x2 + 1 + pad), min(height, y2 + 1 + pad))] for x1, y1, x2, y2 in clipped]
+    crops, labels = merge_overlapping_rectangles(padded)
+    groups = [((*crop[0], *crop[1]), []) for crop in crops]
+    for box, label in zip(clipped, labels):
+        groups[label][1].append(box)
+    return groups
+
+
+def blur_regions_array(frame_data, boxes, radius=10):
+    """
+    Gaussian blur the inside of boxes of an image array in place.
+
+    Boxes are blurred from crops padded by the kernel radius (3 * radius), boxes close
+    together share one crop. The pixels inside the boxes come out the same as with a
+    full frame cv2.GaussianBlur.
+
+    :param frame_data: (height, width, channels) uint8 array, written to
+    :param boxes: list of (x1, y1, x2, y2) boxes, both corners inclusive
+    :param radius: Sigma of the Gaussian blur
+    :return: frame_data
+    """
+    height, width = frame_data.shape[:2]
+    # blur every crop before writing any box back, groups can overlap once merged
+    blurred_boxes = []
+    for (left, top, right, bottom), group in padded_box_groups(boxes, int(3 * radius), width, height):
+        blurred = cv2.GaussianBlur(frame_data[top:bottom, left:right], (0, 0), radius)
+        for x1, y1, x2, y2 in group:
+            blurred_boxes.append(((x1, y1, x2, y2), blurred[y1 - top:y2 + 1 - top, x1 - left:x2 + 1 - left]))
+
+    for (x1, y1, x2, y2), blurred in blurred_boxes:
+        frame_data[y1:y2 + 1, x1:x2 + 1] = blurred
+    return frame_data
+
+
+def blur_regions(image, boxes, radius=10):
+    """
+    Gaussian blur the inside of boxes of a PIL Image, leaving the rest of the image untouched.
+
+    Like blur_regions_array only the padded crops are converted to arrays and blurred.
+
+    :param image: PIL Image
+    :param boxes: list of (x1, y1, x2, y2) boxes, both corners inclusive
+    :param radius: Sigma of the Gaussian blur
+    :return: new PIL Image, or image itself when no box is inside it
+    """
+    width, height = image.size
+    result = image
+    for (left, top, right, bottom), group in padded_box_groups(boxes, int(3 * radius), width, height):
+        # crop from the original image, so overlapping groups only see original pixels
+        blurred = cv2.GaussianBlur(np.asarray(image.crop((left, top, right, bottom))), (0, 0), radius)
+        if result is image:
+            result = image.copy()
+        for x1, y1, x2, y2 in group:
+            result.paste(Image.fromarray(blurred[y1 - top:y2 + 1 - top, x1 - left:x2 + 1 - left]), (x1, y1))
+    return result
+
+
+class Overlay:
+    """
+    Pre-rendered annotations for one frame size: an RGBA layer cropped to what was drawn, and
+    the annotations dict sent to the client.
+    """
+
+    def __init__(self, layer, out_annotations):
+        self.out_annotations = out_annotations
+        self.box = layer.getbbox()
+        self.layer = layer.crop(self.box) if self.box is not None else None
+        self.layer_rgb = None
+        self.layer_alpha = None
+        if self.layer is not None:
+            layer_data = np.asarray(self.layer, dtype=np.uint16)
+            self.layer_alpha = layer_data[..., 3:]
+            # premultiplied once, every frame only adds the destination's share
+            self.layer_rgb = layer_data[..., :3] * self.layer_alpha
+
+    def apply(self, image):
+        """
+        Alpha blend the overlay onto image, in place for RGB and RGBA images.
+
+        :return: the annotated image
+        """
+        if self.layer is None:
+            return image
+        region = image.crop(self.box)
+        blended = Image.alpha_composite(region.convert("RGBA"), self.layer)
+        if image.mode != "RGBA":
+            blended = blended.convert(image.mode)
+        image.paste(blended, self.box[:2])
+        return image
+
+    def apply_array(self, frame_data):
+        """
+        Alpha blend the overlay onto an RGB image array in place, only the overlay's box is touched.
+
+        :param frame_data: (height, width, 3) uint8 array of the frame size the overlay was rendered for, written to
+        :return: frame_data
+        """
+        if self.layer is None:
+            return frame_data
+        left, top, right, bottom = self.box
+        region = frame_data[top:bottom, left:right]
+        region[...] = (self.layer_rgb + region * (255 - self.layer_alpha) + 127) // 255
+        return frame_data
+
+
+class OverlayCache:
+    """
+    Keeps the Overlay of the current annotations, it is only rendered again when the key changes.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.overlay = None
+        self.renders = 0
+        self.hits = 0
+
+    def get(self, key, render):
+        """
+        :param key: Hashable key of everything the overlay depends on
+        :param render: Callable returning a new Overlay, called when key differs from the cached one
+        """
+        if self.overlay is None or key != self.key:
+            self.overlay = render()
+            self.key = key
+            self.renders += 1
+        else:
+            self.hits += 1
+        return self.overlay
+
+    def stats(self):
+        return {"renders": self.renders, "hits": self.hits}
+
+
+class FontPool:
+    """
+    ImageFont objects of one font file, loaded once per size so fitting text never reads the font file again.
+    """
+
+    def __init__(self, font_path, sizes=()):
+        """
+        :param font_path: Path of the TrueType/OpenType font
+        :param sizes: Font sizes to load up front
+        """
+        self.font_path = font_path
+        self.fonts = {}
+        self.lock = threading.Lock()
+        for size in sizes:
+            self.get(size)
+
+    def get(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            with self.lock:
+                font = self.fonts.get(size)
+                if font is None:
+                    font = ImageFont.truetype(self.font_path, size)
+                    self.fonts[size] = font
+        return font
+
+
+_font_pools = {}
+_font_pools_lock = threading.Lock()
+
+def get_font_pool(font_path, sizes=range(1, 36)):
+    """
+    Return the process-wide FontPool for font_path, every user stream shares it.
+    """
+    with _font_pools_lock:
+        if font_path not in _font_pools:
+            _font_pools[font_path] = FontPool(font_path, sizes)
+        return _font_pools[font_path]
+
+
+class TextLayoutCache:
+    """
+    LRU cache of text layouts (chosen font size, wrapped lines and their metrics) keyed by text, box size and font.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.layouts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        """
+        :param key: Hashable key, eg. (text, box width, box height, font path)
+        :param compute: Callable returning the layout, called on a miss
+        """
+        layout = self.layouts.get(key)
+        if layout is not None:
+            self.hits += 1
+            self.layouts.move_to_end(key)
+            return layout
+
+        self.misses += 1
+        layout = compute()
+        self.layouts[key] = layout
+        if len(self.layouts) > self.max_entries:
+            self.layouts.popitem(last=False)
+        return layout
+
+    def stats(self):
+        return {"entries": len(self.layouts), "hits": self.hits, "misses": self.misses}
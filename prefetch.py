@@ -0,0 +1,183 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from translation_memo import TranslationMemo
+from utils import clean_vision_model_output
+
+
+def format_filename(number):
+    # Format the number with leading zeros to ensure it's four digits
+    return f"ff4_v1_prologue_{number:04d}.mp3"
+
+def audio_path(lang, number):
+    """Path of the voice over of dialogue line number."""
+    return Path(f"output_v2_{lang}_elevenlabs") / format_filename(number)
+
+def line_content(entry):
+    """Text of a dialogue entry as it is sent for translation."""
+    return entry if type(entry) is str else f"{entry.get('name', '')} : {entry.get('dialogue', '')}"
+
+
+class AudioCache:
+    """
+    Bytes of the voice over MP3s kept in memory, so playing a line doesn't touch the disk.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """
+        :return: Bytes of the file at path, read from disk on a miss
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            data = self.entries.get(path)
+            if data is not None:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return data
+            self.misses += 1
+        with open(path, 'rb') as f:
+            data = f.read()
+        self._put(path, data)
+        return data
+
+    def prefetch(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            if path in self.entries:
+                return
+        with open(path, 'rb') as f:
+            data = f.read()
+        self._put(path, data)
+
+    def _put(self, path, data):
+        with self.lock:
+            self.entries[path] = data
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __contains__(self, path):
+        with self.lock:
+            return os.path.abspath(path) in self.entries
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+# Create a shared audio cache instance
+audio_cache = AudioCache()
+
+
+class LinePrefetcher:
+    """
+    Dialogue proceeds line by line, so once lines are matched the next lookahead lines are
+    warmed in the background: their voice over MP3s are read into the AudioCache, and lines
+    without a script translation are translated one by one into the translation memo, see
+    FrameProcessor.translate_lines_from_memo. The next match then plays and renders without
+    disk or API latency.
+    """
+
+    def __init__(self, frameProcessor, audio_cache=audio_cache, lookahead=3, openai_api=None):
+        """
+        :param frameProcessor: FrameProcessor whose dialogues, script translations and translation memo are warmed
+        :param lookahead: Number of lines after the last matched one to prefetch
+        :param openai_api: OpenAI_API used for the translations, defaults to one with frameProcessor's translation model
+        """
+        self.frameProcessor = frameProcessor
+        self.audio_cache = audio_cache
+        self.lookahead = lookahead
+        if openai_api is None:
+            from openai_api import OpenAI_API
+            # its own API instance, OpenAI_API keeps the message being sent in an attribute
+            openai_api = OpenAI_API(translation_model=frameProcessor.openai_api.translation_model)
+        self.openai_api = openai_api
+        # AudioEngine the prefetched lines are also decoded into, set by players like ss.py
+        self.audio_engine = None
+        self.audio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch-audio")
+        self.translation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch-translation")
+        # prefetches queued or running, so a line matched on several frames is only fetched once
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.prefetched_audio = 0
+        self.prefetched_translations = 0
+
+    def next_lines(self, numbers):
+        last = max(numbers)
+        return [number for number in range(last + 1, last + 1 + self.lookahead) if number in self.frameProcessor.dialogues]
+
+    def _submit_once(self, executor, key, fn, *args):
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+
+        def run():
+            try:
+                fn(*args)
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+        executor.submit(run)
+
+    def on_match(self, numbers, translate=None):
+        """
+        Queue the lines after the matched ones, returns right away.
+
+        :param numbers: Matched line numbers
+        :param translate: Translation option of the match eg. "jp,en", None to only prefetch audio
+        """
+        if not numbers:
+            return
+        for number in self.next_lines(numbers):
+            path = audio_path(self.frameProcessor.lang, number)
+            if path not in self.audio_cache:
+                self._submit_once(self.audio_executor, ('audio', path), self._prefetch_audio, path)
+            if translate:
+                target_lang = translate.split(',')[1]
+                self._submit_once(self.translation_executor, ('translation', number, target_lang), self._prefetch_translation, number, target_lang)
+
+    def _prefetch_audio(self, path):
+        try:
+            self.audio_cache.prefetch(path)
+            self.prefetched_audio += 1
+            if self.audio_engine is not None:
+                self.audio_engine.preload(path)
+        except OSError as e:
+            logging.warning(f"Could not prefetch audio {path}: {e}")
+
+    def _prefetch_translation(self, number, target_lang):
+        frameProcessor = self.frameProcessor
+        if frameProcessor.script_translations.get(number, target_lang) is not None:
+            return
+        content = line_content(frameProcessor.dialogues[number])
+        memo_key = TranslationMemo.text_key(content, target_lang, self.openai_api.translation_model)
+        if memo_key in frameProcessor.translation_memo:
+            return
+        try:
+            result = self.openai_api.call_translation_api(content, target_lang)
+            frameProcessor.translation_memo.put(memo_key, clean_vision_model_output(result))
+            self.prefetched_translations += 1
+        except Exception as e:
+            logging.warning(f"Could not prefetch translation of line {number}: {e}")
+
+    def close(self):
+        """Drop the queued prefetches, the running ones finish on their own."""
+        self.audio_executor.shutdown(wait=False, cancel_futures=True)
+        self.translation_executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "prefetched_audio": self.prefetched_audio,
+            "prefetched_translations": self.prefetched_translations,
+            "audio_cache": self.audio_cache.stats(),
+        }
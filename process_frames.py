@@ -6,6 +6,7 @@ import requests
 from cloudvision import detect_text_google_pil, detect_text_google, detect_text_and_draw_boxes
 from thefuzz import fuzz
 import pytesseract
+import re
 import base64
 import json
 from PIL import Image
@@ -15,16 +16,31 @@ import time
 from thread_safe import shared_data_put_data, shared_data_put_line, ThreadSafeData
 from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
-import pickle
 import imagehash
+from image_hash_cache import ImageHashCache
+from dialogue_matcher import DialogueMatcher
+from cache_store import AppendOnlyStore
+from translation_memo import TranslationMemo, get_translation_memo
+from script_translations import ScriptTranslations
+from prefetch import LinePrefetcher, line_content
 from ocr import OCRProcessor
 from ocr_enum import OCREngine
 from utils import clean_vision_model_output
 from image_diff import crop_image_by_bboxes, combine_images
 
 lang_dict = {'en' : 'english', 'jp' : 'japanese'}
+
+# used when enable_cache=True, a dict passed as enable_cache overrides any of these
+DEFAULT_CACHE_OPTIONS = {
+    'namespace' : 'default', # per game namespace, each one has its own cache files
+    'max_entries' : 10000,
+    'max_bytes' : 64 * 1024 * 1024,
+    'policy' : 'lru', # 'lru' or 'lfu'
+    'ttl' : None, # seconds, or a dict per cache type eg. {'translation' : 86400}
+}
+
 class FrameProcessor:
-    def __init__(self, language='en', disable_dialog=False, save_outputs=False, method=OCREngine.EASYOCR):
+    def __init__(self, language='en', disable_dialog=False, save_outputs=False, method=OCREngine.EASYOCR, batch_inference=False):
         self.counter = 0  # Convert the global variable to an instance attribute
         self.disable_dialog = disable_dialog
         self.method = method
@@ -46,69 +62,145 @@ class FrameProcessor:
             self.dialog_file_path = "dialogues_jp_v2.json"
         else:   
             raise("Invalid language")   
-        self.ocr_processor =  OCRProcessor(self.lang, self.method) # comment this if you aren't using easy ocr
+        self.ocr_processor =  OCRProcessor(self.lang, self.method, batch_inference=batch_inference) # comment this if you aren't using easy ocr
 
         if disable_dialog:
             self.dialogues = None
+            self.dialogue_matcher = None
+            self.script_translations = None
         else:
             self.dialogues = self.load_dialogues()
+            self.dialogue_matcher = DialogueMatcher(self.dialogues, self.lang)
+            # precomputed with: python script_translations.py dialogues_jp_v2.json --lang jp
+            self.script_translations = ScriptTranslations.load(self.dialog_file_path, self.dialogues, self.lang)
         #print(self.dialogues)
         #TODO remove this from this class and store this somewhere else, so its multi user
         self.previous_image = Image.new('RGB', (100, 100), (255, 255, 255))
         self.last_played = -1 #TODO this should be per user
+        self.dialogue_cursor = None # last matched line, the matcher searches around it first
+        self.closest_entry_calls = 0
 
         
         self.last_annotations = None
 
         self.openai_api = OpenAI_API()
+        # warms the audio and translations of the lines after each match, OCR_TRANSLATE never matches script lines
+        self.prefetcher = None if disable_dialog or method == OCREngine.OCR_TRANSLATE else LinePrefetcher(self)
 
         self.ocr_cache_pkl_path = Path('ocr_cache.pkl')
         self.translation_cache_pkl_path = Path('translation_cache.pkl')
-        self.ocr_cache = self.load_cache('ocr')
-        self.translation_cache = self.load_cache('translation')
+        self.cache_options = dict(DEFAULT_CACHE_OPTIONS)
+        self.cache_stores = {}
+        # caches are keyed by (cache_type, namespace) and read from disk on first use rather than at startup
+        self._caches = {}
+
+    @property
+    def ocr_cache(self):
+        return self.get_cache('ocr')
+
+    @property
+    def translation_cache(self):
+        return self.get_cache('translation')
+
+    def configure_cache(self, enable_cache):
+        """
+        Apply the cache options passed through enable_cache.
+
+        :param enable_cache: True to use DEFAULT_CACHE_OPTIONS, or a dict overriding some of them
+        """
+        options = dict(DEFAULT_CACHE_OPTIONS)
+        if isinstance(enable_cache, dict):
+            options.update(enable_cache)
+        if options == self.cache_options:
+            return
+        if not re.fullmatch(r'[\w-]+', options['namespace']):
+            raise ValueError(f"Invalid cache namespace: {options['namespace']}")
+
+        self.cache_options = options
+        for (cache_type, namespace), cache in self._caches.items():
+            cache.set_limits(**self.cache_limits(cache_type))
+
+    def cache_limits(self, cache_type):
+        ttl = self.cache_options['ttl']
+        if isinstance(ttl, dict):
+            ttl = ttl.get(cache_type)
+        return {
+            'max_entries' : self.cache_options['max_entries'],
+            'max_bytes' : self.cache_options['max_bytes'],
+            'policy' : self.cache_options['policy'],
+            'ttl' : ttl,
+        }
+
+    def get_cache_store(self, cache_type, namespace):
+        key = (cache_type, namespace)
+        if key not in self.cache_stores:
+            if namespace == DEFAULT_CACHE_OPTIONS['namespace']:
+                legacy_pickle_path = self.ocr_cache_pkl_path if cache_type == 'ocr' else self.translation_cache_pkl_path
+                self.cache_stores[key] = AppendOnlyStore(f'{cache_type}_cache.log', legacy_pickle_path=legacy_pickle_path)
+            else:
+                self.cache_stores[key] = AppendOnlyStore(f'{cache_type}_cache.{namespace}.log')
+        return self.cache_stores[key]
+
+    def get_cache(self, cache_type):
+        key = (cache_type, self.cache_options['namespace'])
+        if key not in self._caches:
+            self._caches[key] = self.load_cache(cache_type)
+        return self._caches[key]
     
     def load_cache(self, cache_type):
-        if cache_type == "ocr":
-            file = self.ocr_cache_pkl_path
-        if cache_type == "translation":
-            file = self.translation_cache_pkl_path
-        if file.exists():
-            with open(file, 'rb') as f:
-                cache = pickle.load(f)
-        else:
-            cache = []
-        return cache
+        cache = self.get_cache_store(cache_type, self.cache_options['namespace']).load()
+        return ImageHashCache(cache, hash_size=16, threshold=7, **self.cache_limits(cache_type))
     
-    def update_cache(self, cache_type):
-        if cache_type == "ocr":
-            file = self.ocr_cache_pkl_path
-            cache = self.ocr_cache
-        if cache_type == "translation":
-            file = self.translation_cache_pkl_path
-            cache = self.translation_cache
+    def update_cache(self, cache_type, entry):
+        """
+        Add entry to the cache and append it to the on-disk log, the write happens on the store's writer thread.
+        """
+        cache = self.get_cache(cache_type)
+        store = self.get_cache_store(cache_type, self.cache_options['namespace'])
 
-        with open(file, 'wb') as f:
-            pickle.dump(cache, f)
+        # the record is serialized once, by the store, and its size is what the cache counts
+        entry.setdefault('created', time.time())
+        cache.append(entry, size=store.append(entry))
+
+        # drop evicted and expired records once the log holds more than twice the live entries
+        if store.record_count > 2 * len(cache) + 100:
+            store.compact(cache.entries)
     
-    def run_cache(self, img, cache_type):
+    def run_cache(self, img, cache_type, img_hash=None):
 
         if cache_type == "ocr":
             cache = self.ocr_cache
         if cache_type == "translation":
             cache = self.translation_cache
 
-        min_diff = 10000
-        closest_entry = None
-        current = imagehash.average_hash(img, 16)
-        for index, value in enumerate(cache):
-            diff = current - value['hash']
-            if diff <= min_diff:
-                min_diff = diff
-                closest_entry = index
-        if min_diff < 7:
-            return closest_entry
-        else:
-            return None
+        if img_hash is None:
+            img_hash = cache.compute_hash(img)
+        return cache.find_closest(img_hash)
+
+    @property
+    def translation_memo(self):
+        # consulted before every translation call whether or not the image caches are enabled
+        namespace = self.cache_options['namespace']
+        if namespace == DEFAULT_CACHE_OPTIONS['namespace']:
+            return get_translation_memo('translation_memo.log')
+        return get_translation_memo(f'translation_memo.{namespace}.log')
+
+    def cache_stats(self):
+        stats = {f'{cache_type}/{namespace}' : cache.stats() for (cache_type, namespace), cache in self._caches.items()}
+        stats['translation_memo'] = self.translation_memo.stats()
+        if self.script_translations is not None:
+            stats['script_translations'] = self.script_translations.stats()
+        return stats
+
+
+    def close(self):
+        """
+        Stop the prefetcher and flush and close the cache logs, the translation memo is shared and stays open.
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        for store in self.cache_stores.values():
+            store.close()
 
 
 
@@ -161,28 +253,13 @@ class FrameProcessor:
         else:
             texts = self.split_current_text(current_text)
         
-        closest_entry_numbers = []
-        for text in texts:
-            # Initialize variables to track the highest similarity and corresponding entry number
-            if self.lang == 'jp':
-                max_similarity_ratio = 0.1
-            else:
-                max_similarity_ratio = 0.33  # Start with your threshold
-            closest_entry_number = None
-            
-            for number, entry in self.dialogues.items():
-                dialogue = entry['dialogue']
-                similarity_ratio = fuzz.ratio(text, dialogue) / 100.0  # Convert to a scale of 0 to 1
-                #print(f"dialogue: {dialogue} -- similarity_ratio: {similarity_ratio} -- number {number}")
-                
-                # Update if this entry has a higher similarity ratio than current max and is above threshold
-                if similarity_ratio > max_similarity_ratio:
-                    max_similarity_ratio = similarity_ratio
-                    closest_entry_number = number
-            if closest_entry_number is not None:
-                closest_entry_numbers.append(closest_entry_number)
-
-        return closest_entry_numbers  # Return the entry number with the highest similarity ratio over 0.33
+        closest_entry_numbers = self.dialogue_matcher.find_closest_entries(texts, cursor=self.dialogue_cursor)
+        if closest_entry_numbers:
+            self.dialogue_cursor = closest_entry_numbers[-1]
+        self.closest_entry_calls += 1
+        if self.closest_entry_calls % 100 == 0:
+            print(f"dialogue matcher - {self.dialogue_matcher.stats()}")
+        return closest_entry_numbers
 
     def encode_image(self, image_path):
         with open(image_path, "rb") as image_file:
@@ -231,7 +308,12 @@ class FrameProcessor:
     def translate_openai(self, content, target_lang):
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         
-        result = self.openai_api.call_translation_api(content, target_lang)
+        try:
+            result = self.openai_api.call_translation_api(content, target_lang)
+        except requests.RequestException as e:
+            # empty translations aren't memoized, the line is translated again on a later frame
+            print(f"translate_openai failed: {e}")
+            return '', {}
 
         content =  result['choices'][0]['message']['content'] 
         
@@ -242,7 +324,12 @@ class FrameProcessor:
     def translate_openai_vision(self, image_bytes, target_lang):
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         
-        result = self.openai_api.call_translation_vision_api(image_bytes, target_lang)
+        try:
+            result = self.openai_api.call_translation_vision_api(image_bytes, target_lang)
+        except requests.RequestException as e:
+            # empty translations aren't memoized, the line is translated again on a later frame
+            print(f"translate_openai_vision failed: {e}")
+            return '', {}
 
         content =  result['choices'][0]['message']['content'] 
         
@@ -251,11 +338,36 @@ class FrameProcessor:
         return cleaned_string, result
     
     
+    def translate_lines_from_memo(self, numbers, target_lang):
+        """
+        Translation of several matched lines put together from per line translations, script
+        translations or the single line memo entries the prefetcher fills.
+
+        :return: The translations joined with spaces, None when a line has neither
+        """
+        translations = []
+        for number in numbers:
+            translation = self.script_translations.get(number, target_lang)
+            if translation is None:
+                memo_key = TranslationMemo.text_key(line_content(self.dialogues[number]), target_lang, self.openai_api.translation_model)
+                translation = self.translation_memo.get(memo_key)
+            if translation is None:
+                return None
+            translations.append(translation)
+        return " ".join(translations)
+
     def run_translation(self, content, translate):
         start_time = time.time() # Record the start time
 
         target_lang = translate.split(',')[1]
-        str, result = self.translate_openai(content, target_lang)
+        memo_key = TranslationMemo.text_key(content, target_lang, self.openai_api.translation_model)
+        str = self.translation_memo.get(memo_key)
+        if str is not None:
+            print('---translation_memo---')
+            result = {}
+        else:
+            str, result = self.translate_openai(content, target_lang)
+            self.translation_memo.put(memo_key, str)
         
         print("---- Translated Text ----")
         print(str)
@@ -280,7 +392,14 @@ class FrameProcessor:
             # dialogue_box_img = image_crop_dialogue_box(image, detection_result)
             dialogue_box_image_bytes = self.ocr_processor.process_image(dialogue_box_img)
 
-            str, result = self.translate_openai_vision(dialogue_box_image_bytes, target_lang)
+            memo_key = TranslationMemo.image_key(dialogue_box_image_bytes, target_lang, self.openai_api.translation_model)
+            str = self.translation_memo.get(memo_key)
+            if str is not None:
+                print('---translation_memo---')
+                result = {}
+            else:
+                str, result = self.translate_openai_vision(dialogue_box_image_bytes, target_lang)
+                self.translation_memo.put(memo_key, str)
             print("---- Translated Text ----")
             print(str)
             print("-----------------------")
@@ -335,17 +454,20 @@ class FrameProcessor:
 
             # cache
             then = time.time()
+            img_crop_hash = imagehash.average_hash(img_crop, 16)
             
             if enable_cache:
-                closest_entry = self.run_cache(img_crop, 'ocr')
+                self.configure_cache(enable_cache)
+                closest_entry = self.run_cache(img_crop, 'ocr', img_crop_hash)
             else:
                 closest_entry = None
-            if closest_entry:
+            if closest_entry is not None:
                 print('---run_cache_ocr---')
                 data = self.ocr_cache[closest_entry]
                 last_played = data['string']
                 annotations = data['annotations']
                 highlighted_image = None
+                vision_model_output = None
                 print(f'Time Taken {time.time() - then}')
             else:
                 last_played, highlighted_image, annotations, vision_model_output = self.run_ocr(img) # vision model response only returns a response if the method used here is OPENAI otherwise returns None.
@@ -353,10 +475,11 @@ class FrameProcessor:
                 # save outputs to disk
                 if self.save_outputs and translate is None:
                     self.save_outputs_to_disk(img, highlighted_image, annotations, None, vision_model_output)
-                self.ocr_cache.append({'string' : last_played, 'annotations' : annotations, 'hash' : imagehash.average_hash(img_crop, 16)})
-                self.update_cache('ocr')
+                self.update_cache('ocr', {'string' : last_played, 'annotations' : annotations, 'hash' : img_crop_hash})
 
             print(f"finished ocr - {last_played} ")
+            if self.prefetcher is not None and last_played:
+                self.prefetcher.on_match(last_played, translate)
             
             
             translation = ""
@@ -364,10 +487,10 @@ class FrameProcessor:
                 # cache
                 then = time.time()
                 if enable_cache:
-                    closest_entry = self.run_cache(img_crop, 'translation')
+                    closest_entry = self.run_cache(img_crop, 'translation', img_crop_hash)
                 else:
                     closest_entry = None
-                if closest_entry:
+                if closest_entry is not None:
                     print('---run_cache_translation---')
                     data = self.translation_cache[closest_entry]
                     translation = data['translation']
@@ -378,22 +501,28 @@ class FrameProcessor:
                         print("disable_dialog")
                         translation, result = self.run_translation(last_played, translate)
                     else:
-                        print("looking for entry")
-                        content_to_translate = []
-                        for entry in last_played:
-                            content = self.dialogues[entry]
-                            content = content if type(content) is str else f"{content.get('name', '')} : {content.get('dialogue', '')}"
-                            content_to_translate.append(content)
-                        content_to_translate = " ".join(content_to_translate)
-
-                        translation, result = self.run_translation(content_to_translate, translate)
+                        # matched script lines are looked up instead of translated
+                        target_lang = translate.split(',')[1]
+                        translation = self.script_translations.translate_entries(last_played, target_lang)
+                        result = {}
+                        if translation is None and len(last_played) > 1:
+                            # the prefetched lines are memoized one by one
+                            translation = self.translate_lines_from_memo(last_played, target_lang)
+                            if translation is not None:
+                                print('---translation_memo_lines---')
+                        elif translation is not None:
+                            print('---script_translation---')
+                        if translation is None:
+                            print("looking for entry")
+                            content_to_translate = " ".join(line_content(self.dialogues[entry]) for entry in last_played)
+
+                            translation, result = self.run_translation(content_to_translate, translate)
 
                     # save outputs to disk
                     if self.save_outputs:
                         self.save_outputs_to_disk(img, highlighted_image, annotations, result, vision_model_output)
 
-                    self.translation_cache.append({'translation' : translation,'hash' : imagehash.average_hash(img_crop, 16)})
-                    self.update_cache('translation')
+                    self.update_cache('translation', {'translation' : translation,'hash' : img_crop_hash})
                     
                     print("finished translation")
 
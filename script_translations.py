@@ -0,0 +1,133 @@
+import argparse
+import json
+import logging
+from pathlib import Path
+
+# dialogue entry fields that already hold a translation of the line
+LANG_FIELDS = {'en' : 'english', 'jp' : 'japanese'}
+
+
+def translations_path(dialog_file_path):
+    """Lookup table written by the precompute command, next to its dialogue file."""
+    dialog_file_path = Path(dialog_file_path)
+    return dialog_file_path.with_name(f"{dialog_file_path.stem}.translations.json")
+
+
+class ScriptTranslations:
+    """
+    Translations of every line of a known dialogue script, so matched script lines are a
+    dictionary hit instead of a translation API round trip.
+
+    Lines come from the dialogue entries' own translation fields (eg. 'english') and from
+    the table written by the precompute command. A table entry keeps the source line it was
+    translated from and is ignored once the script line changes.
+    """
+
+    def __init__(self, dialogues, lang, table=None):
+        """
+        :param dialogues: dict of line number -> dialogue entry, as loaded by FrameProcessor.load_dialogues
+        :param lang: Language of the script lines
+        :param table: dict of target language -> line number (str) -> {'dialogue': source line, 'translation': text}
+        """
+        self.dialogues = dialogues
+        self.lang = lang
+        self.table = table or {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, dialog_file_path, dialogues, lang):
+        path = translations_path(dialog_file_path)
+        table = {}
+        if path.exists():
+            with open(path, 'r', encoding='utf8') as f:
+                table = json.load(f)
+        return cls(dialogues, lang, table)
+
+    def get(self, number, target_lang):
+        """
+        :return: Translation of line number, None if there is none
+        """
+        entry = self.dialogues.get(number)
+        if entry is None:
+            return None
+        if target_lang == self.lang:
+            return entry.get('dialogue')
+        field = LANG_FIELDS.get(target_lang)
+        if field and entry.get(field):
+            return entry[field]
+        stored = self.table.get(target_lang, {}).get(str(number))
+        if stored is not None and stored['dialogue'] == entry.get('dialogue'):
+            return stored['translation']
+        return None
+
+    def translate_entries(self, numbers, target_lang):
+        """
+        :param numbers: Matched line numbers
+        :return: Their translations joined with spaces, None unless every line has one
+        """
+        translations = [self.get(number, target_lang) for number in numbers]
+        if not translations or None in translations:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return " ".join(translations)
+
+    def missing(self, target_lang):
+        return [number for number in self.dialogues if self.get(number, target_lang) is None]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def precompute(dialog_file_path, lang, target_langs, translate_batch, batch_size=20):
+    """
+    Translate every script line that has no translation yet into target_langs and save the lookup table.
+
+    :param lang: Language of the script lines
+    :param translate_batch: Callable (list of lines, target language) -> list of translations
+    :return: dict of target language -> number of lines translated
+    """
+    with open(dialog_file_path, 'r', encoding='utf8') as f:
+        dialogues = {index: item for index, item in enumerate(json.load(f))}
+    script_translations = ScriptTranslations.load(dialog_file_path, dialogues, lang)
+
+    translated = {}
+    for target_lang in target_langs:
+        missing = script_translations.missing(target_lang)
+        table = script_translations.table.setdefault(target_lang, {})
+        for start in range(0, len(missing), batch_size):
+            numbers = missing[start:start + batch_size]
+            lines = [dialogues[number]['dialogue'] for number in numbers]
+            try:
+                translations = translate_batch(lines, target_lang)
+            except Exception as e:
+                logging.error(f"Batch of lines {numbers[0]}-{numbers[-1]} into {target_lang} failed: {e}")
+                continue
+            for number, line, translation in zip(numbers, lines, translations):
+                table[str(number)] = {'dialogue' : line, 'translation' : translation}
+            print(f"{target_lang}: translated lines {numbers[0]}-{numbers[-1]}")
+        translated[target_lang] = len(missing) - len(script_translations.missing(target_lang))
+
+    with open(translations_path(dialog_file_path), 'w', encoding='utf8') as f:
+        json.dump(script_translations.table, f, ensure_ascii=False, indent=4)
+    return translated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute translations of the dialogue script lines.")
+    parser.add_argument('dialogues', type=str, help="Dialogue JSON file eg. dialogues_jp_v2.json")
+    parser.add_argument('-l', '--lang', type=str, required=True, help="Language of the dialogue file eg. jp")
+    parser.add_argument('-t', '--target', type=str, default="en,jp", help="Comma separated target languages. Default is en,jp.")
+    parser.add_argument('-b', '--batch-size', type=int, default=20, help="Lines per translation request. Default is 20.")
+    parser.add_argument('-m', '--model', type=str, default="gpt-4o", help="Translation model. Default is gpt-4o.")
+    args = parser.parse_args()
+
+    from openai_api import OpenAI_API
+    openai_api = OpenAI_API(translation_model=args.model)
+    translated = precompute(args.dialogues, args.lang, args.target.split(','), openai_api.call_batch_translation_api, args.batch_size)
+    print(f"{args.dialogues}: {translated} -> {translations_path(args.dialogues)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import time
+import numpy as np
+import cv2
+from PIL import Image, ImageDraw, ImageFilter
+from overlay import blur_regions, blur_regions_array
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def dialogue_boxes(width, height, num_boxes):
+    """Word boxes on two lines in the bottom third of the screen, like a game dialogue window."""
+    boxes = []
+    box_width = width // (num_boxes // 2 + 1)
+    for i in range(num_boxes):
+        x1 = (i // 2) * box_width + width // 20
+        y1 = int(height * 0.7) + (i % 2) * height // 10
+        boxes.append((x1, y1, x1 + box_width - 10, y1 + height // 14))
+    return boxes
+
+def full_frame_pil(image, boxes):
+    blurred_image = image.filter(ImageFilter.GaussianBlur(10))
+    mask = Image.new("L", image.size, 0)
+    draw_mask = ImageDraw.Draw(mask)
+    for box in boxes:
+        draw_mask.rectangle(box, fill=255)
+    return Image.composite(blurred_image, image, mask)
+
+def full_frame_cv2(frame_data, boxes):
+    blurred = cv2.GaussianBlur(frame_data, (0, 0), 10)
+    result = frame_data.copy()
+    for x1, y1, x2, y2 in boxes:
+        result[y1:y2 + 1, x1:x2 + 1] = blurred[y1:y2 + 1, x1:x2 + 1]
+    return result
+
+def benchmark(fn, repeat):
+    fn()
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start_time) / repeat * 1000
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark full frame vs region blur of the dialogue boxes")
+    ap.add_argument("--boxes", type=int, default=8, help="number of dialogue boxes")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    for name, (width, height) in RESOLUTIONS.items():
+        frame_data = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        image = Image.fromarray(frame_data)
+        boxes = dialogue_boxes(width, height, args.boxes)
+
+        results = {
+            "full frame PIL": benchmark(lambda: full_frame_pil(image, boxes), args.repeat),
+            "full frame cv2": benchmark(lambda: full_frame_cv2(frame_data, boxes), args.repeat),
+            "region PIL image": benchmark(lambda: blur_regions(image, boxes), args.repeat),
+            "region array": benchmark(lambda: blur_regions_array(frame_data.copy(), boxes), args.repeat),
+        }
+        for method, ms in results.items():
+            print(f"{name:6s} {method:18s} {ms:8.2f} ms")
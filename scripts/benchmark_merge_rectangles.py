@@ -0,0 +1,79 @@
+import argparse
+import time
+import numpy as np
+from image_diff import merge_overlapping_rectangles
+
+
+def check_overlap(rect1, rect2):
+    x1, y1 = rect1[0]
+    x2, y2 = rect1[1]
+    x3, y3 = rect2[0]
+    x4, y4 = rect2[1]
+    if x2 < x3 or x4 < x1 or y2 < y3 or y4 < y1:
+        return False
+    return True
+
+def combine_rectangles(rect1, rect2):
+    x1 = min(rect1[0][0], rect2[0][0])
+    y1 = min(rect1[0][1], rect2[0][1])
+    x2 = max(rect1[1][0], rect2[1][0])
+    y2 = max(rect1[1][1], rect2[1][1])
+    return [(x1, y1), (x2, y2)]
+
+def legacy_combine_overlapping_rectangles(rectangles):
+    """The pairwise rescanning merge OCRProcessor.combine_overlapping_rectangles used before merge_overlapping_rectangles."""
+    combined_rectangles = list(rectangles)
+    while True:
+        overlap_found = False
+        new_rectangles = []
+        i = 0
+        while i < len(combined_rectangles):
+            rect1 = combined_rectangles[i]
+            combined = False
+            for j in range(i + 1, len(combined_rectangles)):
+                rect2 = combined_rectangles[j]
+                if check_overlap(rect1, rect2):
+                    new_rectangles.append(combine_rectangles(rect1, rect2))
+                    combined_rectangles.pop(j)
+                    overlap_found = True
+                    combined = True
+                    break
+            if not combined:
+                new_rectangles.append(rect1)
+            i += 1
+        combined_rectangles = new_rectangles
+        if not overlap_found:
+            break
+    return combined_rectangles
+
+def dense_layout(rng, num_boxes, width=1280, height=720):
+    """Word sized boxes laid out in rows like a menu or status panel, with some overlap between neighbours."""
+    rows = max(1, int(np.sqrt(num_boxes / 4)))
+    rectangles = []
+    for _ in range(num_boxes):
+        row = rng.integers(rows)
+        y1 = int(row * height / rows + rng.integers(-4, 4))
+        x1 = int(rng.integers(0, width - 120))
+        rectangles.append([(x1, y1), (x1 + int(rng.integers(20, 120)), y1 + int(rng.integers(16, 30)))])
+    return rectangles
+
+def benchmark(fn, rectangles, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(rectangles)
+    return (time.perf_counter() - start_time) / repeat, result
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark merging overlapping text boxes")
+    ap.add_argument("--sizes", type=int, nargs='+', default=[10, 50, 100, 200, 400])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    for num_boxes in args.sizes:
+        rectangles = dense_layout(rng, num_boxes)
+        legacy_time, legacy_result = benchmark(legacy_combine_overlapping_rectangles, rectangles, args.repeat)
+        new_time, (new_result, _) = benchmark(merge_overlapping_rectangles, rectangles, args.repeat)
+        same = [list(map(tuple, r)) for r in legacy_result] == [list(map(tuple, r)) for r in new_result]
+        print(f"{num_boxes:5d} boxes -> {len(new_result):4d} merged: legacy {legacy_time * 1000:8.2f} ms, "
+              f"merge_overlapping_rectangles {new_time * 1000:8.2f} ms, speedup {legacy_time / new_time:6.1f}x, same output {same}")
@@ -1,15 +1,111 @@
-import queue
+import asyncio
+import logging
+
+# messages starting with one of these prefixes supersede any pending message with the same prefix
+COALESCED_PREFIXES = ("annotations ",)
+
 
 class MessageQueue:
-    def __init__(self):
-        self.queue = queue.Queue()
+    """
+    Per connection channel of messages for the WebRTC data channel.
+
+    send_message can be called from any thread, messages are handed over to the event loop
+    with call_soon_threadsafe into an asyncio.Queue so the sender never blocks the loop.
+    An annotations update that hasn't been sent yet is replaced by the newer one, and the
+    queue is bounded: when it is full the oldest message is dropped.
+    """
+
+    def __init__(self, loop=None, maxsize=64, coalesced_prefixes=COALESCED_PREFIXES):
+        """
+        :param loop: Event loop the messages are consumed on, defaults to the running loop
+        :param maxsize: Maximum number of pending messages
+        :param coalesced_prefixes: Prefixes of messages where only the latest pending one is kept
+        """
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.coalesced_prefixes = coalesced_prefixes
+        self.pending = {}
+
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def coalesce_key(self, message):
+        for prefix in self.coalesced_prefixes:
+            if message.startswith(prefix):
+                return prefix
+        return None
 
     def send_message(self, message):
-        self.queue.put(message)
-
-    def receive_message(self):
-        try:
-            message = self.queue.get(timeout=1)
-            return message
-        except queue.Empty:
-            return None
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        key = self.coalesce_key(message)
+        if key is not None:
+            superseded = key in self.pending
+            self.pending[key] = message
+            if superseded:
+                # the queued entry for this key will now deliver the newer message
+                self.coalesced += 1
+                return
+            item = (key, None)
+        else:
+            item = (None, message)
+
+        if self.queue.full():
+            dropped_key, _ = self.queue.get_nowait()
+            if dropped_key is not None:
+                self.pending.pop(dropped_key, None)
+            self.dropped += 1
+            logging.warning(f"Message queue full, dropped the oldest message ({self.dropped} dropped)")
+        self.queue.put_nowait(item)
+
+    async def receive_message(self):
+        """
+        Wait for the next message.
+        """
+        key, message = await self.queue.get()
+        if key is not None:
+            message = self.pending.pop(key)
+        return message
+
+    async def pump(self, data_channel, high_water=1 << 20, low_water=1 << 18):
+        """
+        Send messages on data_channel as soon as they arrive, until the channel closes.
+
+        When more than high_water bytes are buffered on the channel, sending waits until
+        the buffer drains below low_water, meanwhile annotation updates keep coalescing.
+
+        :param data_channel: aiortc RTCDataChannel
+        """
+        drained = asyncio.Event()
+        data_channel.bufferedAmountLowThreshold = low_water
+        task = asyncio.current_task()
+
+        @data_channel.on("bufferedamountlow")
+        def on_bufferedamountlow():
+            drained.set()
+
+        @data_channel.on("close")
+        def on_close():
+            # stop waiting for messages nobody will receive
+            task.cancel()
+
+        while data_channel.readyState != "closed":
+            message = await self.receive_message()
+            if data_channel.readyState != "open":
+                break
+            data_channel.send(message)
+            self.sent += 1
+
+            if data_channel.bufferedAmount > high_water:
+                drained.clear()
+                await drained.wait()
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "pending": self.queue.qsize(),
+        }
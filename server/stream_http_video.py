@@ -3,6 +3,7 @@ import asyncio
 from io import BytesIO
 import logging
 import sys
+import threading
 import time
 from http import HTTPStatus
 from typing import IO, Any, Dict
@@ -26,13 +27,16 @@ from flask import Flask
 
 from text_detector_fast import TextDetectorFast
 # from text_detector import TextDetector
-from user_video import UserVideo
+from user_video import UserVideo, RemoteUserVideo
 
 from .msq import MessageQueue
 from .models import db, User
 from .oauth import google_oauth_blueprint
 from .commands import create_db
 from process_frames import FrameProcessor
+from model_registry import model_registry
+from http_client import http_client, async_http_client
+from worker_pool import get_worker_pool, stop_worker_pool
 
 from PIL import Image
 
@@ -179,6 +183,17 @@ def signout():
 def protected():
     return f'Hello, {current_user.id}! You are logged in.'
 
+@app.route('/models')
+@login_required
+def models():
+    return flask.jsonify(model_registry.loaded_models())
+
+@app.route('/http_stats')
+@login_required
+def http_stats():
+    # latency histograms of the translation / vision API calls per endpoint
+    return flask.jsonify({"sync": http_client.stats(), "async": async_http_client.stats()})
+
 @app.route('/app/api/script.json')
 @app.route('/script.json')
 def script_json():
@@ -198,7 +213,10 @@ class NumpyEncoder(json.JSONEncoder):
 
 #TODO do a better then this, i just want this loaded at boot, but it will slow down if you dont need it lol
 # textDetector = TextDetector('frozen_east_text_detection.pb')
-textDetector = TextDetectorFast("")
+# number of processes running the per user frame processing, 0 runs it in threads of this process
+worker_processes = int(os.environ.get("WORKER_PROCESSES", 0))
+# shared by every user's thread, the workers load their own
+textDetector = model_registry.get('fast', [], lambda: TextDetectorFast("")) if worker_processes == 0 else None
 #TODO do one per user
 lang = "jp" #hard code all options for now
 enable_cache = False
@@ -219,14 +237,25 @@ class VideoTransformTrack(MediaStreamTrack):
         print("making user_video----")
 
         with sentry_sdk.start_transaction(op="task", name="setup user video"):
-            self.user_video =  UserVideo(lang, disable_dialog, disable_translation, enable_cache, translate, textDetector, debug_bbox=debug_bbox, crop_height=crop_height)
+            if worker_processes > 0:
+                self.user_video = RemoteUserVideo(get_worker_pool(worker_processes), lang, disable_dialog, disable_translation, enable_cache, translate, debug_bbox=debug_bbox, crop_height=crop_height)
+            else:
+                self.user_video =  UserVideo(lang, disable_dialog, disable_translation, enable_cache, translate, textDetector, debug_bbox=debug_bbox, crop_height=crop_height, batch_inference=True)
         self.message_queue = message_queue
         self.send_annotations = send_annotations
-        self.last_annotations = None
+        self.last_annotations_version = None
         print("making user_video done----")
         self.closest_match = []
         self.disable_dialog = disable_dialog
 
+    def stop(self):
+        super().stop()
+        if isinstance(self.user_video, RemoteUserVideo):
+            self.user_video.close()
+        else:
+            # the processing thread may be in the middle of a frame, don't wait for it on the event loop
+            threading.Thread(target=self.user_video.close, name="close-user-video", daemon=True).start()
+
     async def recv(self):
         try:
             with sentry_sdk.start_transaction(op="task", name="Process Frame"):
@@ -245,18 +274,23 @@ class VideoTransformTrack(MediaStreamTrack):
             raise
 
     def process_frame(self, frame):
-        frame_img = av.VideoFrame.to_image(frame)
-
-        with sentry_sdk.start_span(description='preprocess_frame'):
-            frame_cropped = self.user_video.preprocess_frame(frame_img)
-        with sentry_sdk.start_span(description='async_process_frame'):
-            self.user_video.async_process_frame(frame_cropped.copy())
-
-        new_frame = None
-        with sentry_sdk.start_span(description='print_annotation'):
-            new_frame = av.VideoFrame.from_image(self.user_video.print_annotations(frame_cropped))
-            new_frame.pts = frame.pts
-            new_frame.time_base = frame.time_base
+        if self.user_video.can_passthrough():
+            # nothing to draw, send the frame back untouched or just cropped
+            new_frame = self.user_video.passthrough_frame(frame)
+        else:
+            # a single yuv -> rgb conversion, the crop is a view and the frame is only copied when annotations are drawn
+            frame_data = frame.to_ndarray(format='rgb24')
+
+            with sentry_sdk.start_span(description='preprocess_frame'):
+                frame_cropped = self.user_video.preprocess_frame_array(frame_data)
+            with sentry_sdk.start_span(description='async_process_frame'):
+                self.user_video.async_process_frame(frame_cropped)
+
+            new_frame = None
+            with sentry_sdk.start_span(description='print_annotation'):
+                new_frame = av.VideoFrame.from_ndarray(self.user_video.print_annotations_array(frame_cropped), format='rgb24')
+                new_frame.pts = frame.pts
+                new_frame.time_base = frame.time_base
 
         if self.disable_dialog == False and self.closest_match is not None and self.user_video.closest_match != self.closest_match and self.user_video.closest_match != 0:
             self.closest_match = self.user_video.closest_match
@@ -266,12 +300,10 @@ class VideoTransformTrack(MediaStreamTrack):
                 self.message_queue.send_message(message)
 
         if self.send_annotations:
-            #TODO probably a more efficent way then comparing json dumps ;/
-            annotations = self.user_video.video_stream.current_annotations
-            json_annotations = json.dumps(annotations, sort_keys=True, cls=NumpyEncoder)
-            
-            if self.last_annotations != json_annotations:
-                self.last_annotations = json_annotations 
+            # only serialize and send when set_annotations/set_translation changed something
+            annotations_version = self.user_video.video_stream.annotations_version
+            if self.last_annotations_version != annotations_version:
+                self.last_annotations_version = annotations_version
                 if self.message_queue != None:
                     # this is normally what we print
                     with sentry_sdk.start_span(description='dump_annotations'):
@@ -314,23 +346,12 @@ async def handle_offer(params):
     recorder = MediaBlackhole()
     message_queue = MessageQueue()
 
-
-    async def send_data(message_queue, data_channel):
-        print("starting send_data")
-        while True:
-            if data_channel == None:
-                print("datachannel is none")
-            else:
-                message = message_queue.receive_message()
-                if message:
-                    data_channel.send(message)
-            await asyncio.sleep(1)
-
     # shouldn't need this
     @pc.on("datachannel")
     def on_datachannel(channel):
         log_info("Data channel is open")
-        asyncio.ensure_future(send_data(message_queue, channel))
+        # messages are sent as soon as the video track produces them
+        asyncio.ensure_future(message_queue.pump(channel))
 
         @channel.on("message")
         def on_message(message):
@@ -503,6 +524,9 @@ async def on_async_shutdown(app):
     coros = [pc.close() for pc in pcs]
     await asyncio.gather(*coros)
     pcs.clear()
+    stop_worker_pool()
+    http_client.close()
+    await async_http_client.close()
 
 
 @app.route('/mpegts')
@@ -2,7 +2,6 @@ import os
 import platform
 import signal
 import time
-import pygame
 import time
 import threading
 import argparse
@@ -17,6 +16,8 @@ from video_stream_with_annotations import VideoStreamWithAnnotations
 from webserv import run_server, set_dialog_file, init_web
 from thread_safe import shared_data_put_data, shared_data_put_line
 from process_frames import FrameProcessor
+from prefetch import format_filename
+from audio_engine import audio_engine
 from image_diff import image_crop_title_bar
 
 # Define the enumeration
@@ -41,37 +42,11 @@ last_played = -1
 show_image_screen = False 
 video_stream = None
 
-def format_filename(number):
-    # Format the number with leading zeros to ensure it's four digits
-    number_padded = f"{number:04d}"
-
-    # Create the file name using the padded number
-    file_name = f"ff4_v1_prologue_{number_padded}.mp3"
-
-    return file_name
-
-def play_audio(filenames):
-    global lang
+def play_audio(filenames, match_time=None):
+    # queued on the shared audio engine, a newer match replaces what is still playing
     for filename in filenames:
-        print(f"output_en_elevenlabs/{filename}")
-        # Initialize the mixer module
-        pygame.mixer.init()
-        
-        # Load the MP3 file
-        pygame.mixer.music.load(f"output_v2_{frameProcessor.lang}_elevenlabs/{filename}")
-        
-        # Play the music
-        pygame.mixer.music.play()
-        
-        # Wait for the music to finish playing
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10)  # Wait a bit for the music to finish
-
-# Function to wrap your play_mp3 for threading
-def play_audio_threaded(filenames):
-    # Create a thread targeting the play_mp3 function
-    thread = threading.Thread(target=play_audio, args=(filenames,))
-    thread.start()  # Start the thread
+        print(f"output_v2_{frameProcessor.lang}_elevenlabs/{filename}")
+    audio_engine.play([f"output_v2_{frameProcessor.lang}_elevenlabs/{filename}" for filename in filenames], match_time)
 
 
 previous_image = Image.new('RGB', (100, 100), (255, 255, 255))
@@ -157,12 +132,13 @@ def process_screenshot(img,translate=None, show_image_screen=False, enable_cache
     global last_played, video_stream
     
     closest_match = video_stream.process_screenshot(img,translate=translate, show_image_screen=show_image_screen, enable_cache=enable_cache, crop_y_coordinate=crop_y_coordinate)
+    match_time = time.perf_counter()
 
     if closest_match != None and closest_match != last_played:
         if not frameProcessor.disable_dialog:
             start_time = time.time() # Record the start time
             formated_filenames = [format_filename(i) for i in closest_match]
-            play_audio_threaded(formated_filenames)
+            play_audio(formated_filenames, match_time)
             end_time = time.time()
             print(f"Audio Time taken: {end_time - start_time} seconds")
         last_played = closest_match
@@ -192,12 +168,12 @@ def process_cv2_screenshots(translate, enable_cache=False):
     time.sleep(1)  # Wait for 1 second, threading ordering issue, this is not the correct way to fix it
     global video_stream
     print(video_stream)
-    while True:
+    while not video_stream.stopped.is_set():
         frame = video_stream.get_latest_frame()
         if frame is not None:
             print("Background task accessing the latest frame...")
             process_screenshot(frame, translate=translate, show_image_screen=True, enable_cache=enable_cache)
-            time.sleep(1)  # Wait for 1 second
+            video_stream.stopped.wait(1)  # Wait for 1 second
 
 def main():
     global dialogues
@@ -219,6 +195,11 @@ def main():
     parser.add_argument('-fps', '--show_fps',  action='store_true', help="Show fps")
     parser.add_argument('-trans', '--translate', type=str, help="Translate from source language to target language eg. en,jp")
     parser.add_argument('-c', '--enable_cache', action='store_true', help="Enable cache")
+    parser.add_argument('--cache_namespace', type=str, help="Cache namespace, use one per game. Default is 'default'")
+    parser.add_argument('--cache_max_entries', type=int, help="Max entries kept in each cache")
+    parser.add_argument('--cache_max_bytes', type=int, help="Max approximate size in bytes of each cache")
+    parser.add_argument('--cache_policy', type=str, choices=['lru', 'lfu'], help="Cache eviction policy")
+    parser.add_argument('--cache_ttl', type=float, help="Seconds after which cached results expire")
     parser.add_argument('-dd', '--disable_dialog', action='store_true', help="disable dialog")
     parser.add_argument('--text_detector', type=TextDetectEngine.from_str, help="Which textdetection engine, {east, fast}", default=TextDetectEngine.FAST)
     parser.add_argument('-m', '--method', type=OCREngine.from_str, choices=list(OCREngine), default=OCREngine.EASYOCR, help="option for text detection and recognition. {easyocr: easyocr detection + easyocr recognition, openai: easyocr detection + openai recognition}")
@@ -227,6 +208,12 @@ def main():
 
     args = parser.parse_args()
 
+    enable_cache = args.enable_cache
+    if enable_cache:
+        cache_options = {'namespace' : args.cache_namespace, 'max_entries' : args.cache_max_entries, 'max_bytes' : args.cache_max_bytes,
+                         'policy' : args.cache_policy, 'ttl' : args.cache_ttl}
+        enable_cache = {k : v for k, v in cache_options.items() if v is not None} or True
+
     crop_y_coordinate = None
     if os_name == 'Darwin': 
         crop_y_coordinate = 72
@@ -254,9 +241,13 @@ def main():
         textDetector = None # probably should just exit?
     
     frameProcessor =  FrameProcessor(lang, disable_dialog=disable_dialog,save_outputs=args.save_outputs, method=args.method) 
+    if frameProcessor.prefetcher is not None:
+        # start the mixer now so the first line doesn't wait on it, and decode the upcoming lines ahead
+        audio_engine.start()
+        frameProcessor.prefetcher.audio_engine = audio_engine
     
     if args.webserver:
-        init_web(lang, disable_dialog, translate=args.translate, enable_cache=args.enable_cache, textDetector=textDetector)
+        init_web(lang, disable_dialog, translate=args.translate, enable_cache=enable_cache, textDetector=textDetector)
         server_thread = threading.Thread(target=run_server)
         server_thread.start()
 
@@ -272,7 +263,7 @@ def main():
 
     if args.show_image_screen:
         global video_stream
-        video_stream = VideoStreamWithAnnotations(background_task=process_cv2_screenshots, background_task_args={"translate" : args.translate, 'enable_cache' : args.enable_cache},
+        video_stream = VideoStreamWithAnnotations(background_task=process_cv2_screenshots, background_task_args={"translate" : args.translate, 'enable_cache' : enable_cache},
                                                   show_fps=args.show_fps, crop_y_coordinate=crop_y_coordinate, frameProcessor=frameProcessor, textDetector=textDetector, debug_bbox=args.debug_bbox)
         try:
             if args.video == "" or args.video == None:
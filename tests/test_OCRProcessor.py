@@ -1,3 +1,4 @@
+import io
 import unittest
 from PIL import Image
 from ocr import OCRProcessor  
@@ -17,6 +18,31 @@ class TestOCRProcessor(unittest.TestCase):
         self.assertIsNotNone(image_bytes)
         self.assertIsInstance(image_bytes, bytes)
 
+    def test_image_to_array(self):
+        image_array = self.ocr_processor.image_to_array(self.image)
+        self.assertEqual(image_array.shape, (self.image.size[1], self.image.size[0], 3))
+        self.assertEqual(image_array.dtype.name, 'uint8')
+
+    def test_ocr_easyocr_array(self):
+        result = self.ocr_processor.ocr_easyocr(self.ocr_processor.image_to_array(self.image))
+        self.assertIsInstance(result, list)
+        self.assertIsInstance(result[0], tuple)
+        self.assertEqual(len(result[0]), 3)
+
+    def test_ocr_easyocr_array_matches_bytes(self):
+        byte_buffer = io.BytesIO()
+        self.image.save(byte_buffer, format='PNG')
+        array_result = self.ocr_processor.ocr_easyocr(self.ocr_processor.image_to_array(self.image))
+        bytes_result = self.ocr_processor.ocr_easyocr(byte_buffer.getvalue())
+        self.assertEqual([text for _, text, _ in array_result], [text for _, text, _ in bytes_result])
+
+    def test_draw_highlight_copies_image(self):
+        original = self.image.copy()
+        result = [([[88, 201], [306, 201], [306, 242], [88, 242]], 'Crew:do', 0.87)]
+        drawable_image = self.ocr_processor.draw_highlight(self.image, result)
+        self.assertEqual(drawable_image.getpixel((88, 201)), (255, 0, 0))
+        self.assertEqual(list(self.image.getdata()), list(original.getdata()))
+
     def test_ocr_easyocr(self):
         image_bytes = self.ocr_processor.process_image(self.image)
         result = self.ocr_processor.ocr_easyocr(image_bytes)
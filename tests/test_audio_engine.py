@@ -0,0 +1,151 @@
+import unittest
+import tempfile
+import threading
+from pathlib import Path
+from audio_engine import AudioEngine
+from prefetch import AudioCache
+
+class FakeChannel:
+    def __init__(self, sound):
+        self.sound = sound
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+class FakeSound:
+    def __init__(self, mixer, file):
+        self.mixer = mixer
+        self.data = file.read()
+
+    def get_length(self):
+        return self.mixer.lengths.get(self.data, 0)
+
+    def play(self):
+        if self.mixer.no_channel:
+            self.mixer.no_channel = False
+            self.mixer.started.release()
+            return None
+        channel = FakeChannel(self)
+        self.mixer.channels.append(channel)
+        self.mixer.started.release()
+        return channel
+
+class FakeMixer:
+    """Stands in for pygame.mixer, so the tests need no audio device."""
+
+    def __init__(self):
+        self.inits = 0
+        self.decoded = 0
+        self.lengths = {}
+        self.channels = []
+        self.started = threading.Semaphore(0)
+        self.no_channel = False
+        self.init_error = None
+
+    def init(self):
+        self.inits += 1
+        if self.init_error is not None:
+            raise self.init_error
+
+    def Sound(self, file):
+        self.decoded += 1
+        return FakeSound(self, file)
+
+class TestAudioEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            path = Path(self.tmp_dir.name) / f"{i}.mp3"
+            path.write_bytes(b"line %d" % i)
+            self.paths.append(path)
+        self.mixer = FakeMixer()
+        self.engine = AudioEngine(AudioCache(), max_sounds=2, mixer=self.mixer)
+
+    def tearDown(self):
+        self.engine.stop()
+        self.tmp_dir.cleanup()
+
+    def wait_started(self, count):
+        for _ in range(count):
+            self.assertTrue(self.mixer.started.acquire(timeout=5))
+
+    def played(self):
+        return [channel.sound.data for channel in self.mixer.channels]
+
+    def test_play_in_order(self):
+        self.engine.play(self.paths[:2])
+        self.wait_started(2)
+        self.assertEqual(self.played(), [b"line 0", b"line 1"])
+        self.assertEqual(self.mixer.inits, 1)
+        self.assertEqual(self.engine.stats()["latency"]["count"], 1)
+
+        # a second match reuses the mixer and the decoded sounds
+        self.engine.play(self.paths[:1])
+        self.wait_started(1)
+        self.assertEqual(self.mixer.inits, 1)
+        self.assertEqual(self.mixer.decoded, 2)
+        self.assertEqual(self.engine.stats()["played"], 3)
+
+    def test_supersede(self):
+        self.mixer.lengths[b"line 0"] = 30
+        self.engine.play(self.paths[:2])
+        self.wait_started(1)
+        # line 0 is still playing and line 1 queued when the next match comes in
+        self.engine.play(self.paths[2:])
+        self.wait_started(1)
+        self.assertEqual(self.played(), [b"line 0", b"line 2"])
+        self.assertTrue(self.mixer.channels[0].stopped)
+        self.assertEqual(self.engine.stats()["superseded"], 1)
+
+    def test_stop(self):
+        self.mixer.lengths[b"line 0"] = 30
+        self.engine.play(self.paths[:1])
+        self.wait_started(1)
+        self.engine.stop()
+        self.engine.play(self.paths[1:2])
+        self.wait_started(1)
+        self.assertTrue(self.mixer.channels[0].stopped)
+        self.assertFalse(self.mixer.channels[1].stopped)
+
+    def test_preload_lru(self):
+        # nothing is decoded before the mixer is up
+        self.engine.preload(self.paths[0])
+        self.assertEqual(self.mixer.decoded, 0)
+
+        self.engine.play(self.paths[:1])
+        self.wait_started(1)
+        self.engine.preload(self.paths[1])
+        self.engine.preload(self.paths[2])
+        self.assertEqual(self.mixer.decoded, 3)
+        self.assertEqual(self.engine.stats()["sounds"], 2)
+        self.engine.load(self.paths[0])
+        self.assertEqual(self.mixer.decoded, 4)
+
+    def test_missing_file(self):
+        self.engine.play([Path(self.tmp_dir.name) / "missing.mp3", self.paths[0]])
+        self.wait_started(1)
+        self.assertEqual(self.played(), [b"line 0"])
+        self.assertEqual(self.engine.stats()["errors"], 1)
+
+    def test_no_free_channel(self):
+        self.mixer.no_channel = True
+        self.engine.play(self.paths[:1])
+        self.wait_started(1)
+        # the worker survives and plays the next match
+        self.engine.play(self.paths[1:2])
+        self.wait_started(1)
+        self.assertEqual(self.played(), [b"line 1"])
+        self.assertEqual(self.engine.stats()["errors"], 1)
+
+    def test_mixer_init_failed(self):
+        self.mixer.init_error = RuntimeError("no audio device")
+        self.engine.start()
+        self.engine.thread.join(5)
+        self.engine.play(self.paths[:1])
+        self.assertTrue(self.engine.queue.empty())
+        self.assertEqual(self.engine.stats()["mixer_error"], "no audio device")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import multiprocessing
+import pickle
+import tempfile
+from pathlib import Path
+from cache_store import AppendOnlyStore
+
+def write_records(path, writer, count):
+    store = AppendOnlyStore(path)
+    store.load()
+    records = []
+    for i in range(count):
+        records.append((writer, i))
+        store.append((writer, i))
+        if i % 10 == 0:
+            store.flush()
+        if i == count // 2:
+            # the other process has appended by now, compacting to this writer's records would drop its records
+            store.compact(records)
+    store.close()
+
+class TestAppendOnlyStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / 'cache.log'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_append_and_load(self):
+        store = AppendOnlyStore(self.path)
+        self.assertEqual(store.load(), [])
+        sizes = [store.append({'string' : i}) for i in range(10)]
+        store.close()
+
+        records = AppendOnlyStore(self.path).load()
+        self.assertEqual(records, [{'string' : i} for i in range(10)])
+        # append returns the size of each framed record
+        self.assertEqual(sum(sizes), self.path.stat().st_size)
+
+    def test_torn_record_is_truncated(self):
+        store = AppendOnlyStore(self.path)
+        store.append({'string' : 'first'})
+        store.append({'string' : 'second'})
+        store.close()
+
+        # simulate a crash half way through writing the last record
+        size = self.path.stat().st_size
+        with open(self.path, 'r+b') as f:
+            f.truncate(size - 3)
+
+        store = AppendOnlyStore(self.path)
+        self.assertEqual(store.load(), [{'string' : 'first'}])
+        store.append({'string' : 'third'})
+        store.close()
+        self.assertEqual(AppendOnlyStore(self.path).load(), [{'string' : 'first'}, {'string' : 'third'}])
+
+    def test_compact(self):
+        store = AppendOnlyStore(self.path)
+        for i in range(10):
+            store.append(i)
+        store.compact([8, 9])
+        store.append(10)
+        store.close()
+        self.assertEqual(AppendOnlyStore(self.path).load(), [8, 9, 10])
+
+    def test_legacy_pickle_import(self):
+        legacy_path = Path(self.tmp_dir.name) / 'cache.pkl'
+        with open(legacy_path, 'wb') as f:
+            pickle.dump([{'translation' : 'a'}, {'translation' : 'b'}], f)
+
+        store = AppendOnlyStore(self.path, legacy_pickle_path=legacy_path)
+        self.assertEqual(store.load(), [{'translation' : 'a'}, {'translation' : 'b'}])
+        self.assertTrue(self.path.exists())
+        self.assertEqual(AppendOnlyStore(self.path).load(), [{'translation' : 'a'}, {'translation' : 'b'}])
+    def test_two_writer_processes(self):
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=write_records, args=(self.path, writer, 300)) for writer in ('a', 'b')]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+        records = AppendOnlyStore(self.path).load()
+        self.assertEqual(len(records), 600)
+        self.assertEqual(set(records), {(writer, i) for writer in ('a', 'b') for i in range(300)})
+
+    def test_log_replaced_by_other_writer(self):
+        first = AppendOnlyStore(self.path)
+        first.load()
+        first.append(1)
+        first.flush()
+
+        second = AppendOnlyStore(self.path)
+        self.assertEqual(second.load(), [1])
+        second.append(2)
+        second.compact([1, 2])
+        second.close()
+
+        # the first store's file was replaced, its next append goes to the new log
+        first.append(3)
+        first.compact([1, 3])
+        first.close()
+        self.assertEqual(AppendOnlyStore(self.path).load(), [1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
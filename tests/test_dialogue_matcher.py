@@ -0,0 +1,111 @@
+import unittest
+import json
+import random
+from rapidfuzz import fuzz
+from dialogue_matcher import DialogueMatcher, MATCH_THRESHOLDS
+
+def load_dialogues(path):
+    with open(path, 'r', encoding='utf8') as f:
+        return {index: item for index, item in enumerate(json.load(f))}
+
+def linear_scan(dialogues, text, threshold):
+    # reference implementation, the loop FrameProcessor.find_closest_entry used to run
+    max_similarity_ratio = threshold
+    closest_entry_number = None
+    for number, entry in dialogues.items():
+        similarity_ratio = round(fuzz.ratio(text, entry['dialogue'])) / 100.0
+        if similarity_ratio > max_similarity_ratio:
+            max_similarity_ratio = similarity_ratio
+            closest_entry_number = number
+    return closest_entry_number
+
+def add_typos(text, rng, num_typos):
+    chars = list(text)
+    for _ in range(num_typos):
+        chars[rng.randrange(len(chars))] = rng.choice('abcdefghijklmnopqrstuvwxyz0 ')
+    return ''.join(chars)
+
+class TestDialogueMatcher(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(0)
+        self.dialogues_en = load_dialogues('dialogues_en_v2.json')
+        self.dialogues_jp = load_dialogues('dialogues_jp_v2.json')
+
+    def test_find_closest_en(self):
+        matcher = DialogueMatcher(self.dialogues_en, 'en')
+        self.assertEqual(matcher.find_closest("Why are we robbing crystols from innocent People?"), 2)
+        self.assertEqual(matcher.find_closest("That' s our duty."), 3)
+        self.assertIsNone(matcher.find_closest("HP 200 MP 50"))
+
+    def test_find_closest_entries(self):
+        matcher = DialogueMatcher(self.dialogues_en, 'en')
+        self.assertEqual(matcher.find_closest_entries(["Why are we robbing crystols from innocent People?", "That' s our duty.", "zzz"]), [2, 3])
+
+    def test_thresholds_per_language(self):
+        self.assertEqual(DialogueMatcher(self.dialogues_jp, 'jp').threshold, MATCH_THRESHOLDS['jp'])
+        self.assertEqual(DialogueMatcher(self.dialogues_en, 'en').threshold, MATCH_THRESHOLDS['en'])
+
+    def test_matches_linear_scan(self):
+        for dialogues, lang in [(self.dialogues_en, 'en'), (self.dialogues_jp, 'jp')]:
+            matcher = DialogueMatcher(dialogues, lang)
+            for number, entry in dialogues.items():
+                text = add_typos(entry['dialogue'], self.rng, 3)
+                self.assertEqual(matcher.find_closest(text), linear_scan(dialogues, text, matcher.threshold))
+
+    def test_shortlist_on_long_script(self):
+        # repeat the script with variations so it is long enough to be shortlisted
+        dialogues = {}
+        for copy in range(60):
+            for entry in self.dialogues_en.values():
+                dialogues[len(dialogues)] = {'name' : entry['name'], 'dialogue' : add_typos(entry['dialogue'], self.rng, copy % 5)}
+        matcher = DialogueMatcher(dialogues, 'en', full_scan_size=500)
+        self.assertGreater(len(matcher), matcher.full_scan_size)
+
+        for number in self.rng.sample(list(dialogues), 100):
+            text = add_typos(dialogues[number]['dialogue'], self.rng, 2)
+            self.assertEqual(matcher.find_closest(text), linear_scan(dialogues, text, matcher.threshold))
+
+class TestDialogueMatcherCursor(unittest.TestCase):
+    def setUp(self):
+        self.matcher = DialogueMatcher(load_dialogues('dialogues_jp_v2.json'), 'jp')
+
+    def test_repeated_line_follows_cursor(self):
+        # 'ああ‥‥' is both line 1 and line 75
+        self.assertEqual(self.matcher.find_closest('ああ‥‥'), 1)
+        self.assertEqual(self.matcher.find_closest('ああ‥‥', cursor=0), 1)
+        self.assertEqual(self.matcher.find_closest('ああ‥‥', cursor=74), 75)
+
+    def test_repeated_line_global_tie_prefers_ahead(self):
+        # '陛下！' is lines 52, 59, 64 and 66, line 30 is too far for the window
+        self.assertEqual(self.matcher.find_closest('陛下！', cursor=30), 52)
+        self.assertEqual(self.matcher.find_closest('陛下！', cursor=60), 64)
+        # every occurrence is behind the cursor, the shortest jump back wins
+        self.assertEqual(self.matcher.find_closest('陛下！', cursor=80), 66)
+
+    def test_window_match_and_global_fallback(self):
+        dialogue = self.matcher.choices[5]
+        self.assertEqual(self.matcher.find_closest(dialogue, cursor=4), 5)
+        self.assertEqual(self.matcher.stats(), {'window_matches' : 1, 'global_searches' : 0})
+
+        dialogue = self.matcher.choices[50]
+        self.assertEqual(self.matcher.find_closest(dialogue, cursor=4), 50)
+        self.assertEqual(self.matcher.stats(), {'window_matches' : 1, 'global_searches' : 1})
+
+    def test_window_match_beaten_by_global(self):
+        # a text the window matches confidently, but that is exactly a line far from the cursor
+        dialogues = {0 : {'dialogue' : 'ありがとうございます'}, 1 : {'dialogue' : 'ありがとうござい'}}
+        for number in range(2, 30):
+            dialogues[number] = {'dialogue' : f'セリフ{number}'}
+        dialogues[30] = {'dialogue' : 'ありがとうございますね'}
+        matcher = DialogueMatcher(dialogues, 'jp')
+        self.assertEqual(matcher.find_closest('ありがとうございますね', cursor=0), 30)
+        self.assertEqual(matcher.stats(), {'window_matches' : 0, 'global_searches' : 1})
+        # the window has the best line, the global search confirms it
+        self.assertEqual(matcher.find_closest('ありがとうございます', cursor=0), 0)
+
+    def test_find_closest_entries_advances_cursor(self):
+        texts = [self.matcher.choices[74], 'ああ‥‥']
+        self.assertEqual(self.matcher.find_closest_entries(texts, cursor=73), [74, 75])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,7 @@ from ocr_enum import OCREngine
 from shapely.geometry import box
 from image_diff import calculate_image_hash_different
 from pathlib import Path
+import numpy as np
 
 def calculate_iou(bbox1, bbox2):
     box1 = box(bbox1[0][0], bbox1[0][1], bbox1[1][0], bbox1[1][1])
@@ -111,6 +112,61 @@ class TestDialogueOverlay(unittest.TestCase):
         result_image.save(self.test_data_dir / 'test_print_annotations_pil_with_no_translation.jpg')
         self.assertIsInstance(result_image, Image.Image)
 
+    def test_print_annotations_array(self):
+        frame_data = np.asarray(self.test_bbox_image.convert('RGB'))
+        self.video_stream.current_annotations = []
+        self.assertIs(self.video_stream.print_annotations_array(frame_data), frame_data)
+
+        self.video_stream.current_annotations = self.ann
+        self.video_stream.background_task_args = {'translate': False}
+        original = frame_data.copy()
+        result = self.video_stream.print_annotations_array(frame_data)
+        self.assertEqual(result.shape, frame_data.shape)
+        self.assertTrue(np.array_equal(frame_data, original))
+        self.assertFalse(np.array_equal(result, frame_data))
+        self.assertEqual(self.video_stream.frame_stats(), {"passthrough_frames": 1, "rendered_frames": 1})
+
+    def test_annotations_version(self):
+        version = self.video_stream.annotations_version
+        self.video_stream.set_annotations(self.ann)
+        self.video_stream.set_translation("Example Translation")
+        self.assertEqual(self.video_stream.annotations_version, version + 2)
+
+        # setting the same values again or None doesn't count as a change
+        self.video_stream.set_annotations(list(self.ann))
+        self.video_stream.set_translation("Example Translation")
+        self.video_stream.set_annotations(None)
+        self.assertEqual(self.video_stream.annotations_version, version + 2)
+
+        self.video_stream.set_annotations([])
+        self.assertEqual(self.video_stream.annotations_version, version + 3)
+
+    def test_replace_annotations(self):
+        self.video_stream.set_annotations(self.ann)
+        self.video_stream.set_translation("Example Translation")
+        version = self.video_stream.annotations_version
+        self.video_stream.replace_annotations(self.ann, None)
+        self.assertIsNone(self.video_stream.current_translations)
+        self.assertEqual(self.video_stream.annotations_version, version + 1)
+        self.video_stream.replace_annotations(list(self.ann), None)
+        self.assertEqual(self.video_stream.annotations_version, version + 1)
+
+    def test_push_frame(self):
+        frame_data = np.asarray(self.test_bbox_image.convert('RGB'))
+        self.video_stream.push_frame(frame_data)
+        latest_frame = self.video_stream.get_latest_frame()
+        self.assertTrue(np.array_equal(np.asarray(latest_frame), frame_data))
+        # the converted frame is reused until a newer one is pushed
+        self.assertIs(self.video_stream.get_latest_frame(), latest_frame)
+
+        self.video_stream.push_frame(frame_data[10:])
+        self.assertEqual(self.video_stream.get_latest_frame().size, (frame_data.shape[1], frame_data.shape[0] - 10))
+
+    def test_print_annotations_passthrough(self):
+        self.video_stream.current_annotations = []
+        self.assertIs(self.video_stream.print_annotations(self.test_bbox_image), self.test_bbox_image)
+        self.assertEqual(self.video_stream.frame_stats()["passthrough_frames"], 1)
+
     def test_calculate_annotation_bounds_single(self):
         # Single annotation
         annotations = [([(934, 54), (1177, 129)], '#rUali')]
@@ -195,6 +251,14 @@ class TestDialogueOverlay(unittest.TestCase):
         result_size = self.video_stream.calculate_font_size(-300, -100, text, 35)
         self.assertIsNone(result_size, "Font size calculation should return None for negative dimensions")
     
+    def test_layout_translation_cached(self):
+        text = "This is a sample text to test the font size calculation."
+        layout = self.video_stream.layout_translation(text, 1016, 500)
+        self.assertEqual(layout["font_size"], self.video_stream.calculate_font_size(1016, 500, text, 35))
+        self.assertEqual(layout["text"], self.video_stream.adjust_translation_text(text, layout["font"], 1016))
+        self.assertIs(self.video_stream.layout_translation(text, 1016, 500), layout)
+        self.assertIs(layout["font"], self.video_stream.font_pool.get(layout["font_size"]))
+
     def test_adjust_translation_text_basic(self):
         translation = "This is a test text to fit within the dialogue box."
         dialogue_box_width = 1016
@@ -0,0 +1,67 @@
+import unittest
+from PIL import Image, ImageDraw
+from frame_gate import FrameGate
+
+class FakeDetector:
+    """Says an image has text when it contains any white pixel."""
+    def __init__(self):
+        self.calls = []
+
+    def preprocess_image(self, image):
+        return image
+
+    def has_text(self, image):
+        self.calls.append(image.size)
+        return image.convert('L').getextrema()[1] == 255
+
+def frame(text_box=None, sprite_x=None):
+    img = Image.new('RGB', (640, 480), (0, 0, 80))
+    draw = ImageDraw.Draw(img)
+    if text_box is not None:
+        draw.rectangle(text_box, fill=(255, 255, 255))
+    if sprite_x is not None:
+        draw.rectangle((sprite_x, 400, sprite_x + 40, 440), fill=(200, 0, 0))
+    return img
+
+class TestFrameGate(unittest.TestCase):
+    def setUp(self):
+        self.detector = FakeDetector()
+        self.gate = FrameGate(self.detector)
+
+    def test_static_frames_skip_detection(self):
+        self.assertEqual(self.gate.check(frame((40, 40, 200, 80))), 'ocr')
+        for _ in range(20):
+            self.assertEqual(self.gate.check(frame((40, 40, 200, 80))), 'static')
+        self.assertEqual(len(self.detector.calls), 1)
+        stats = self.gate.stats()
+        self.assertEqual(stats['frames'], 21)
+        self.assertEqual(stats['skipped_static'], 20)
+        self.assertEqual(stats['passed'], 1)
+
+    def test_same_frame_object_is_static(self):
+        img = frame()
+        self.gate.check(img)
+        self.assertEqual(self.gate.check(img), 'static')
+
+    def test_detection_runs_on_changed_region(self):
+        self.gate.check(frame())
+        self.assertEqual(self.gate.check(frame(text_box=(40, 40, 200, 80))), 'ocr')
+        width, height = self.detector.calls[-1]
+        self.assertLess(width * height, 640 * 480 // 4)
+
+    def test_changed_region_without_text(self):
+        self.gate.check(frame(sprite_x=100))
+        self.assertEqual(self.gate.check(frame(sprite_x=300)), 'no_text')
+        self.assertEqual(self.gate.stats()['skipped_no_text'], 2)
+        self.assertEqual(self.gate.stats()['full_frame_checks'], 0)
+
+    def test_text_elsewhere_falls_back_to_full_frame(self):
+        self.gate.check(frame(text_box=(40, 40, 200, 80), sprite_x=100))
+        self.assertEqual(self.gate.check(frame(text_box=(40, 40, 200, 80), sprite_x=300)), 'ocr')
+        self.assertEqual(self.gate.stats()['full_frame_checks'], 1)
+
+        # the text was cleared
+        self.assertEqual(self.gate.check(frame(sprite_x=300)), 'no_text')
+
+if __name__ == '__main__':
+    unittest.main()
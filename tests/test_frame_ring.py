@@ -0,0 +1,74 @@
+import unittest
+import numpy as np
+from frame_ring import FrameRingBuffer
+
+class TestFrameRingBuffer(unittest.TestCase):
+    def test_empty(self):
+        frame_ring = FrameRingBuffer(max_shape=(4, 4, 3))
+        self.assertEqual(frame_ring.latest_seq(), 0)
+        self.assertEqual(frame_ring.read(), (None, None))
+
+    def test_read_newest(self):
+        frame_ring = FrameRingBuffer(capacity=3, max_shape=(4, 6, 3))
+        for value in range(5):
+            seq = frame_ring.write(np.full((4, 6, 3), value, dtype=np.uint8))
+        self.assertEqual(seq, 5)
+
+        seq, frame_data = frame_ring.read()
+        self.assertEqual(seq, 5)
+        np.testing.assert_array_equal(frame_data, np.full((4, 6, 3), 4, dtype=np.uint8))
+        # nothing newer than what was read
+        self.assertEqual(frame_ring.read(after=seq), (None, None))
+
+    def test_smaller_frames(self):
+        frame_ring = FrameRingBuffer(max_shape=(8, 8, 3))
+        frame_data = np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3)
+        frame_ring.write(frame_data[1:])
+        np.testing.assert_array_equal(frame_ring.read()[1], frame_data[1:])
+        self.assertFalse(frame_ring.fits((9, 8, 3)))
+        with self.assertRaises(ValueError):
+            frame_ring.write(np.zeros((9, 8, 3), dtype=np.uint8))
+
+    def test_view_invalidated_by_overwrite(self):
+        frame_ring = FrameRingBuffer(capacity=2, max_shape=(2, 2))
+        frame_ring.write(np.zeros((2, 2), dtype=np.uint8))
+        seq, view = frame_ring.read_latest()
+        np.testing.assert_array_equal(view, np.zeros((2, 2), dtype=np.uint8))
+        self.assertTrue(frame_ring.valid(seq))
+        frame_ring.write(np.ones((2, 2), dtype=np.uint8))
+        self.assertTrue(frame_ring.valid(seq))
+        frame_ring.write(np.ones((2, 2), dtype=np.uint8))
+        self.assertFalse(frame_ring.valid(seq))
+
+    def test_torn_read_retried(self):
+        frame_ring = FrameRingBuffer(capacity=2, max_shape=(2, 2))
+        frame_ring.write(np.zeros((2, 2), dtype=np.uint8))
+        conversions = []
+
+        def convert(view):
+            # the writer laps the reader during the first conversion
+            if not conversions:
+                frame_ring.write(np.full((2, 2), 3, dtype=np.uint8))
+                frame_ring.write(np.full((2, 2), 3, dtype=np.uint8))
+            conversions.append(view.copy())
+            return conversions[-1]
+
+        seq, frame_data = frame_ring.read(convert)
+        self.assertEqual(seq, 3)
+        np.testing.assert_array_equal(frame_data, np.full((2, 2), 3, dtype=np.uint8))
+        self.assertEqual(frame_ring.torn_reads, 1)
+
+    def test_shared_attach(self):
+        frame_ring = FrameRingBuffer(max_shape=(4, 4, 3), shared=True)
+        attached = FrameRingBuffer(frame_ring.capacity, frame_ring.max_shape, name=frame_ring.name)
+        try:
+            frame_ring.write(np.full((4, 4, 3), 9, dtype=np.uint8))
+            seq, frame_data = attached.read()
+            self.assertEqual(seq, 1)
+            np.testing.assert_array_equal(frame_data, np.full((4, 4, 3), 9, dtype=np.uint8))
+        finally:
+            attached.close()
+            frame_ring.close()
+
+if __name__ == '__main__':
+    unittest.main()
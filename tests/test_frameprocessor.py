@@ -2,8 +2,12 @@ import unittest
 from pathlib import Path
 from PIL import Image, ImageDraw
 import json
+import requests
 import imagehash
+from types import SimpleNamespace
 from process_frames import FrameProcessor
+from script_translations import ScriptTranslations
+from translation_memo import TranslationMemo
 from utils import draw_translation
 
 class TestFrameProcessor(unittest.TestCase):
@@ -38,6 +42,21 @@ class TestFrameProcessor(unittest.TestCase):
         
         self.assertEqual(input_image_hash, output_image_hash, "The annotated image does not match the expected output image.")
     
+    def test_translate_openai_request_failed(self):
+        def call_translation_api(content, target_lang):
+            raise requests.Timeout("read timed out")
+        self.processor.openai_api.call_translation_api = call_translation_api
+        self.assertEqual(self.processor.translate_openai("hello", 'jp'), ('', {}))
+
+    def test_translate_lines_from_memo(self):
+        dialogues = {0: {'name': 'Cecil', 'dialogue': 'Yes.', 'japanese': 'はい。'}, 1: {'name': 'Cecil', 'dialogue': 'Let us go.'}}
+        frameProcessor = SimpleNamespace(dialogues=dialogues, script_translations=ScriptTranslations(dialogues, 'en'),
+                                         translation_memo=TranslationMemo(), openai_api=SimpleNamespace(translation_model="gpt-4o"))
+        self.assertIsNone(FrameProcessor.translate_lines_from_memo(frameProcessor, [0, 1], 'jp'))
+        # what LinePrefetcher stores for line 1
+        frameProcessor.translation_memo.put(TranslationMemo.text_key('Cecil : Let us go.', 'jp', "gpt-4o"), 'セシル : 行こう。')
+        self.assertEqual(FrameProcessor.translate_lines_from_memo(frameProcessor, [0, 1], 'jp'), 'はい。 セシル : 行こう。')
+
     def test_save_outputs(self):
         # Run the image through the processor
         last_played, previous_image, highlighted_image, annotations, translation = self.processor.run_image(self.input_image)
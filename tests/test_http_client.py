@@ -0,0 +1,181 @@
+import unittest
+import json
+import threading
+import email.utils
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socket
+import asyncio
+import requests
+from http_client import AsyncHTTPClient, HTTPClient, LatencyHistogram, RetryPolicy, parse_retry_after
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+def closed_port_url():
+    # a port nothing listens on, connecting to it is refused
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}/v1/chat/completions"
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        server.requests += 1
+        server.connections.add(self.client_address)
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        status, headers = server.responses.pop(0) if server.responses else (200, {})
+        if status == "hang":
+            time.sleep(0.5)
+            status = 200
+        body = json.dumps({"echo": payload} if status == 200 else {"error": status}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_api(test):
+    test.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAPIHandler)
+    test.server.requests = 0
+    test.server.connections = set()
+    test.server.responses = []
+    threading.Thread(target=test.server.serve_forever, daemon=True).start()
+    test.url = f"http://127.0.0.1:{test.server.server_address[1]}/v1/chat/completions"
+
+def stop_fake_api(test):
+    test.server.shutdown()
+    test.server.server_close()
+
+class TestHTTPClient(unittest.TestCase):
+    def setUp(self):
+        start_fake_api(self)
+        self.client = HTTPClient(timeout=(1, 0.2), retry_policy=RetryPolicy(max_retries=2, backoff=0.01))
+
+    def tearDown(self):
+        self.client.close()
+        stop_fake_api(self)
+
+    def test_connection_reused(self):
+        for index in range(3):
+            self.assertEqual(self.client.post_json(self.url, {"index": index}), {"echo": {"index": index}})
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.client.stats()[self.url]["count"], 3)
+
+    def test_retry_after_honored(self):
+        self.server.responses = [(429, {"retry-after": "0"}), (503, {})]
+        self.assertEqual(self.client.post_json(self.url, {"a": 1}), {"echo": {"a": 1}})
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.client.stats()[self.url]["retries"], 2)
+
+    def test_retries_used_up(self):
+        self.server.responses = [(500, {})] * 3
+        with self.assertRaises(requests.HTTPError):
+            self.client.post_json(self.url, {})
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.client.stats()[self.url]["errors"], 1)
+
+    def test_client_error_not_retried(self):
+        self.server.responses = [(400, {})]
+        with self.assertRaises(requests.HTTPError):
+            self.client.post_json(self.url, {})
+        self.assertEqual(self.server.requests, 1)
+
+    def test_read_timeout_not_retried(self):
+        self.server.responses = [("hang", {})]
+        with self.assertRaises(requests.ReadTimeout):
+            self.client.post_json(self.url, {"a": 1})
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.client.stats()[self.url]["errors"], 1)
+
+    def test_connection_error_retried(self):
+        url = closed_port_url()
+        with self.assertRaises(requests.ConnectionError):
+            self.client.post_json(url, {})
+        self.assertEqual(self.client.stats()[url]["retries"], 2)
+        self.assertEqual(self.client.stats()[url]["errors"], 1)
+
+@unittest.skipUnless(aiohttp, "aiohttp is not installed")
+class TestAsyncHTTPClient(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        start_fake_api(self)
+        self.client = AsyncHTTPClient(timeout=(1, 0.2), retry_policy=RetryPolicy(max_retries=2, backoff=0.01))
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    def tearDown(self):
+        stop_fake_api(self)
+
+    async def test_connection_reused(self):
+        for index in range(3):
+            self.assertEqual(await self.client.post_json(self.url, {"index": index}), {"echo": {"index": index}})
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.client.stats()[self.url]["count"], 3)
+
+    async def test_retry_after_honored(self):
+        self.server.responses = [(429, {"retry-after": "0"}), (503, {})]
+        self.assertEqual(await self.client.post_json(self.url, {"a": 1}), {"echo": {"a": 1}})
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.client.stats()[self.url]["retries"], 2)
+
+    async def test_client_error_not_retried(self):
+        self.server.responses = [(400, {})]
+        with self.assertRaises(aiohttp.ClientResponseError):
+            await self.client.post_json(self.url, {})
+        self.assertEqual(self.server.requests, 1)
+
+    async def test_read_timeout_not_retried(self):
+        self.server.responses = [("hang", {})]
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.client.post_json(self.url, {"a": 1})
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.client.stats()[self.url]["errors"], 1)
+
+    async def test_connection_error_retried(self):
+        url = closed_port_url()
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            await self.client.post_json(url, {})
+        self.assertEqual(self.client.stats()[url]["retries"], 2)
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after({"retry-after": "2"}), 2.0)
+        self.assertEqual(parse_retry_after({"retry-after-ms": "250", "retry-after": "2"}), 0.25)
+        self.assertIsNone(parse_retry_after({}))
+        self.assertIsNone(parse_retry_after({"retry-after": "soon"}))
+        retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(parse_retry_after({"retry-after": retry_at}), 30, delta=2)
+
+    def test_backoff(self):
+        policy = RetryPolicy(max_retries=3, backoff=0.5, max_backoff=1.5)
+        self.assertEqual([policy.delay(attempt) for attempt in range(3)], [0.5, 1.0, 1.5])
+        self.assertEqual(policy.delay(0, {"retry-after": "1"}), 1.0)
+        self.assertEqual(policy.delay(0, {"retry-after": "60"}), 1.5)
+        self.assertTrue(policy.should_retry(0, 429))
+        self.assertFalse(policy.should_retry(0, 404))
+        self.assertFalse(policy.should_retry(3))
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram(buckets=(0.1, 1, 10))
+        for seconds in [0.05] * 6 + [0.5] * 3 + [20]:
+            histogram.record(seconds)
+        stats = histogram.stats()
+        self.assertEqual(stats["count"], 10)
+        self.assertEqual(stats["buckets"], {"0.1": 6, "1": 3, "10": 0, "inf": 1})
+        self.assertEqual(stats["p50"], 0.1)
+        self.assertEqual(stats["p95"], 20)
+        self.assertEqual(stats["max"], 20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,8 @@ import unittest
 from PIL import Image, ImageChops
 import io
 import imagehash
-from image_diff import image_crop_title_bar, image_crop_in_top_half, image_crop_dialogue_box, crop_image_by_bboxes, combine_images
+from image_diff import image_crop_title_bar, image_crop_in_top_half, image_crop_dialogue_box, crop_image_by_bboxes, combine_images, merge_overlapping_rectangles
+import numpy as np
 from pathlib import Path
 
 class TestImageCropTitleBar(unittest.TestCase):
@@ -127,5 +128,50 @@ class TestImageCropTitleBar(unittest.TestCase):
         self.assertTrue(self.compare_images(combined_image, expected_image))
 
 
+def rectangles_overlap(rect1, rect2):
+    return not (rect1[1][0] < rect2[0][0] or rect2[1][0] < rect1[0][0] or rect1[1][1] < rect2[0][1] or rect2[1][1] < rect1[0][1])
+
+class TestMergeOverlappingRectangles(unittest.TestCase):
+
+    def test_merge(self):
+        rectangles = [[(0, 0), (10, 10)],
+                      [(100, 100), (110, 110)],
+                      [(5, 5), (20, 12)],
+                      [(200, 0), (210, 10)]]
+        merged, labels = merge_overlapping_rectangles(rectangles)
+        self.assertEqual(merged, [[(0, 0), (20, 12)], [(100, 100), (110, 110)], [(200, 0), (210, 10)]])
+        self.assertEqual(labels, [0, 1, 0, 2])
+        self.assertIs(merged[1], rectangles[1])
+
+    def test_merged_box_overlaps_more_boxes(self):
+        # the third box only overlaps the first and last once they are merged
+        rectangles = [[(0, 0), (10, 10)],
+                      [(20, 20), (30, 30)],
+                      [(12, 0), (15, 5)],
+                      [(0, 8), (25, 9)]]
+        merged, labels = merge_overlapping_rectangles(rectangles)
+        self.assertEqual(merged, [[(0, 0), (25, 10)], [(20, 20), (30, 30)]])
+        self.assertEqual(labels, [0, 1, 0, 0])
+
+    def test_empty(self):
+        self.assertEqual(merge_overlapping_rectangles([]), ([], []))
+
+    def test_dense_layout(self):
+        rng = np.random.default_rng(0)
+        rectangles = []
+        for _ in range(300):
+            x1, y1 = int(rng.integers(0, 1200)), int(rng.integers(0, 700))
+            rectangles.append([(x1, y1), (x1 + int(rng.integers(5, 60)), y1 + int(rng.integers(5, 20)))])
+        merged, labels = merge_overlapping_rectangles(rectangles)
+
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                self.assertFalse(rectangles_overlap(merged[i], merged[j]))
+        for rectangle, label in zip(rectangles, labels):
+            self.assertTrue(merged[label][0][0] <= rectangle[0][0] and merged[label][1][1] >= rectangle[1][1])
+        # merged rectangles are in order of their first input rectangle
+        self.assertEqual(sorted(set(labels), key=labels.index), list(range(len(merged))))
+
+
 if __name__ == '__main__':
     unittest.main()
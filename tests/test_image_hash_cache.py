@@ -0,0 +1,130 @@
+import unittest
+import time
+import numpy as np
+import imagehash
+from image_hash_cache import ImageHashCache, pack_hash, hamming_distances, estimate_size
+
+def random_hash(rng, hash_size=16):
+    return imagehash.ImageHash(rng.random((hash_size, hash_size)) > 0.5)
+
+def flip_bits(img_hash, rng, num_bits):
+    bits = img_hash.hash.flatten().copy()
+    positions = rng.choice(bits.size, num_bits, replace=False)
+    bits[positions] = ~bits[positions]
+    return imagehash.ImageHash(bits.reshape(img_hash.hash.shape))
+
+class TestImageHashCache(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.hashes = [random_hash(self.rng) for _ in range(500)]
+        self.cache = ImageHashCache([{'string' : i, 'hash' : h} for i, h in enumerate(self.hashes)])
+
+    def test_hamming_distances(self):
+        packed = np.stack([pack_hash(h) for h in self.hashes[:10]])
+        distances = hamming_distances(packed, pack_hash(self.hashes[0]))
+        expected = [self.hashes[0] - h for h in self.hashes[:10]]
+        self.assertEqual(distances.tolist(), expected)
+
+    def test_find_closest_hit(self):
+        for num_bits in range(7):
+            query = flip_bits(self.hashes[42], self.rng, num_bits)
+            closest_entry = self.cache.find_closest(query)
+            self.assertEqual(closest_entry, 42)
+            self.assertEqual(self.cache[closest_entry]['string'], 42)
+
+    def test_find_closest_miss(self):
+        query = flip_bits(self.hashes[42], self.rng, 7)
+        self.assertIsNone(self.cache.find_closest(query))
+        self.assertIsNone(self.cache.find_closest(random_hash(self.rng)))
+
+    def test_find_closest_prefers_latest_on_ties(self):
+        self.cache.append({'string' : 'duplicate', 'hash' : self.hashes[7]})
+        closest_entry = self.cache.find_closest(self.hashes[7])
+        self.assertEqual(closest_entry, len(self.hashes))
+
+    def test_matches_linear_scan(self):
+        for _ in range(50):
+            query = flip_bits(self.hashes[self.rng.integers(len(self.hashes))], self.rng, int(self.rng.integers(10)))
+            diffs = [query - h for h in self.hashes]
+            min_diff = min(diffs)
+            expected = max(i for i, d in enumerate(diffs) if d == min_diff) if min_diff < 7 else None
+            self.assertEqual(self.cache.find_closest(query), expected)
+
+    def test_stats(self):
+        self.cache.find_closest(self.hashes[0])
+        self.cache.find_closest(random_hash(self.rng))
+        stats = self.cache.stats()
+        self.assertEqual(stats['entries'], 500)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+class TestImageHashCacheEviction(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(1)
+        self.hashes = [random_hash(self.rng) for _ in range(20)]
+
+    def test_max_entries_lru(self):
+        cache = ImageHashCache(max_entries=3)
+        for i in range(3):
+            cache.append({'string' : i, 'hash' : self.hashes[i]})
+        # touch the oldest entry so the second one becomes least recently used
+        self.assertIsNotNone(cache.find_closest(self.hashes[0]))
+        cache.append({'string' : 3, 'hash' : self.hashes[3]})
+
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.find_closest(self.hashes[1]))
+        self.assertEqual([e['string'] for e in cache.entries], [0, 2, 3])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_max_entries_lfu(self):
+        cache = ImageHashCache(max_entries=3, policy='lfu')
+        for i in range(3):
+            cache.append({'string' : i, 'hash' : self.hashes[i]})
+        cache.find_closest(self.hashes[0])
+        cache.find_closest(self.hashes[0])
+        cache.find_closest(self.hashes[2])
+        cache.append({'string' : 3, 'hash' : self.hashes[3]})
+        self.assertEqual(sorted(e['string'] for e in cache.entries), [0, 2, 3])
+
+    def test_max_bytes(self):
+        max_bytes = 10 * estimate_size({'string' : 0, 'hash' : self.hashes[0], 'created' : 0.0})
+        cache = ImageHashCache(max_bytes=max_bytes)
+        for i in range(20):
+            cache.append({'string' : i, 'hash' : self.hashes[i]})
+        self.assertLessEqual(cache.total_bytes, max_bytes)
+        self.assertEqual(cache.entries[-1]['string'], 19)
+        self.assertLess(len(cache), 20)
+
+    def test_given_size(self):
+        cache = ImageHashCache(max_bytes=1000)
+        cache.append({'string' : 0, 'hash' : self.hashes[0]}, size=600)
+        cache.append({'string' : 1, 'hash' : self.hashes[1]}, size=600)
+        self.assertEqual(cache.total_bytes, 600)
+        self.assertEqual([e['string'] for e in cache.entries], [1])
+
+    def test_estimate_size(self):
+        entry = {'string' : [3, 4], 'annotations' : [([[0, 0], [10, 10]], 'some text')], 'hash' : self.hashes[0]}
+        self.assertGreater(estimate_size(entry), len('some text') + 32)
+
+    def test_slots_are_reused(self):
+        cache = ImageHashCache(max_entries=2)
+        for i in range(20):
+            cache.append({'string' : i, 'hash' : self.hashes[i]})
+            self.assertEqual(cache[cache.find_closest(self.hashes[i])]['string'], i)
+        self.assertEqual(len(cache._slots), 3)
+
+    def test_ttl(self):
+        cache = ImageHashCache(ttl=60)
+        cache.append({'string' : 'old', 'hash' : self.hashes[0], 'created' : time.time() - 120})
+        cache.append({'string' : 'new', 'hash' : self.hashes[1]})
+        self.assertEqual([e['string'] for e in cache.entries], ['new'])
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+        cache.set_limits(ttl=1)
+        cache.expire(now=time.time() + 2)
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.find_closest(self.hashes[1]))
+
+if __name__ == '__main__':
+    unittest.main()
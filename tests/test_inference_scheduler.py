@@ -0,0 +1,120 @@
+import unittest
+import threading
+from concurrent.futures import TimeoutError
+import cv2
+import numpy as np
+from inference_scheduler import InferenceScheduler, group_by_shape, get_shared_scheduler, rgb_to_grey, easyocr_readtext, easyocr_readtext_batch
+
+class FakeReader:
+    """Records what easyocr.Reader.detect and recognize are given."""
+
+    def __init__(self):
+        self.detected = []
+        self.recognized = []
+
+    def detect(self, image, reformat=True):
+        self.detected.append(image)
+        boxes = [[[0, 1, 0, 1]] for _ in range(len(image) if image.ndim == 4 else 1)]
+        return boxes, [[] for _ in boxes]
+
+    def recognize(self, grey, horizontal_list, free_list, detail=1):
+        self.recognized.append(grey)
+        return [(horizontal_list, 'text', 1.0)]
+
+class TestInferenceScheduler(unittest.TestCase):
+    def test_results_routed_to_callers(self):
+        scheduler = InferenceScheduler(lambda items: [item * 2 for item in items], max_wait=0.05)
+        futures = [scheduler.submit(i) for i in range(10)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [i * 2 for i in range(10)])
+
+    def test_batches_concurrent_requests(self):
+        batch_sizes = []
+        def batch_fn(items):
+            batch_sizes.append(len(items))
+            return items
+        scheduler = InferenceScheduler(batch_fn, max_batch=4, max_wait=0.2)
+
+        results = {}
+        def worker(i):
+            results[i] = scheduler(i)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(results, {i : i for i in range(8)})
+        self.assertLessEqual(max(batch_sizes), 4)
+        self.assertLess(len(batch_sizes), 8)
+        self.assertEqual(scheduler.stats()['items'], 8)
+
+    def test_exception_is_raised_in_every_caller(self):
+        def batch_fn(items):
+            raise RuntimeError("inference failed")
+        scheduler = InferenceScheduler(batch_fn, max_wait=0.05)
+        futures = [scheduler.submit(i) for i in range(3)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        # the worker keeps running after a failed batch
+        scheduler.batch_fn = lambda items: items
+        self.assertEqual(scheduler(1), 1)
+
+    def test_missing_results_fail_every_caller(self):
+        scheduler = InferenceScheduler(lambda items: items[:-1], max_wait=0.05)
+        futures = [scheduler.submit(i) for i in range(3)]
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(timeout=5)
+
+    def test_call_times_out(self):
+        release = threading.Event()
+        def batch_fn(items):
+            release.wait(5)
+            return items
+        scheduler = InferenceScheduler(batch_fn, max_wait=0.01, timeout=0.1)
+        with self.assertRaises(TimeoutError):
+            scheduler(1)
+        release.set()
+
+    def test_group_by_shape(self):
+        images = [np.zeros((4, 4, 3)), np.zeros((2, 4, 3)), np.zeros((4, 4, 3))]
+        self.assertEqual(group_by_shape(images), {(4, 4, 3) : [0, 2], (2, 4, 3) : [1]})
+
+    def test_shared_scheduler(self):
+        first = get_shared_scheduler(('test', 'shared'), lambda: InferenceScheduler(lambda items: items))
+        second = get_shared_scheduler(('test', 'shared'), lambda: InferenceScheduler(lambda items: items))
+        self.assertIs(first, second)
+
+class TestEasyocrReadtext(unittest.TestCase):
+    def setUp(self):
+        # a blue dialogue box with white text, red and blue weights differ a lot on it
+        self.image = np.zeros((8, 16, 3), dtype=np.uint8)
+        self.image[...] = (20, 40, 170)
+        self.image[2:6, 4:12] = 255
+
+    def bytes_path_grey(self, image):
+        # what easyocr does with encoded image bytes
+        _, encoded = cv2.imencode('.png', cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        return cv2.cvtColor(cv2.imdecode(encoded, cv2.IMREAD_COLOR), cv2.COLOR_BGR2GRAY)
+
+    def test_grey_matches_bytes_path(self):
+        np.testing.assert_array_equal(rgb_to_grey(self.image), self.bytes_path_grey(self.image))
+
+    def test_readtext(self):
+        reader = FakeReader()
+        self.assertEqual(easyocr_readtext(reader, self.image), [([[0, 1, 0, 1]], 'text', 1.0)])
+        self.assertIs(reader.detected[0], self.image)
+        np.testing.assert_array_equal(reader.recognized[0], self.bytes_path_grey(self.image))
+
+    def test_readtext_batch(self):
+        reader = FakeReader()
+        images = [self.image, self.image[::-1].copy(), self.image[:4]]
+        results = easyocr_readtext_batch(reader)(images)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(reader.recognized), 3)
+        for image, grey in zip(images, reader.recognized):
+            np.testing.assert_array_equal(grey, self.bytes_path_grey(image))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import threading
+import time
+from model_registry import ModelRegistry, SharedModel
+
+class FakeReader:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    def readtext(self, image):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        self.active -= 1
+        return image
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = ModelRegistry()
+        self.loads = 0
+
+    def loader(self):
+        self.loads += 1
+        time.sleep(0.05)
+        return FakeReader()
+
+    def test_model_is_loaded_once(self):
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(self.registry.get('easyocr', ['en'], self.loader))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(all(model is models[0] for model in models))
+        self.assertIsInstance(models[0], SharedModel)
+
+    def test_models_are_keyed_by_languages(self):
+        en = self.registry.get('easyocr', ['en'], self.loader)
+        ja = self.registry.get('easyocr', ['en', 'ja'], self.loader)
+        self.assertIsNot(en, ja)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual([m['languages'] for m in self.registry.loaded_models()], [['en'], ['en', 'ja']])
+
+    def test_shared_model_serializes_calls(self):
+        model = self.registry.get('easyocr', ['en'], self.loader)
+        threads = [threading.Thread(target=model.readtext, args=(i,)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(model.model.max_active, 1)
+        self.assertEqual(model.readtext('image'), 'image')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import asyncio
+import threading
+from server.msq import MessageQueue
+
+class FakeDataChannel:
+    def __init__(self):
+        self.readyState = "open"
+        self.bufferedAmount = 0
+        self.bufferedAmountLowThreshold = 0
+        self.sent = []
+        self.handlers = {}
+
+    def on(self, event):
+        def register(handler):
+            self.handlers[event] = handler
+            return handler
+        return register
+
+    def send(self, message):
+        self.sent.append(message)
+
+class TestMessageQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_messages_in_order(self):
+        message_queue = MessageQueue()
+        message_queue.send_message("selectedLineID 1")
+        message_queue.send_message("selectedLineID 2")
+        self.assertEqual(await message_queue.receive_message(), "selectedLineID 1")
+        self.assertEqual(await message_queue.receive_message(), "selectedLineID 2")
+
+    async def test_send_from_another_thread(self):
+        message_queue = MessageQueue()
+        thread = threading.Thread(target=message_queue.send_message, args=("selectedLineID 3",))
+        thread.start()
+        thread.join()
+        self.assertEqual(await asyncio.wait_for(message_queue.receive_message(), 1), "selectedLineID 3")
+
+    async def test_annotations_coalesce(self):
+        message_queue = MessageQueue()
+        message_queue.send_message("annotations 1")
+        message_queue.send_message("selectedLineID 5")
+        message_queue.send_message("annotations 2")
+        await asyncio.sleep(0)
+        self.assertEqual(await message_queue.receive_message(), "annotations 2")
+        self.assertEqual(await message_queue.receive_message(), "selectedLineID 5")
+        self.assertEqual(message_queue.stats()["coalesced"], 1)
+
+    async def test_drops_oldest_when_full(self):
+        message_queue = MessageQueue(maxsize=2)
+        for i in range(4):
+            message_queue.send_message(f"selectedLineID {i}")
+        await asyncio.sleep(0)
+        self.assertEqual(await message_queue.receive_message(), "selectedLineID 2")
+        self.assertEqual(message_queue.stats()["dropped"], 2)
+
+    async def test_pump(self):
+        message_queue = MessageQueue()
+        channel = FakeDataChannel()
+        pump = asyncio.ensure_future(message_queue.pump(channel))
+        message_queue.send_message("selectedLineID 1")
+        message_queue.send_message("annotations {}")
+        await asyncio.sleep(0.01)
+        self.assertEqual(channel.sent, ["selectedLineID 1", "annotations {}"])
+
+        # backpressure, nothing is sent until the buffer drains
+        channel.bufferedAmount = 2 << 20
+        message_queue.send_message("selectedLineID 2")
+        message_queue.send_message("selectedLineID 3")
+        await asyncio.sleep(0.01)
+        self.assertEqual(len(channel.sent), 3)
+        channel.bufferedAmount = 0
+        channel.handlers["bufferedamountlow"]()
+        await asyncio.sleep(0.01)
+        self.assertEqual(channel.sent[-1], "selectedLineID 3")
+
+        channel.readyState = "closed"
+        channel.handlers["close"]()
+        await asyncio.sleep(0)
+        self.assertTrue(pump.cancelled())
+
+if __name__ == '__main__':
+    unittest.main()
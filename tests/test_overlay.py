@@ -0,0 +1,102 @@
+import unittest
+import numpy as np
+import cv2
+from PIL import Image, ImageDraw
+from overlay import Overlay, OverlayCache, TextLayoutCache, annotations_key, blur_regions, blur_regions_array
+
+def random_image(rng, size=(640, 360)):
+    return Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8))
+
+class TestOverlay(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.image = random_image(self.rng)
+        self.boxes = [(50, 250, 200, 300), (220, 255, 400, 300), (0, 0, 40, 20)]
+
+    def expected_blur(self, boxes):
+        mask = Image.new("L", self.image.size, 0)
+        draw = ImageDraw.Draw(mask)
+        for box in boxes:
+            draw.rectangle(box, fill=255)
+        frame_data = np.asarray(self.image)
+        return np.where(np.asarray(mask)[..., None] > 0, cv2.GaussianBlur(frame_data, (0, 0), 10), frame_data)
+
+    def test_blur_regions_matches_full_blur(self):
+        result = blur_regions(self.image, self.boxes, radius=10)
+        self.assertTrue(np.array_equal(np.asarray(result), self.expected_blur(self.boxes)))
+        self.assertIsNot(result, self.image)
+
+    def test_blur_regions_array_matches_full_blur(self):
+        # overlapping boxes and a box sticking out of the frame
+        boxes = self.boxes + [(150, 280, 260, 340), (600, 340, 700, 400)]
+        frame_data = np.array(self.image)
+        self.assertIs(blur_regions_array(frame_data, boxes, radius=10), frame_data)
+        self.assertTrue(np.array_equal(frame_data, self.expected_blur(boxes)))
+
+    def test_blur_regions_outside_frame(self):
+        self.assertIs(blur_regions(self.image, [(700, 400, 800, 500)]), self.image)
+
+    def test_apply_matches_direct_drawing(self):
+        def draw_annotations(draw):
+            draw.rectangle([(50, 250), (200, 300)], outline="red", width=2)
+            draw.text((50, 240), "text", fill="yellow")
+
+        expected = self.image.copy()
+        draw_annotations(ImageDraw.Draw(expected))
+
+        layer = Image.new("RGBA", self.image.size, (0, 0, 0, 0))
+        draw_annotations(ImageDraw.Draw(layer))
+        overlay = Overlay(layer, {})
+        self.assertLess(overlay.layer.size[0] * overlay.layer.size[1], self.image.size[0] * self.image.size[1] // 4)
+
+        result = overlay.apply(self.image.copy())
+        self.assertTrue(np.array_equal(np.asarray(result), np.asarray(expected)))
+
+    def test_apply_array_matches_apply(self):
+        layer = Image.new("RGBA", self.image.size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+        draw.rectangle([(50, 250), (200, 300)], outline="red", width=2)
+        draw.rectangle([(60, 260), (190, 290)], fill=(0, 0, 255, 100))
+        draw.text((50, 240), "text", fill="yellow")
+        overlay = Overlay(layer, {})
+
+        expected = np.asarray(overlay.apply(self.image.copy()), dtype=np.int16)
+        frame_data = np.array(self.image)
+        self.assertIs(overlay.apply_array(frame_data), frame_data)
+        # PIL rounds the blend slightly differently
+        self.assertLessEqual(np.abs(frame_data.astype(np.int16) - expected).max(), 1)
+
+    def test_empty_overlay(self):
+        overlay = Overlay(Image.new("RGBA", self.image.size, (0, 0, 0, 0)), {})
+        self.assertIs(overlay.apply(self.image), self.image)
+        frame_data = np.array(self.image)
+        self.assertIs(overlay.apply_array(frame_data), frame_data)
+
+    def test_cache_renders_once_per_key(self):
+        cache = OverlayCache()
+        annotations = [([(50, 250), (200, 300)], 'text')]
+        render = lambda: Overlay(Image.new("RGBA", (10, 10)), {})
+        first = cache.get((annotations_key(annotations), self.image.size), render)
+        second = cache.get((annotations_key([([(50, 250), (200, 300)], 'text')]), self.image.size), render)
+        self.assertIs(first, second)
+        cache.get((annotations_key(annotations), (1280, 720)), render)
+        self.assertEqual(cache.stats(), {"renders": 2, "hits": 1})
+
+class TestTextLayoutCache(unittest.TestCase):
+    def test_lru(self):
+        cache = TextLayoutCache(max_entries=2)
+        calls = []
+        def layout(text):
+            calls.append(text)
+            return {"text": text}
+        cache.get(('a', 100), lambda: layout('a'))
+        cache.get(('b', 100), lambda: layout('b'))
+        self.assertEqual(cache.get(('a', 100), lambda: layout('a')), {"text": 'a'})
+        cache.get(('c', 100), lambda: layout('c'))
+        # 'b' was least recently used
+        cache.get(('b', 100), lambda: layout('b'))
+        self.assertEqual(calls, ['a', 'b', 'c', 'b'])
+        self.assertEqual(cache.stats(), {"entries": 2, "hits": 1, "misses": 4})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import os
+import tempfile
+import threading
+from pathlib import Path
+from prefetch import AudioCache, LinePrefetcher, audio_path
+from script_translations import ScriptTranslations
+from translation_memo import TranslationMemo
+
+class FakeOpenAI_API:
+    translation_model = "gpt-4o"
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def call_translation_api(self, content, target_lang):
+        self.release.wait()
+        self.calls.append((content, target_lang))
+        return {'choices': [{'message': {'content': f"```{target_lang}:{content}```"}}]}
+
+class FakeFrameProcessor:
+    def __init__(self, dialogues):
+        self.lang = 'jp'
+        self.dialogues = dialogues
+        self.script_translations = ScriptTranslations(dialogues, 'jp')
+        self.translation_memo = TranslationMemo()
+        self.openai_api = FakeOpenAI_API()
+
+class TestAudioCache(unittest.TestCase):
+    def test_lru(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [Path(tmp_dir) / f"{i}.mp3" for i in range(3)]
+            for i, path in enumerate(paths):
+                path.write_bytes(bytes([i]) * 10)
+            audio_cache = AudioCache(max_entries=2)
+            self.assertEqual(audio_cache.get(paths[0]), bytes([0]) * 10)
+            self.assertEqual(audio_cache.get(str(paths[0])), bytes([0]) * 10)
+            audio_cache.prefetch(paths[1])
+            audio_cache.prefetch(paths[2])
+            self.assertNotIn(paths[0], audio_cache)
+            self.assertIn(paths[2], audio_cache)
+            self.assertEqual(audio_cache.stats(), {"entries": 2, "hits": 1, "misses": 1})
+
+class TestLinePrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        dialogues = {
+            0: {'name': '兵士', 'dialogue': 'セシル隊長！', 'english': 'Captain Cecil!'},
+            1: {'name': '兵士', 'dialogue': 'まもなくバロンに着きます！', 'english': 'We will arrive at Baron shortly.'},
+            2: {'name': 'セシル', 'dialogue': 'そうか'},
+            3: {'name': 'セシル', 'dialogue': 'ああ'},
+        }
+        for number in dialogues:
+            path = audio_path('jp', number)
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(b"mp3 %d" % number)
+        self.frameProcessor = FakeFrameProcessor(dialogues)
+        self.audio_cache = AudioCache()
+        self.prefetcher = LinePrefetcher(self.frameProcessor, self.audio_cache, lookahead=2, openai_api=self.frameProcessor.openai_api)
+
+    def tearDown(self):
+        self.prefetcher.audio_executor.shutdown()
+        self.prefetcher.translation_executor.shutdown()
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def wait(self):
+        self.prefetcher.audio_executor.submit(lambda: None).result()
+        self.prefetcher.translation_executor.submit(lambda: None).result()
+
+    def test_next_lines(self):
+        self.assertEqual(self.prefetcher.next_lines([0]), [1, 2])
+        self.assertEqual(self.prefetcher.next_lines([1, 2]), [3])
+        self.assertEqual(self.prefetcher.next_lines([3]), [])
+
+    def test_prefetch(self):
+        self.prefetcher.on_match([0], "jp,en")
+        self.wait()
+        self.assertIn(audio_path('jp', 1), self.audio_cache)
+        self.assertIn(audio_path('jp', 2), self.audio_cache)
+        self.assertNotIn(audio_path('jp', 0), self.audio_cache)
+        # line 1 has a script translation, only line 2 needed the API
+        self.assertEqual(self.frameProcessor.openai_api.calls, [('セシル : そうか', 'en')])
+        memo_key = TranslationMemo.text_key('セシル : そうか', 'en', 'gpt-4o')
+        self.assertEqual(self.frameProcessor.translation_memo.get(memo_key), 'en:セシル : そうか')
+
+        # matching the same lines again doesn't fetch anything again
+        self.prefetcher.on_match([0], "jp,en")
+        self.wait()
+        self.assertEqual(len(self.frameProcessor.openai_api.calls), 1)
+        self.assertEqual(self.prefetcher.stats()["prefetched_audio"], 2)
+
+    def test_pending_not_resubmitted(self):
+        openai_api = self.frameProcessor.openai_api
+        openai_api.release.clear()
+        self.prefetcher.on_match([1], "jp,en")
+        self.prefetcher.on_match([1], "jp,en")
+        openai_api.release.set()
+        self.wait()
+        self.assertEqual(openai_api.calls, [('セシル : そうか', 'en'), ('セシル : ああ', 'en')])
+
+    def test_audio_only(self):
+        self.prefetcher.on_match([2])
+        self.wait()
+        self.assertIn(audio_path('jp', 3), self.audio_cache)
+        self.assertEqual(self.frameProcessor.openai_api.calls, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import json
+import tempfile
+from pathlib import Path
+from script_translations import ScriptTranslations, precompute, translations_path
+
+class TestScriptTranslations(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dialog_file_path = Path(self.tmp_dir.name) / 'dialogues_jp_v2.json'
+        self.lines = [
+            {'name': '兵士', 'dialogue': 'セシル隊長！', 'english': 'Captain Cecil!'},
+            {'name': '兵士', 'dialogue': 'まもなくバロンに着きます！', 'english': 'We will arrive at Baron shortly.'},
+            {'name': 'セシル', 'dialogue': 'そうか'},
+        ]
+        with open(self.dialog_file_path, 'w', encoding='utf8') as f:
+            json.dump(self.lines, f, ensure_ascii=False)
+        self.dialogues = {index: item for index, item in enumerate(self.lines)}
+        self.batches = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def translate_batch(self, lines, target_lang):
+        self.batches.append((lines, target_lang))
+        return [f"{target_lang}:{line}" for line in lines]
+
+    def test_translation_fields(self):
+        script_translations = ScriptTranslations.load(self.dialog_file_path, self.dialogues, 'jp')
+        self.assertEqual(script_translations.translate_entries([0, 1], 'en'), 'Captain Cecil! We will arrive at Baron shortly.')
+        self.assertEqual(script_translations.translate_entries([0], 'jp'), 'セシル隊長！')
+        # a line without a translation means the whole match goes to the API
+        self.assertIsNone(script_translations.translate_entries([1, 2], 'en'))
+        self.assertEqual(script_translations.stats(), {"hits": 2, "misses": 1})
+
+    def test_precompute(self):
+        translated = precompute(self.dialog_file_path, 'jp', ['en'], self.translate_batch, batch_size=2)
+        self.assertEqual(translated, {'en': 1})
+        # only the line without an english field was sent
+        self.assertEqual(self.batches, [(['そうか'], 'en')])
+        self.assertTrue(translations_path(self.dialog_file_path).exists())
+
+        script_translations = ScriptTranslations.load(self.dialog_file_path, self.dialogues, 'jp')
+        self.assertEqual(script_translations.translate_entries([1, 2], 'en'), 'We will arrive at Baron shortly. en:そうか')
+
+        # nothing left to translate the second time
+        self.assertEqual(precompute(self.dialog_file_path, 'jp', ['en'], self.translate_batch), {'en': 0})
+        self.assertEqual(len(self.batches), 1)
+
+    def test_batches(self):
+        precompute(self.dialog_file_path, 'jp', ['fr'], self.translate_batch, batch_size=2)
+        self.assertEqual([lines for lines, _ in self.batches], [['セシル隊長！', 'まもなくバロンに着きます！'], ['そうか']])
+
+    def test_changed_script_line_ignored(self):
+        precompute(self.dialog_file_path, 'jp', ['en'], self.translate_batch)
+        self.dialogues[2] = {'name': 'セシル', 'dialogue': 'そうだな'}
+        script_translations = ScriptTranslations.load(self.dialog_file_path, self.dialogues, 'jp')
+        self.assertIsNone(script_translations.get(2, 'en'))
+
+    def test_failed_batch_skipped(self):
+        def translate_batch(lines, target_lang):
+            raise ValueError("Expected 1 translations")
+        self.assertEqual(precompute(self.dialog_file_path, 'jp', ['en'], translate_batch), {'en': 0})
+
+if __name__ == '__main__':
+    unittest.main()
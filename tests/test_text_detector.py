@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+import pytest
+
+# text_detector imports tensorflow at module level
+pytest.importorskip("tensorflow")
+from text_detector import TextDetector
+
+def decode_predictions_loop(scores, geometry, min_confidence):
+    # reference implementation, the per cell loop decode_predictions used to run
+    (numRows, numCols) = scores.shape[1:3]
+    rects = []
+    confidences = []
+    for y in range(numRows):
+        scoresData = scores[0, y]
+        for x in range(numCols):
+            if scoresData[x] < min_confidence:
+                continue
+            xData0 = geometry[0, y, x, 0]
+            xData1 = geometry[0, y, x, 1]
+            xData2 = geometry[0, y, x, 2]
+            xData3 = geometry[0, y, x, 3]
+            (offsetX, offsetY) = (x * 4.0, y * 4.0)
+            angle = geometry[0, y, x, 4]
+            cos = np.cos(angle)
+            sin = np.sin(angle)
+            h = xData0 + xData2
+            w = xData1 + xData3
+            endX = int(offsetX + (cos * xData1) + (sin * xData2))
+            endY = int(offsetY - (sin * xData1) + (cos * xData2))
+            startX = int(endX - w)
+            startY = int(endY - h)
+            rects.append((startX, startY, endX, endY))
+            confidences.append(scoresData[x])
+    return rects, confidences
+
+def random_maps(rng, rows=20, cols=24):
+    scores = rng.random((1, rows, cols, 1), dtype=np.float32)
+    geometry = np.concatenate([rng.random((1, rows, cols, 4), dtype=np.float32) * 60,
+                               (rng.random((1, rows, cols, 1), dtype=np.float32) - 0.5) * np.float32(np.pi)], axis=3)
+    return scores, geometry
+
+class TestDecodePredictions(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def assert_matches_loop(self, scores, geometry, min_confidence):
+        rects, confidences = TextDetector.decode_predictions(scores, geometry, min_confidence)
+        expected_rects, expected_confidences = decode_predictions_loop(scores, geometry, min_confidence)
+        self.assertEqual(rects, expected_rects)
+        self.assertTrue(np.array_equal(np.ravel(confidences), np.ravel(expected_confidences)))
+
+    def test_matches_loop(self):
+        for min_confidence in (0.1, 0.5, 0.9):
+            self.assert_matches_loop(*random_maps(self.rng), min_confidence)
+
+    def test_empty(self):
+        scores, geometry = random_maps(self.rng)
+        rects, confidences = TextDetector.decode_predictions(scores * 0, geometry, 0.5)
+        self.assertEqual(rects, [])
+        self.assertEqual(len(confidences), 0)
+
+    def test_min_confidence_boundary(self):
+        scores = np.zeros((1, 2, 2, 1), dtype=np.float32)
+        scores[0, 0, 1] = 0.5
+        scores[0, 1, 0] = np.nextafter(np.float32(0.5), np.float32(0))
+        geometry = np.ones((1, 2, 2, 5), dtype=np.float32)
+        rects, _ = TextDetector.decode_predictions(scores, geometry, 0.5)
+        # only the cell scoring exactly min_confidence is kept
+        self.assertEqual(len(rects), 1)
+        self.assert_matches_loop(scores, geometry, 0.5)
+
+    def test_angle_and_offset(self):
+        scores = np.zeros((1, 3, 4, 1), dtype=np.float32)
+        scores[0, 2, 3] = 1
+        geometry = np.zeros((1, 3, 4, 5), dtype=np.float32)
+        # distances to the top, right, bottom and left edges, rotated by 90 degrees
+        geometry[0, 2, 3] = (10, 20, 30, 40, np.pi / 2)
+        rects, _ = TextDetector.decode_predictions(scores, geometry, 0.5)
+        # offset (12, 8), endX = 12 + sin * 30, endY = 8 - sin * 20
+        self.assertEqual(rects, [(-18, -52, 42, -12)])
+        self.assert_matches_loop(scores, geometry, 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import multiprocessing
+import os
+import tempfile
+from pathlib import Path
+from cache_store import AppendOnlyStore
+from translation_memo import TranslationMemo, get_translation_memo, normalize_source_text, process_log_path
+
+def put_in_worker(path):
+    memo = get_translation_memo(path)
+    memo.put(TranslationMemo.text_key("はい", "en", "gpt-4o"), "Yes")
+    memo.store.close()
+
+class TestTranslationMemo(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / 'translation_memo.log'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_normalize_source_text(self):
+        self.assertEqual(normalize_source_text("  Crew :\n Do we\treally  "), "Crew : Do we really")
+        # full-width forms from the OCR fold into their plain forms
+        self.assertEqual(normalize_source_text("ＡＢＣ　１２３"), "ABC 123")
+        self.assertEqual(normalize_source_text("ｶﾞ"), "ガ")
+
+    def test_text_key_ignores_whitespace(self):
+        memo = TranslationMemo()
+        memo.put(TranslationMemo.text_key("Crew : Do we really?", "jp", "gpt-4o"), "本当に？")
+        self.assertEqual(memo.get(TranslationMemo.text_key(" Crew :  Do we\nreally? ", "jp", "gpt-4o")), "本当に？")
+        # other target languages and models don't share translations
+        self.assertIsNone(memo.get(TranslationMemo.text_key("Crew : Do we really?", "en", "gpt-4o")))
+        self.assertIsNone(memo.get(TranslationMemo.text_key("Crew : Do we really?", "jp", "gpt-4o-mini")))
+        self.assertEqual(memo.stats()["hits"], 1)
+        self.assertEqual(memo.stats()["misses"], 2)
+
+    def test_image_key(self):
+        memo = TranslationMemo()
+        memo.put(TranslationMemo.image_key(b"jpeg bytes", "en", "gpt-4o"), "Hello")
+        self.assertEqual(memo.get(TranslationMemo.image_key(b"jpeg bytes", "en", "gpt-4o")), "Hello")
+        self.assertIsNone(memo.get(TranslationMemo.image_key(b"other bytes", "en", "gpt-4o")))
+
+    def test_empty_translation_not_kept(self):
+        memo = TranslationMemo()
+        memo.put(TranslationMemo.text_key("...", "en", "gpt-4o"), "")
+        self.assertEqual(len(memo), 0)
+
+    def test_lru_eviction(self):
+        memo = TranslationMemo(max_entries=2)
+        keys = [TranslationMemo.text_key(str(i), "en", "gpt-4o") for i in range(3)]
+        memo.put(keys[0], "zero")
+        memo.put(keys[1], "one")
+        memo.get(keys[0])
+        memo.put(keys[2], "two")
+        self.assertEqual(memo.get(keys[0]), "zero")
+        self.assertIsNone(memo.get(keys[1]))
+
+    def test_persisted(self):
+        store = AppendOnlyStore(self.path)
+        memo = TranslationMemo(store)
+        key = TranslationMemo.text_key("おはよう", "en", "gpt-4o")
+        memo.put(key, "Good morning")
+        memo.put(key, "Good morning!")
+        store.close()
+
+        memo = TranslationMemo(AppendOnlyStore(self.path))
+        self.assertEqual(memo.get(key), "Good morning!")
+        self.assertEqual(len(memo), 1)
+    def test_worker_process_log(self):
+        self.assertEqual(process_log_path('translation_memo.log'), 'translation_memo.log')
+        path = os.path.join(self.tmp_dir.name, 'translation_memo.log')
+        context = multiprocessing.get_context('spawn')
+        process = context.Process(target=put_in_worker, args=(path,), name='frame-worker-0')
+        process.start()
+        process.join(60)
+        self.assertEqual(process.exitcode, 0)
+        # the worker wrote its own log, the server process's log has a single writer
+        self.assertFalse(os.path.exists(path))
+        memo = TranslationMemo(AppendOnlyStore(os.path.join(self.tmp_dir.name, 'translation_memo.frame-worker-0.log')))
+        self.assertEqual(memo.get(TranslationMemo.text_key("はい", "en", "gpt-4o")), "Yes")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import threading
+import time
+import numpy as np
+from frame_ring import FrameRingBuffer
+from worker_pool import WorkerPool, WorkerSession
+
+
+class FakeVideoStream:
+    def __init__(self):
+        self.frame_lock = threading.Lock()
+        self.annotations_version = 0
+        self.current_annotations = None
+        self.current_translations = None
+        self.frame_ring = None
+        self.threads = []
+
+    def attach_frame_ring(self, frame_ring):
+        self.frame_ring = frame_ring
+        if frame_ring is not None:
+            thread = threading.Thread(target=self.process, args=(frame_ring,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def process(self, frame_ring):
+        # annotate every frame with its shape and mean color, so the test can check what the worker read
+        seq = 0
+        while self.frame_ring is frame_ring:
+            new_seq, frame_data = frame_ring.read(after=seq)
+            if new_seq is None:
+                time.sleep(0.005)
+                continue
+            seq = new_seq
+            with self.frame_lock:
+                self.current_annotations = [[list(frame_data.shape), float(frame_data.mean())]]
+                self.current_translations = ""
+                self.annotations_version += 1
+
+
+class FakePipeline:
+    def __init__(self, lang="jp"):
+        self.video_stream = FakeVideoStream()
+        self.closest_match = [lang]
+
+    def close(self):
+        # like UserVideo.close, detach the ring and wait for the processing to return
+        self.video_stream.attach_frame_ring(None)
+        for thread in self.video_stream.threads:
+            thread.join()
+
+def create_fake_pipeline(**kwargs):
+    return FakePipeline(**kwargs)
+
+
+class FakeSession:
+    def __init__(self):
+        self.messages = []
+        self.received = threading.Condition()
+
+    def handle_message(self, message):
+        with self.received:
+            self.messages.append(message)
+            self.received.notify_all()
+
+    def wait_for(self, predicate, timeout=30):
+        with self.received:
+            self.received.wait_for(lambda: any(predicate(message) for message in self.messages), timeout=timeout)
+        return [message for message in self.messages if predicate(message)]
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(2, session_factory=create_fake_pipeline, publish_interval=0.01)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_sessions_balanced(self):
+        sessions = [self.pool.open_session(FakeSession(), lang="jp") for _ in range(4)]
+        self.assertEqual([worker["sessions"] for worker in self.pool.workers], [2, 2])
+        for session_id, worker in sessions:
+            self.pool.close_session(session_id, worker)
+        self.assertEqual([worker["sessions"] for worker in self.pool.workers], [0, 0])
+
+    def test_frame_round_trip(self):
+        session = FakeSession()
+        session_id, worker = self.pool.open_session(session, lang="en")
+        self.assertEqual(session.wait_for(lambda message: message[0] == 'closest_match'), [('closest_match', session_id, ["en"])])
+
+        frame_ring = FrameRingBuffer(max_shape=(20, 30, 3), shared=True)
+        try:
+            self.pool.attach_frame_ring(session_id, worker, frame_ring.name, frame_ring.capacity, frame_ring.max_shape)
+            frame_ring.write(np.full((20, 30, 3), 100, dtype=np.uint8))
+            annotations = session.wait_for(lambda message: message[0] == 'annotations' and message[2] is not None)
+            self.assertEqual(annotations[0], ('annotations', session_id, [[[20, 30, 3], 100.0]], ""))
+        finally:
+            self.pool.close_session(session_id, worker)
+            frame_ring.close()
+
+
+class TestWorkerSession(unittest.TestCase):
+    def test_close_stops_threads(self):
+        baseline = threading.active_count()
+        for _ in range(3):
+            session = WorkerSession(0, FakePipeline())
+            frame_ring = FrameRingBuffer(max_shape=(20, 30, 3), shared=True)
+            try:
+                session.attach_frame_ring(frame_ring.name, frame_ring.capacity, frame_ring.max_shape)
+                frame_ring.write(np.zeros((20, 30, 3), dtype=np.uint8))
+                self.assertGreater(threading.active_count(), baseline)
+                session.close()
+            finally:
+                frame_ring.close()
+            self.assertIsNone(session.pipeline)
+            self.assertEqual(threading.active_count(), baseline)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -52,35 +52,33 @@ class TextDetector:
 
     @staticmethod
     def decode_predictions(scores, geometry, min_confidence):
+        """
+        Decode the EAST score and geometry maps of the first image into boxes.
+
+        :param scores: (1, rows, cols, 1) score map
+        :param geometry: (1, rows, cols, 5) geometry map
+        :param min_confidence: Cells scoring below this are ignored
+        :return: tuple of (list of (startX, startY, endX, endY), (N,) array of confidences)
+        """
         (numRows, numCols) = scores.shape[1:3]
-        rects = []
-        confidences = []
-
-        for y in range(numRows):
-            scoresData = scores[0, y]
-            for x in range(numCols):
-                if scoresData[x] < min_confidence:
-                    continue
-
-                xData0 = geometry[0, y, x, 0]
-                xData1 = geometry[0, y, x, 1]
-                xData2 = geometry[0, y, x, 2]
-                xData3 = geometry[0, y, x, 3]
-
-                (offsetX, offsetY) = (x * 4.0, y * 4.0)
-                angle = geometry[0, y, x, 4]
-                cos = np.cos(angle)
-                sin = np.sin(angle)
-                h = xData0 + xData2
-                w = xData1 + xData3
-                endX = int(offsetX + (cos * xData1) + (sin * xData2))
-                endY = int(offsetY - (sin * xData1) + (cos * xData2))
-                startX = int(endX - w)
-                startY = int(endY - h)
-
-                rects.append((startX, startY, endX, endY))
-                confidences.append(scoresData[x])
-
+        scoresData = scores[0].reshape(numRows, numCols)
+        ys, xs = np.nonzero(scoresData >= min_confidence)
+        cells = geometry[0, ys, xs]
+
+        offsetX, offsetY = (xs * 4.0).astype(cells.dtype), (ys * 4.0).astype(cells.dtype)
+        angle = cells[:, 4]
+        cos = np.cos(angle)
+        sin = np.sin(angle)
+        h = cells[:, 0] + cells[:, 2]
+        w = cells[:, 1] + cells[:, 3]
+        # truncate towards zero like int() on every coordinate
+        endX = np.trunc(offsetX + (cos * cells[:, 1]) + (sin * cells[:, 2]))
+        endY = np.trunc(offsetY - (sin * cells[:, 1]) + (cos * cells[:, 2]))
+        startX = np.trunc(endX - w)
+        startY = np.trunc(endY - h)
+
+        rects = list(zip(startX.astype(int).tolist(), startY.astype(int).tolist(), endX.astype(int).tolist(), endY.astype(int).tolist()))
+        confidences = scoresData[ys, xs]
         return rects, confidences
 
     @staticmethod
@@ -133,10 +131,9 @@ class TextDetector:
         scores, geometry = self.sess.run([self.scores_tensor, self.geometry_tensor], feed_dict={self.image_tensor: blob})
         
         rects, confidences = self.decode_predictions(scores, geometry, self.min_confidence)
-        if confidences == []:
+        if len(confidences) == 0:
             return []
-        flattened_confidences = np.concatenate(confidences).ravel()
-        boxes = self.non_max_suppression(rects, flattened_confidences)
+        boxes = self.non_max_suppression(rects, confidences)
 
         results = []
         for startX, startY, endX, endY in boxes:
@@ -177,13 +174,10 @@ class TextDetector:
     def has_text(self, image):
         
         blob = np.expand_dims(image, axis=0)
-        scores, geometry = self.sess.run([self.scores_tensor, self.geometry_tensor], feed_dict={self.image_tensor: blob})
-        
-        rects, confidences = self.decode_predictions(scores, geometry, self.min_confidence)
-        # Check if there are any confidences above the min_confidence threshold
-        if len(confidences) > 0:
-            return True
-        return False
+        scores = self.sess.run(self.scores_tensor, feed_dict={self.image_tensor: blob})
+
+        # no need to decode any boxes, only check if any cell is above the min_confidence threshold
+        return bool(scores.max() >= self.min_confidence)
 
     def close_session(self):
         self.sess.close()
@@ -0,0 +1,132 @@
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from cache_store import AppendOnlyStore
+
+
+def normalize_source_text(text):
+    """
+    Normalize OCR / script text so the same line always gives the same key: NFKC folds
+    full-width and half-width forms, whitespace runs become single spaces.
+    """
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+class TranslationMemo:
+    """
+    Exact-match translation memo keyed by what was translated rather than by the screen
+    image, so the same line over a different background, palette or window size reuses the
+    paid translation. It is consulted before every translation API call.
+
+    Keys are ('text', normalized source text, target language, model) or, for translations
+    straight from the dialogue box image, ('image', hash of the image bytes, target language, model).
+    Entries are kept in LRU order and persisted as records in an AppendOnlyStore.
+    """
+
+    def __init__(self, store=None, max_entries=50000):
+        """
+        :param store: AppendOnlyStore the memo is loaded from and appended to, None keeps it in memory
+        :param max_entries: Maximum number of translations kept, the least recently used one is dropped first
+        """
+        self.store = store
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if store is not None:
+            for record in store.load():
+                self.entries[record['key']] = record['translation']
+                self.entries.move_to_end(record['key'])
+            self._evict()
+
+    @staticmethod
+    def text_key(text, target_lang, model):
+        return ('text', normalize_source_text(text), target_lang, model)
+
+    @staticmethod
+    def image_key(image_bytes, target_lang, model):
+        return ('image', hashlib.blake2b(image_bytes, digest_size=16).hexdigest(), target_lang, model)
+
+    def get(self, key):
+        """
+        :return: The memoized translation, None on a miss
+        """
+        with self.lock:
+            translation = self.entries.get(key)
+            if translation is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return translation
+
+    def put(self, key, translation):
+        """
+        Memoize a translation, empty translations aren't kept so a failed call gets retried next time.
+        """
+        if not translation:
+            return
+        with self.lock:
+            if self.entries.get(key) == translation:
+                return
+            self.entries[key] = translation
+            self.entries.move_to_end(key)
+            self._evict()
+            if self.store is not None:
+                self.store.append({'key' : key, 'translation' : translation})
+                # drop overwritten and evicted records once the log holds more than twice the live entries
+                if self.store.record_count > 2 * len(self.entries) + 100:
+                    self.store.compact([{'key' : k, 'translation' : t} for k, t in self.entries.items()])
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_memos = {}
+_memos_lock = threading.Lock()
+
+def process_log_path(path):
+    """
+    Path of the current process's log: worker processes (see WorkerPool) each get their own,
+    suffixed with the process name, eg. translation_memo.frame-worker-0.log.
+    """
+    name = multiprocessing.current_process().name
+    if name == 'MainProcess':
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+
+def get_translation_memo(path):
+    """
+    Return the process-wide memo persisted at path, every FrameProcessor of the process shares it.
+    Worker processes write their own log, see process_log_path, so every log has a single writer.
+    """
+    path = process_log_path(path)
+    with _memos_lock:
+        if path not in _memos:
+            _memos[path] = TranslationMemo(AppendOnlyStore(path))
+        return _memos[path]
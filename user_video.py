@@ -1,7 +1,9 @@
 import io
-import time
+import logging
+import numpy as np
 from process_frames import FrameProcessor
 from video_stream_with_annotations import VideoStreamWithAnnotations
+from frame_ring import FrameRingBuffer
 from PIL import Image
 from ocr_enum import OCREngine
 import sentry_sdk
@@ -10,13 +12,13 @@ dummy_image = Image.new('RGB', (100, 100), (255, 255, 255))
 
 #This handles per user video processing
 class UserVideo:
-    def __init__(self, lang="jp", disable_dialog=False, disable_translation=False, enable_cache=False, translate="", textDetector=None, debug_bbox=False, crop_height=None):
+    def __init__(self, lang="jp", disable_dialog=False, disable_translation=False, enable_cache=False, translate="", textDetector=None, debug_bbox=False, crop_height=None, batch_inference=False):
         self.last_inboard_frame = None
         self.last_frame_count = 0
         self.crop_height = crop_height
         self.closest_match = [] #this can be a list of items
 
-        self.frameProcessor = FrameProcessor(lang, disable_dialog, method=OCREngine.OCR_TRANSLATE)
+        self.frameProcessor = FrameProcessor(lang, disable_dialog, method=OCREngine.OCR_TRANSLATE, batch_inference=batch_inference)
 
         self.video_stream = VideoStreamWithAnnotations(background_task=self.process_video_thread, background_task_args={"translate" : translate, 'enable_cache' : enable_cache},
                                                     show_fps=True, crop_y_coordinate=crop_height, frameProcessor=self.frameProcessor, textDetector=textDetector, debug_bbox=debug_bbox) #TODO crop should be set later by user
@@ -24,27 +26,51 @@ class UserVideo:
 
 
     def process_video_thread(self, translate="", enable_cache=False):
-        time.sleep(1)  # Wait for 1 second, threading ordering issue, this is not the correct way to fix it
-        while True:
+        stopped = self.video_stream.stopped
+        stopped.wait(1)  # Wait for 1 second, threading ordering issue, this is not the correct way to fix it
+        while not stopped.is_set():
             frame = self.video_stream.get_latest_frame()
             if frame is not None:
                 with sentry_sdk.start_transaction(op="task", name="Background_process_frame"):
                     #print("Background task accessing the latest frame...")
-                    closest_match = self.video_stream.process_screenshot(frame, translate=translate, show_image_screen=True, enable_cache=enable_cache) # crop is hard coded make it per user
+                    try:
+                        closest_match = self.video_stream.process_screenshot(frame, translate=translate, show_image_screen=True, enable_cache=enable_cache) # crop is hard coded make it per user
+                    except Exception as e:
+                        # keep this user's stream processed, a failed frame only loses its annotations
+                        logging.exception(f"Processing frame failed: {e}")
+                        sentry_sdk.capture_exception(e)
+                        closest_match = None
                     if closest_match != None and closest_match != 0:
                         print("Closest match(uservideo): ", closest_match)
                         self.closest_match = closest_match 
-                    time.sleep(1/24)  # Wait for 1 second
+                    stopped.wait(1/24)  # Wait for 1 second
+        # released here rather than in close(), a frame in flight may still be using it
+        self.frameProcessor.close()
 
     def preprocess_frame(self, frame):
         return self.video_stream.preprocess_image(frame, crop_y_coordinate= self.crop_height) #preprocess all images
 
+    def preprocess_frame_array(self, frame_data):
+        """Crop an RGB frame array, the crop is a view so no pixels are copied."""
+        if self.crop_height is not None:
+            return frame_data[self.crop_height:]
+        return frame_data
+
     def async_process_frame(self, frame):
+        """
+        :param frame: PIL Image, RGB NumPy array or av.VideoFrame, arrays are copied into the video stream's frame ring
+        """
         #TODO put the frame onto a queue, in mean time lets only put 1/3 of the frames 
         self.last_frame_count += 1
         self.last_inboard_frame =  frame
         if self.last_frame_count % 3 == 0:
-            self.video_stream.set_latest_frame(self.last_inboard_frame)
+            latest_frame = self.last_inboard_frame
+            if isinstance(latest_frame, np.ndarray):
+                self.video_stream.push_frame(latest_frame)
+            elif hasattr(latest_frame, 'to_ndarray'):
+                self.video_stream.push_frame(latest_frame.to_ndarray(format='rgb24'))
+            else:
+                self.video_stream.set_latest_frame(latest_frame)
             if self.last_frame_count == 100:
                 self.last_frame_count = 0 # paranoia so it doesn't overflow
 
@@ -56,6 +82,107 @@ class UserVideo:
 
     def print_annotations(self, frame):
         return self.video_stream.print_annotations(frame) #TODO have translate and cache options
+
+    def can_passthrough(self):
+        """True when there are no annotations to draw, the frame at most needs cropping."""
+        return not self.video_stream.has_annotations()
+
+    def passthrough_frame(self, frame):
+        """
+        Fast path for frames with nothing to draw, the frame is queued for processing and returned
+        untouched, or rebuilt from the cropped view when the stream is cropped.
+
+        :param frame: av.VideoFrame
+        """
+        if self.crop_height is None:
+            self.async_process_frame(frame)
+            self.video_stream.count_passthrough()
+            return frame
+        import av
+        frame_cropped = self.preprocess_frame_array(frame.to_ndarray(format='rgb24'))
+        self.async_process_frame(frame_cropped)
+        self.video_stream.count_passthrough()
+        new_frame = av.VideoFrame.from_ndarray(frame_cropped, format='rgb24')
+        new_frame.pts = frame.pts
+        new_frame.time_base = frame.time_base
+        return new_frame
+
+    def print_annotations_array(self, frame_data):
+        return self.video_stream.print_annotations_array(frame_data)
     
     def dump_annotations(self):
-        return self.video_stream.dump_annotations()
\ No newline at end of file
+        return self.video_stream.dump_annotations()
+
+    def close(self, timeout=10):
+        """
+        Stop the processing thread, which releases the frame processor on its way out.
+
+        :param timeout: Seconds to wait for the frame being processed to finish
+        """
+        self.video_stream.attach_frame_ring(None)
+        self.video_stream.stop(timeout)
+        if self.video_stream.thread.is_alive():
+            logging.warning(f"User video thread still busy after {timeout}s, it returns after the current frame")
+
+
+class RemoteUserVideo(UserVideo):
+    """
+    UserVideo whose frame processing runs in a WorkerPool process.
+
+    Every third frame is written into a FrameRingBuffer in shared memory that the worker's
+    pipeline reads the newest frame from, results come back through handle_message.
+    Annotations drawing stays in this process since it has to happen on every outgoing frame.
+    """
+
+    def __init__(self, pool, lang="jp", disable_dialog=False, disable_translation=False, enable_cache=False, translate="", debug_bbox=False, crop_height=None):
+        self.last_inboard_frame = None
+        self.last_frame_count = 0
+        self.crop_height = crop_height
+        self.closest_match = [] #this can be a list of items
+        self.frameProcessor = None
+        self.frame_ring = None
+
+        self.video_stream = VideoStreamWithAnnotations(background_task_args={"translate" : translate, 'enable_cache' : enable_cache},
+                                                       show_fps=True, crop_y_coordinate=crop_height, debug_bbox=debug_bbox)
+        self.pool = pool
+        self.session_id, self.worker = pool.open_session(self, lang=lang, disable_dialog=disable_dialog, disable_translation=disable_translation,
+                                                         enable_cache=enable_cache, translate=translate, debug_bbox=debug_bbox)
+
+    def async_process_frame(self, frame):
+        """
+        :param frame: RGB NumPy array, PIL Image or av.VideoFrame
+        """
+        self.last_frame_count += 1
+        self.last_inboard_frame = frame
+        if self.last_frame_count % 3 == 0:
+            if self.last_frame_count == 100:
+                self.last_frame_count = 0 # paranoia so it doesn't overflow
+            if hasattr(frame, 'to_ndarray'):
+                frame = frame.to_ndarray(format='rgb24')
+            frame_data = np.asarray(frame.convert('RGB')) if isinstance(frame, Image.Image) else frame
+            if self.frame_ring is None or not self.frame_ring.fits(frame_data.shape):
+                self.attach_frame_ring(FrameRingBuffer(max_shape=frame_data.shape, shared=True))
+            self.frame_ring.write(frame_data)
+
+    def attach_frame_ring(self, frame_ring):
+        old_frame_ring, self.frame_ring = self.frame_ring, frame_ring
+        self.pool.attach_frame_ring(self.session_id, self.worker, frame_ring.name, frame_ring.capacity, frame_ring.max_shape)
+        if old_frame_ring is not None:
+            # the worker keeps its own mapping, this only removes the name
+            old_frame_ring.close()
+
+    def handle_message(self, message):
+        """Results from the worker, called on the pool's listener thread."""
+        kind = message[0]
+        if kind == 'annotations':
+            _, _, annotations, translations = message
+            # set_translation ignores None, the worker's cleared translation has to be mirrored too
+            self.video_stream.replace_annotations(annotations, translations)
+        elif kind == 'closest_match':
+            self.closest_match = message[2]
+
+    def close(self):
+        self.pool.close_session(self.session_id, self.worker)
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
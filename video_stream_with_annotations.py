@@ -5,10 +5,16 @@ import threading
 import time
 import numpy as np
 from collections import Counter
-from PIL import Image, ImageFont, ImageDraw, ImageFilter
+from PIL import Image, ImageDraw
 from image_diff import image_crop_title_bar
+from frame_gate import FrameGate
+from frame_ring import FrameRingBuffer
+from overlay import Overlay, OverlayCache, annotations_key, blur_regions, blur_regions_array, get_font_pool, TextLayoutCache
 import textwrap
 
+# scratch surface for measuring text, textbbox doesn't depend on the image size
+measure_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
 os_name = platform.system()
 #TODO we should remove this from this file 
 if os_name == 'Windows':
@@ -25,18 +31,33 @@ else:
     raise Exception(f"Unsupported OS: {os_name}")
 
 
+def frame_to_image(frame_data):
+    image = Image.fromarray(frame_data)
+    # grayscale images map the array's memory instead of copying it
+    return image.copy() if image.readonly else image
+
+
 class VideoStreamWithAnnotations:
     def __init__(self, background_task=None, background_task_args={}, show_fps=False, crop_y_coordinate=None, frameProcessor=None, textDetector=None, debug_bbox=False):
         self.latest_frame = None
         self.frame_lock = threading.Lock()
+        # frame arrays pushed by the capture side, converted into latest_frame when the processing side reads them
+        self.frame_ring = None
+        self.frame_seq = 0
         self.current_annotations = None
         self.current_translations = None
+        # bumped whenever the annotations or translation change, so consumers only resend/redraw on change
+        self.annotations_version = 0
+        self.passthrough_frames = 0
+        self.rendered_frames = 0
+        self.overlay_cache = OverlayCache()
         self.show_fps = show_fps
         self.frame_count = 0
         self.fps = 0
         self.fps_counter_start_time = time.time()
         self.frameProcessor = frameProcessor
         self.textDetector = textDetector
+        self.frame_gate = FrameGate(textDetector) if textDetector is not None else None
         self.debug_bbox = debug_bbox
 
         # Check the operating system, and language these two are for japanese
@@ -46,12 +67,18 @@ class VideoStreamWithAnnotations:
             self.font_path = "/System/Library/Fonts/ヒラギノ丸ゴ ProN W4.ttc"  # Path to Hiragino Maru Gothic Pro
         else: #linux?
             self.font_path = "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc" #sudo apt-get install fonts-noto-cjk
-        self.font = ImageFont.truetype(self.font_path, 35)
+        # fonts are loaded once per size and shared by every stream
+        self.font_pool = get_font_pool(self.font_path)
+        self.font = self.font_pool.get(35)
+        self.layout_cache = TextLayoutCache()
 
         self.crop_y_coordinate = crop_y_coordinate # This can be None or an integer you should set this
         self.cap = None
         self.background_task = background_task
         self.background_task_args = background_task_args
+        # set by stop(), background tasks return once it is set
+        self.stopped = threading.Event()
+        self.thread = None
         if self.background_task is not None:
             self.thread = threading.Thread(target=self.background_task, kwargs=self.background_task_args)
             self.thread.daemon = True  # Daemonize thread
@@ -126,7 +153,10 @@ class VideoStreamWithAnnotations:
 
     def adjust_translation_text(self, translation, font, dialogue_bbox_width):
         """Adding newline when translation text is longer than dialogue_bbox_width"""
+        key = ('wrap', translation, getattr(font, 'path', None), getattr(font, 'size', None), dialogue_bbox_width)
+        return self.layout_cache.get(key, lambda: self._wrap_translation_text(translation, font, dialogue_bbox_width))
 
+    def _wrap_translation_text(self, translation, font, dialogue_bbox_width):
         word_width = 0
         translation_adjusted = ""
         for word in translation.split():
@@ -148,20 +178,22 @@ class VideoStreamWithAnnotations:
         """
         if dialogue_box_width <= 0 or dialogue_box_height <= 0:
             return None
+        key = ('font_size', text, dialogue_box_width, dialogue_box_height, self.font_path, initial_font_size)
+        return self.layout_cache.get(key, lambda: self._fit_font_size(dialogue_box_width, dialogue_box_height, text, initial_font_size))
 
+    def _fit_font_size(self, dialogue_box_width, dialogue_box_height, text, initial_font_size):
         def fits(font_size):
-            font = self.font.font_variant(size=font_size)
+            font = self.font_pool.get(font_size)
             # Calculate the line width to wrap text
             line_width = dialogue_box_width // font_size
             wrapped_text = textwrap.fill(text, width=line_width)
 
-            bbox = draw.textbbox((0, 0), wrapped_text, font=font)
+            bbox = measure_draw.textbbox((0, 0), wrapped_text, font=font)
             text_width = bbox[2] - bbox[0]
             text_height = bbox[3] - bbox[1]
 
             return text_width <= dialogue_box_width and text_height <= dialogue_box_height
 
-        draw = ImageDraw.Draw(Image.new('RGB', (dialogue_box_width, dialogue_box_height)))
         min_size, max_size = 1, initial_font_size
         result_size = min_size
 
@@ -175,70 +207,112 @@ class VideoStreamWithAnnotations:
 
         return result_size
 
+    def layout_translation(self, text, dialogue_box_width, dialogue_box_height):
+        """
+        Fit and wrap a translation in the dialogue box, cached per (text, box size, font).
+
+        :return: dict with the chosen font_size, the font, the wrapped text and its bbox relative to the text position
+        """
+        def layout():
+            font_size = self.calculate_font_size(dialogue_box_width, dialogue_box_height, text)
+            font = self.font if font_size is None else self.font_pool.get(font_size)
+            wrapped_text = self.adjust_translation_text(text, font, dialogue_box_width)
+            bbox = measure_draw.textbbox((0, 0), wrapped_text, font=font)
+            return {"font_size": font_size, "font": font, "text": wrapped_text, "bbox": bbox}
+        return self.layout_cache.get(('layout', text, dialogue_box_width, dialogue_box_height, self.font_path), layout)
+
     def process_annotations(self, pil_image=None):
+        """
+        Build the annotations sent to the client and, when pil_image is given, draw them on it.
+
+        The drawn overlay (translation text and boxes) only changes when the annotations do, so it
+        is rendered once into an RGBA layer cached per (annotations, translation, frame size) and
+        alpha blended onto every frame. Only the dialogue boxes are blurred per frame.
+        """
+        if pil_image is None:
+            return self._process_annotations_without_image(), None
+
+        translate = self.background_task_args.get("translate")
+        with self.frame_lock:
+            annotations = self.current_annotations
+            translations = self.current_translations
+        if not annotations:
+            return {"translations": [], "annotations": [], "debug_bbox": []}, pil_image
+
+        key = (annotations_key(annotations), translations, bool(translate), self.debug_bbox, pil_image.size)
+        overlay = self.overlay_cache.get(key, lambda: self._render_overlay(pil_image.size, annotations, translations, translate))
+
+        if translate:
+            pil_image = self._generate_blurred_image(pil_image, annotations)
+        return overlay.out_annotations, overlay.apply(pil_image)
+
+    def _render_overlay(self, size, annotations, translations, translate):
+        out_annotations = {
+            "translations": [],
+            "annotations": [],
+            "debug_bbox": []
+        }
+        layer = Image.new("RGBA", size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+
+        if translate:
+            text_position = self._calculate_annotation_bounds(annotations)
+            dialogue_text_color = 'white'
+
+            # calculate allowed width for translation text (top left x position to 100 pixel before edge of image)
+            pixel_offset = size[0] // 5
+            self.dialogue_bbox_width = (size[0] - pixel_offset) -  text_position[0]
+            self.dialogue_bbox_height = 500 # approximately the height of bbox
+            layout = self.layout_translation(translations, self.dialogue_bbox_width, self.dialogue_bbox_height)
+            self.font = layout["font"]
+            translation_adjusted = layout["text"]
+
+            bottom_right = (text_position[0] + self.dialogue_bbox_width, text_position[1] + self.dialogue_bbox_height)
+            dialogue_bbox = [text_position, bottom_right]
+
+            self._annotate_translation(draw, text_position, translation_adjusted, dialogue_text_color)
+
+            oanno = {"pos": text_position, "text": translation_adjusted, "bbox": dialogue_bbox}
+            out_annotations["translations"].append(oanno)
+
+        if self.debug_bbox:
+            out_annotations["debug_bbox"] = self._get_bboxes_and_text(annotations)
+            self._draw_bboxes(draw, annotations)
+
+        if not translate and not self.debug_bbox:
+            out_annotations["annotations"] = self._get_bboxes_and_text(annotations)
+            self._draw_bboxes(draw, annotations)
+
+        return Overlay(layer, out_annotations)
+
+    def _process_annotations_without_image(self):
         out_annotations = {
             "translations": [],
             "annotations": [],
             "debug_bbox": []
         }
         translate = self.background_task_args.get("translate")
-        
+
         with self.frame_lock:
             if self.current_annotations:
-                if pil_image is not None:
-                    draw = ImageDraw.Draw(pil_image)
-
                 if translate:
-
                     text_position = self._calculate_annotation_bounds(self.current_annotations)
 
-                    if pil_image:
-                        dialogue_text_color = 'white'
-
-                        pil_image = self._generate_blurred_image(pil_image)
-                        draw = ImageDraw.Draw(pil_image)
-
-                        # calculate allowed width for translation text (top left x position to 100 pixel before edge of image)
-                        pixel_offset = pil_image.size[0] // 5
-                        self.dialogue_bbox_width = (pil_image.size[0] - pixel_offset) -  text_position[0]
-                        self.dialogue_bbox_height = 500 # approximately the height of bbox
-                        font_size = self.calculate_font_size(self.dialogue_bbox_width, self.dialogue_bbox_height, self.current_translations)
-                        self.font = self.font.font_variant(size=font_size)
-
-                        translation_adjusted = self.adjust_translation_text(self.current_translations, self.font, self.dialogue_bbox_width)
-
-                        bottom_right = (text_position[0] + self.dialogue_bbox_width, text_position[1] + self.dialogue_bbox_height)
-                        dialogue_bbox = [text_position, bottom_right]
-                    
-                        self._annotate_translation(draw, text_position, translation_adjusted, dialogue_text_color)
-                    
-                    else:
-
-                        translation_adjusted = self.adjust_translation_text(self.current_translations, self.font, self.dialogue_bbox_width)
-                        
-                        bottom_right = (text_position[0] + self.dialogue_bbox_width, text_position[1] + self.dialogue_bbox_height)
-                        dialogue_bbox = [text_position, bottom_right]
-                        
+                    translation_adjusted = self.adjust_translation_text(self.current_translations, self.font, self.dialogue_bbox_width)
+
+                    bottom_right = (text_position[0] + self.dialogue_bbox_width, text_position[1] + self.dialogue_bbox_height)
+                    dialogue_bbox = [text_position, bottom_right]
+
                     oanno = {"pos": text_position, "text": translation_adjusted, "bbox": dialogue_bbox}
                     out_annotations["translations"].append(oanno)
-                    
-                    
 
                 if self.debug_bbox:
                     out_annotations["debug_bbox"] = self._get_bboxes_and_text(self.current_annotations)
-                    if pil_image:
-                        self._draw_bboxes(draw, self.current_annotations)
-                
+
                 if not translate and not self.debug_bbox:
                     out_annotations["annotations"] = self._get_bboxes_and_text(self.current_annotations)
-                    if pil_image:
-                        self._draw_bboxes(draw, self.current_annotations)
-
-        if pil_image:
-            return out_annotations, pil_image
-        else:
-            return out_annotations, None
 
+        return out_annotations
 
     def dump_annotations(self):
         return self.process_annotations()[0]
@@ -247,20 +321,13 @@ class VideoStreamWithAnnotations:
         top_left = annotations[0][0][0]
         return tuple(map(int, top_left))
 
-    def _generate_blurred_image(self, pil_image):
+    def _blur_boxes(self, annotations):
+        return [(*map(int, res_[0][0]), *map(int, res_[0][1])) for res_ in annotations]
 
-        # Blurring the background text
-        blurred_image = pil_image.filter(ImageFilter.GaussianBlur(10))
-        mask = Image.new("L", pil_image.size, 0)
-        draw_mask = ImageDraw.Draw(mask)
-
-        for res_ in self.current_annotations:
-            # Draw the rectangle on the mask
-            draw_mask.rectangle(res_[0], fill=255)
-        
-        image_with_blur = Image.composite(blurred_image, pil_image, mask)
-
-        return image_with_blur
+    def _generate_blurred_image(self, pil_image, annotations=None):
+        # Blurring the background text, only the dialogue boxes are blurred
+        annotations = self.current_annotations if annotations is None else annotations
+        return blur_regions(pil_image, self._blur_boxes(annotations), radius=10)
 
 
     def _annotate_translation(self, draw, text_position, adjusted_translation_text, dialogue_text_color):
@@ -282,10 +349,53 @@ class VideoStreamWithAnnotations:
             bboxes_and_text.append({"pos": text_position, "text": text})
         return bboxes_and_text
 
+    def has_annotations(self):
+        # reading the reference is atomic, no need to take frame_lock on the per frame fast path
+        return bool(self.current_annotations)
+
+    def count_passthrough(self):
+        """Count an outgoing frame sent without drawing annotations."""
+        self.passthrough_frames += 1
+
+    def frame_stats(self):
+        return {"passthrough_frames": self.passthrough_frames, "rendered_frames": self.rendered_frames}
+
     def print_annotations(self, frame):
+        if not self.has_annotations():
+            self.count_passthrough()
+            return frame
+        self.rendered_frames += 1
         _, annotated_frame = self.process_annotations(frame)
         return annotated_frame
 
+    def print_annotations_array(self, frame_data):
+        """
+        Annotate an RGB NumPy frame.
+
+        :param frame_data: (height, width, 3) uint8 array, it is never written to
+        :return: frame_data itself when there is nothing to draw, otherwise a new annotated array
+        """
+        if not self.has_annotations():
+            self.count_passthrough()
+            return frame_data
+        self.rendered_frames += 1
+        translate = self.background_task_args.get("translate")
+        with self.frame_lock:
+            annotations = self.current_annotations
+            translations = self.current_translations
+        if not annotations:
+            return frame_data
+
+        # blurred and blended on the array, only the cached overlay was ever drawn with PIL
+        size = (frame_data.shape[1], frame_data.shape[0])
+        key = (annotations_key(annotations), translations, bool(translate), self.debug_bbox, size)
+        overlay = self.overlay_cache.get(key, lambda: self._render_overlay(size, annotations, translations, translate))
+
+        annotated_frame = frame_data.copy()
+        if translate:
+            blur_regions_array(annotated_frame, self._blur_boxes(annotations), radius=10)
+        return overlay.apply_array(annotated_frame)
+
 
     def run_video(self, path):
         last_time = time.time()
@@ -332,34 +442,79 @@ class VideoStreamWithAnnotations:
         cv2.destroyAllWindows()
 
     def get_latest_frame(self):
+        """
+        The newest frame as a PIL Image, the same object is returned until a newer frame comes in.
+        """
+        frame_ring = self.frame_ring
+        if frame_ring is not None:
+            seq, img = frame_ring.read(frame_to_image, after=self.frame_seq)
+            with self.frame_lock:
+                # the sequence numbers belong to that ring, skip them if it was replaced meanwhile
+                if seq is not None and frame_ring is self.frame_ring:
+                    self.latest_frame = img
+                    self.frame_seq = seq
         with self.frame_lock:
             return self.latest_frame
         
-    #TODO do we need a queue?
     def set_latest_frame(self, img):
         with self.frame_lock:
             self.latest_frame = img
 
+    def push_frame(self, frame_data):
+        """
+        Hand an RGB frame array to the processing side through the frame ring, only the newest pushed frame gets processed.
+        The ring is allocated for the first frame's size and reallocated when a larger frame comes in.
+        """
+        if self.frame_ring is None or not self.frame_ring.fits(frame_data.shape):
+            self.attach_frame_ring(FrameRingBuffer(max_shape=frame_data.shape))
+        self.frame_ring.write(frame_data)
+
+    def attach_frame_ring(self, frame_ring):
+        """Read frames from frame_ring, eg. one shared by another process."""
+        with self.frame_lock:
+            self.frame_ring = frame_ring
+            self.frame_seq = 0
+
     def set_annotations(self, annotations):
         if annotations == None:
             return
         with self.frame_lock:
             #print(f"set_annotations- {annotations}")
+            if annotations != self.current_annotations:
+                self.annotations_version += 1
             self.current_annotations = annotations
 
     def set_translation(self, translation):
         if translation == None:
             return
         with self.frame_lock:
+            if translation != self.current_translations:
+                self.annotations_version += 1
+            self.current_translations = translation
+
+    def replace_annotations(self, annotations, translation):
+        """
+        Set both annotations and translation as they are, None included, for mirroring another stream's state.
+        """
+        with self.frame_lock:
+            if annotations != self.current_annotations or translation != self.current_translations:
+                self.annotations_version += 1
+            self.current_annotations = annotations
             self.current_translations = translation
 
 
-    def stop(self):
+    def stop(self, timeout=None):
+        """
+        Signal the background task to return and wait for its thread.
+
+        :param timeout: Seconds to wait for the thread, None waits until it returns
+        """
+        self.stopped.set()
         if self.cap != None and self.cap.isOpened():
             self.cap.release()
         cv2.destroyAllWindows()
         if self.thread is not None and self.thread.is_alive():
-            self.thread.join()
+            self.thread.join(timeout)
 
     #TODO all preprocessing goes here
     def preprocess_image(self, img, crop_y_coordinate=None):
@@ -371,8 +526,13 @@ class VideoStreamWithAnnotations:
         if crop_y_coordinate != None:
             img = image_crop_title_bar(img, crop_y_coordinate)
 
-        image = self.textDetector.preprocess_image(img)
-        if not self.textDetector.has_text(image):
+        gate = self.frame_gate.check(img)
+        if self.frame_gate.frames % 100 == 0:
+            print(f"Frame gate stats: {self.frame_gate.stats()}")
+        if gate == 'static':
+            # nothing changed since the last checked frame, keep the current annotations
+            return None
+        if gate == 'no_text':
             print("No text Found in this frame. Skipping run_image")
             if show_image_screen:
                 self.set_annotations([])
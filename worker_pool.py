@@ -0,0 +1,238 @@
+import itertools
+import logging
+import multiprocessing
+import threading
+from frame_ring import FrameRingBuffer
+
+
+_worker_text_detector = None
+
+def create_user_video(**kwargs):
+    """
+    Default session factory of the worker processes, a UserVideo sharing the worker's text detector.
+    """
+    global _worker_text_detector
+    from user_video import UserVideo
+    from model_registry import model_registry
+    from text_detector_fast import TextDetectorFast
+    if _worker_text_detector is None:
+        _worker_text_detector = model_registry.get('fast', [], lambda: TextDetectorFast(""))
+    # frames are cropped by the server process before they are sent
+    return UserVideo(textDetector=_worker_text_detector, batch_inference=True, crop_height=None, **kwargs)
+
+
+class WorkerSession:
+    """
+    A user's processing pipeline inside a worker process, publishing its results back to the server.
+    """
+
+    def __init__(self, session_id, pipeline):
+        self.session_id = session_id
+        self.pipeline = pipeline
+        self.frame_rings = []
+        self.published_version = None
+        self.published_match = []
+
+    def attach_frame_ring(self, name, capacity, max_shape):
+        frame_ring = FrameRingBuffer(capacity, max_shape, name=name)
+        # rings replaced by a larger one stay mapped until the session closes, the pipeline may still be reading them
+        self.frame_rings.append(frame_ring)
+        self.pipeline.video_stream.attach_frame_ring(frame_ring)
+
+    def poll(self):
+        """
+        :return: list of messages for the server about results that changed since the last poll
+        """
+        messages = []
+        if self.pipeline is None:
+            # closed while the publisher was going through the sessions
+            return messages
+        video_stream = self.pipeline.video_stream
+        version = video_stream.annotations_version
+        if version != self.published_version:
+            self.published_version = version
+            with video_stream.frame_lock:
+                annotations, translations = video_stream.current_annotations, video_stream.current_translations
+            messages.append(('annotations', self.session_id, annotations, translations))
+        closest_match = self.pipeline.closest_match
+        if closest_match != self.published_match:
+            self.published_match = closest_match
+            messages.append(('closest_match', self.session_id, closest_match))
+        return messages
+
+    def close(self):
+        # the pipeline's thread is stopped before the rings it reads from are unmapped
+        self.pipeline.close()
+        self.pipeline = None
+        for frame_ring in self.frame_rings:
+            frame_ring.close()
+        self.frame_rings = []
+
+
+def worker_main(conn, session_factory=create_user_video, publish_interval=0.02):
+    """
+    Entry point of a worker process.
+
+    Commands from the server come in over conn: ('open', session_id, kwargs), ('ring', session_id, name, capacity, max_shape),
+    ('close', session_id) and ('stop',). Results are sent back over the same pipe.
+    """
+    sessions = {}
+    sessions_lock = threading.Lock()
+    send_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    def publish():
+        while not stopped.wait(publish_interval):
+            with sessions_lock:
+                active = list(sessions.values())
+            for session in active:
+                try:
+                    for message in session.poll():
+                        send(message)
+                except Exception as e:
+                    logging.error(f"Worker failed to publish session {session.session_id}: {e}")
+
+    threading.Thread(target=publish, daemon=True).start()
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        command = message[0]
+        if command == 'stop':
+            break
+        session_id = message[1]
+        try:
+            if command == 'open':
+                session = WorkerSession(session_id, session_factory(**message[2]))
+                with sessions_lock:
+                    sessions[session_id] = session
+            elif command == 'ring':
+                session = sessions.get(session_id)
+                if session is not None:
+                    session.attach_frame_ring(*message[2:])
+            elif command == 'close':
+                with sessions_lock:
+                    session = sessions.pop(session_id, None)
+                if session is not None:
+                    session.close()
+        except Exception as e:
+            logging.error(f"Worker failed on {command} for session {session_id}: {e}")
+
+    stopped.set()
+    for session in sessions.values():
+        session.close()
+
+
+class WorkerPool:
+    """
+    Processes running the per user frame processing pipelines, so OCR, detection and translation
+    work doesn't compete for the GIL with the asyncio process doing the WebRTC I/O.
+
+    Every session is pinned to the worker with the fewest sessions. Frames go to the workers
+    through a FrameRingBuffer in shared memory per session, commands and results go over one
+    pipe per worker.
+    """
+
+    def __init__(self, num_workers, session_factory=create_user_video, publish_interval=0.02):
+        """
+        :param num_workers: Number of worker processes
+        :param session_factory: Picklable callable building a session pipeline in the worker from the open kwargs
+        :param publish_interval: Seconds between checks for new results in the workers
+        """
+        context = multiprocessing.get_context('spawn')
+        self.sessions = {}
+        self.session_ids = itertools.count()
+        self.lock = threading.Lock()
+        self.workers = []
+        for index in range(num_workers):
+            conn, child_conn = context.Pipe()
+            process = context.Process(target=worker_main, args=(child_conn, session_factory, publish_interval), daemon=True,
+                                      name=f"frame-worker-{index}")
+            process.start()
+            child_conn.close()
+            worker = {"process": process, "conn": conn, "send_lock": threading.Lock(), "sessions": 0}
+            self.workers.append(worker)
+            threading.Thread(target=self._listen, args=(worker,), daemon=True).start()
+
+    def send(self, worker, message):
+        with worker["send_lock"]:
+            worker["conn"].send(message)
+
+    def open_session(self, session, **kwargs):
+        """
+        Start a pipeline for session on the least loaded worker.
+
+        :param session: Object receiving the results with handle_message(message)
+        :param kwargs: Arguments of the worker's session_factory
+        :return: (session id, worker)
+        """
+        with self.lock:
+            session_id = next(self.session_ids)
+            worker = min(self.workers, key=lambda worker: worker["sessions"])
+            worker["sessions"] += 1
+            self.sessions[session_id] = session
+        self.send(worker, ('open', session_id, kwargs))
+        return session_id, worker
+
+    def attach_frame_ring(self, session_id, worker, name, capacity, max_shape):
+        """Point the session's pipeline at the shared FrameRingBuffer called name."""
+        self.send(worker, ('ring', session_id, name, capacity, max_shape))
+
+    def close_session(self, session_id, worker):
+        with self.lock:
+            if self.sessions.pop(session_id, None) is None:
+                return
+            worker["sessions"] -= 1
+        self.send(worker, ('close', session_id))
+
+    def _listen(self, worker):
+        while True:
+            try:
+                message = worker["conn"].recv()
+            except (EOFError, OSError):
+                logging.error(f"Lost connection to {worker['process'].name}")
+                return
+            session = self.sessions.get(message[1])
+            if session is not None:
+                session.handle_message(message)
+
+    def stop(self):
+        for worker in self.workers:
+            try:
+                self.send(worker, ('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.workers:
+            worker["process"].join(timeout=5)
+
+    def stats(self):
+        return [{"name": worker["process"].name, "alive": worker["process"].is_alive(), "sessions": worker["sessions"]}
+                for worker in self.workers]
+
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+def get_worker_pool(num_workers):
+    """
+    Return the process-wide WorkerPool, starting it with num_workers processes the first time.
+    """
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = WorkerPool(num_workers)
+        return _worker_pool
+
+
+def stop_worker_pool():
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is not None:
+            _worker_pool.stop()
+            _worker_pool = None